@@ -37,6 +37,7 @@ DJANGO_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 ]
 
 THIRD_PARTY_APPS = [
@@ -48,12 +49,16 @@ THIRD_PARTY_APPS = [
 LOCAL_APPS = [
     "users",
     "publications",
+    "tasks",
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    "utils.middleware.MetricsMiddleware",  # first, to time the whole request
+    "utils.middleware.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "utils.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -83,13 +88,22 @@ TEMPLATES = [
 WSGI_APPLICATION = "chaindots.wsgi.application"
 
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": ("rest_framework.authentication.TokenAuthentication",),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("utils.authentication.CachingTokenAuthentication",),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend",
     ],
+    "DEFAULT_RENDERER_CLASSES": (
+        "utils.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "utils.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_PAGINATION_CLASS": "utils.paginations.CustomPagination",
     "PAGE_SIZE": 20,
 }
@@ -97,18 +111,192 @@ REST_FRAMEWORK = {
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# Connections are persistent: each worker thread reuses its connection for DATABASE_CONN_MAX_AGE seconds, then it's
+# closed and a new one is opened (0 opens one per request, as under ASGI, where connections aren't reused across
+# requests). A reused connection is health checked before the first query of each request. The "utils.postgresql"
+# backend prepares the repeated SELECT statements on each connection (check "prepare_threshold"); it's incompatible
+# with poolers in transaction mode, set "prepare_threshold" to None behind one.
 
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql_psycopg2",
+        "ENGINE": "utils.postgresql",
         "NAME": "chaindots_db",
         "USER": "user_chaindots",
         "PASSWORD": os.environ.get("DATABASE_PASSWORD", ""),
         "HOST": "db",
         "PORT": 5432,
+        "CONN_MAX_AGE": int(os.environ.get("DATABASE_CONN_MAX_AGE", 600)),  # seconds
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "prepare_threshold": 2,  # executions of a statement on a connection before it's prepared
+            "prepared_max": 200,  # prepared statements per connection
+        },
+    }
+}
+
+
+# Read replicas ("utils.db_routers.ReplicaRouter" and "utils.middleware.ReplicaRoutingMiddleware")
+# Each host of DATABASE_REPLICA_HOSTS (comma separated) is a streaming replica of "default". Safe requests read the
+# tables of DATABASE_REPLICA_APPS from one of them, the same one for the whole request. After an unsafe request, the
+# client reads from "default" for REPLICA_PIN_SECONDS (pinned by a cookie and by its token), longer than the usual
+# replication lag, so it reads its own writes. Replicas failing a "SELECT 1" are skipped for
+# REPLICA_HEALTH_CHECK_INTERVAL seconds, their reads fall back to "default".
+
+for num, host in enumerate(filter(None, os.environ.get("DATABASE_REPLICA_HOSTS", "").split(","))):
+    DATABASES[f"replica_{num}"] = {
+        **DATABASES["default"],
+        "HOST": host.strip(),
+        # seconds, an unreachable replica must not stall the requests
+        "OPTIONS": {**DATABASES["default"]["OPTIONS"], "connect_timeout": 2},
+        "TEST": {"MIRROR": "default"},
     }
+
+DATABASE_ROUTERS = ["utils.db_routers.ReplicaRouter"]
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_REPLICA_APPS = ("users", "publications")
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = "replica_pin"
+REPLICA_PIN_CACHE = {
+    "BACKEND": "utils.caches.LRUCache",
+    "OPTIONS": {
+        "max_entries": 10_000,
+        "timeout": REPLICA_PIN_SECONDS,
+    },
 }
+REPLICA_HEALTH_CHECK_INTERVAL = 10  # seconds
+
+
+# Bulk ingestion ("POST /api/posts/bulk/" and "POST /api/posts/{id}/comments/bulk/")
+
+BULK_CREATE_BATCH_SIZE = 1_000  # rows per INSERT
+BULK_CREATE_MAX_ITEMS = 10_000  # items allowed per request
+
+
+# Streaming exports ("GET /api/posts/export/" and "GET /api/posts/{id}/comments/export/")
+
+EXPORT_CHUNK_SIZE = 2_000  # rows fetched per round trip of the server-side cursor
+
+
+# Follows ("POST /api/users/{id}/follow/" and "POST /api/users/{id}/unfollow/")
+
+FOLLOW_MAX_IDS = 1_000  # users allowed per request
+
+
+# Home timeline ("GET /api/feed/")
+
+FEED_FANOUT_MAX_FOLLOWERS = 10_000  # authors with more followers are read on demand instead of fanned out on write
+FEED_BACKFILL_SIZE = 100  # latest publications copied to a timeline when its owner follows someone
+
+
+# Authentication token cache ("utils.authentication.CachingTokenAuthentication")
+# Snapshots of the token's user, so authenticated requests don't query Token and User. Same backends as
+# PUBLICATION_DETAIL_CACHE below; the timeout bounds how long a user deactivated by "QuerySet.update()" stays cached.
+
+AUTH_TOKEN_CACHE = {
+    "BACKEND": "utils.caches.LRUCache",
+    "OPTIONS": {
+        "max_entries": 10_000,
+        "timeout": 300,  # seconds
+    },
+}
+
+
+# Publication detail cache
+# "utils.caches.LRUCache" is per process, use "utils.caches.RedisCache" (requires the "redis" package) to share it
+# between processes, e.g. {"BACKEND": "utils.caches.RedisCache", "OPTIONS": {"url": "redis://redis:6379/0"}}
+
+PUBLICATION_DETAIL_CACHE = {
+    "BACKEND": "utils.caches.LRUCache",
+    "OPTIONS": {
+        "max_entries": 1_000,
+        "timeout": 60,  # seconds
+    },
+}
+
+
+# Write-behind author counters (User.publications_count and User.comments_count, check
+# "publications.counters.user_counters"). None updates them in the creating transaction, one UPDATE per row. Set,
+# increments are buffered once committed and a thread of each process flushes them every FLUSH_INTERVAL seconds in one
+# UPDATE: the counters lag their rows up to FLUSH_INTERVAL seconds (plus the flush), which spares hot authors' rows
+# the lock of every insert. "utils.counters.LocalCounterBuffer" is per process and loses its increments if the process
+# dies, "utils.counters.RedisCounterBuffer" (requires the "redis" package) shares them between processes and keeps
+# them, e.g. {"BACKEND": "utils.counters.RedisCounterBuffer", "OPTIONS": {"url": "redis://redis:6379/0"},
+# "FLUSH_INTERVAL": 2}. With "RECONCILE" (the default), a process reconciles the counters with grouped counts of their
+# rows when its thread starts, recovering lost increments; its first increment waits for it. It doesn't see the per
+# process buffers of the others, nor the counter tasks not run yet (TASK_QUEUE_ENABLED): their pending increments would
+# be counted twice, so with several processes and LocalCounterBuffer, or with the task queue, set it to False and run
+# "reconcile_user_counters" after a crash.
+
+USER_COUNTERS_WRITE_BEHIND = None
+
+
+# Task queue ("tasks.queue"), a DB table run by "python manage.py run_tasks" workers, no broker needed. With
+# TASK_QUEUE_ENABLED, the side effects of creating publications and comments (authors' counters, fan-out to the
+# followers timelines) are enqueued in the creating transaction instead of run in it, so requests don't wait for them;
+# they are seen once a worker runs them. Without it, tasks run right away in the caller's transaction. Failed tasks
+# are retried up to TASK_QUEUE_MAX_ATTEMPTS times, TASK_QUEUE_RETRY_DELAY seconds later (doubled on each retry).
+
+TASK_QUEUE_ENABLED = False
+TASK_QUEUE_MAX_ATTEMPTS = 5
+TASK_QUEUE_RETRY_DELAY = 10  # seconds
+TASK_QUEUE_POLL_INTERVAL = 1  # seconds a worker waits for new tasks when none is due
+
+
+# Request metrics ("utils.middleware.MetricsMiddleware"), exposed to admin users at "GET /metrics" in the Prometheus
+# text format. They are kept per process: scrape every process (e.g. each worker) to get all of them.
+
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+METRICS_QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)  # queries per request
+METRICS_SLOW_REQUEST_THRESHOLD = 1.0  # seconds, slower requests are logged with their SQL (None to disable)
+
+
+# Response compression ("utils.middleware.CompressionMiddleware")
+
+COMPRESSION_ENCODINGS = ("br", "gzip")  # preferred first, "br" requires the "brotli" package
+COMPRESSION_MIN_SIZE = 1_024  # bytes, smaller bodies are sent uncompressed
+COMPRESSION_BROTLI_QUALITY = 5  # 0 to 11, higher is smaller but slower (11 is meant for static files)
+
+
+# Cache-Control of the endpoints answering conditional requests with "304 Not Modified" ("ETag" and "Last-Modified"
+# validators, check "utils.views.ConditionalGetMixin"), by URL name. "no_cache" has clients revalidate every time, a
+# 304 costs one query. The endpoints require authentication, so their responses are "private" (not stored by shared
+# caches).
+
+CACHE_CONTROL = {
+    "publications-detail": {"private": True, "no_cache": True},
+    "publications-comments": {"private": True, "no_cache": True},
+    "users-detail": {"private": True, "no_cache": True},
+}
+
+
+# Lists ("GET /api/posts/", "GET /api/posts/{id}/comments/" and "GET /api/users/") read ".values()" rows and map
+# them with "utils.serializers.LeanSerializer" instead of building model and serializer instances. Same output.
+
+LEAN_SERIALIZATION = True
+
+
+# Total counts of page numbered lists ("total_items" and "total_pages")
+# "exact" runs a COUNT(*) on every request, "estimate" reads Postgres' planner estimate (pg_class.reltuples) for
+# unfiltered lists and counts filtered ones, "cached" keeps exact counts by path and filter params for
+# PAGINATION_COUNT_CACHE's timeout. Clients can skip the count with "?count=none".
+
+PAGINATION_COUNT_STRATEGY = "exact"
+PAGINATION_COUNT_ESTIMATE_MIN_ROWS = 10_000  # tables estimated below this are counted, the estimate isn't worth it
+PAGINATION_COUNT_CACHE = {
+    "BACKEND": "utils.caches.LRUCache",
+    "OPTIONS": {
+        "max_entries": 10_000,
+        "timeout": 30,  # seconds
+    },
+}
+
+
+# Monthly partitions by "created" of the publications and comments tables, optional: "manage_partitions --convert"
+# partitions them once. Then "manage_partitions" (daily) creates the partitions of the current month and the next
+# PARTITION_MONTHS_AHEAD ones, rows of months without a partition go to a default one.
+
+PARTITION_MONTHS_AHEAD = 3
 
 
 # Password validation
@@ -19,8 +19,11 @@ from django.conf.urls import include
 from django.contrib import admin
 from django.urls import path
 
+from utils.views import MetricsView
+
 urlpatterns = [
     path("admin", admin.site.urls),
     path("api/", include("users.urls")),
     path("api/", include("publications.urls")),
+    path("metrics", MetricsView.as_view(), name="metrics"),
 ]
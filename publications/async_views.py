@@ -0,0 +1,57 @@
+from django.http import Http404
+
+from rest_framework.exceptions import ValidationError
+
+from publications.caches import publication_detail_cache
+from publications.filters import PublicationFilter
+from publications.models import Publication, PublicationComment
+from publications.serializers import PublicationCommentSerializer, PublicationSearchSerializer, PublicationSerializer
+from publications.views import get_publication_detail_data
+from utils.async_views import async_api_view
+from utils.metrics import timed
+from utils.paginations import CustomPagination
+
+__all__ = (
+    "publication_list",
+    "publication_detail",
+    "publication_comments",
+)
+
+
+# Async (ASGI) versions of the read endpoints of PublicationModelViewSet, same query params and payloads.
+
+
+@async_api_view
+async def publication_list(request):
+    filterset = PublicationFilter(request.query_params, queryset=Publication.objects.order_by("-created"))
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+
+    paginator = CustomPagination()
+    page = await paginator.apaginate_queryset(filterset.qs, request)
+    serializer_class = PublicationSearchSerializer if request.query_params.get("q") else PublicationSerializer
+    with timed("serializer"):
+        data = serializer_class(page, many=True).data
+    return paginator.get_paginated_data(data)
+
+
+@async_api_view
+async def publication_detail(request, pk):
+    async def load():
+        publication = await Publication.objects.select_related("author").filter(pk=pk).afirst()
+        if publication is None:
+            raise Http404("No Publication matches the given query.")
+        return get_publication_detail_data(publication)
+
+    return await publication_detail_cache.aget_or_set(pk, load)
+
+
+@async_api_view
+async def publication_comments(request, pk):
+    queryset = PublicationComment.objects.filter(publication=pk).order_by("-created", "-id")
+
+    paginator = CustomPagination()
+    page = await paginator.apaginate_queryset(queryset, request)
+    with timed("serializer"):
+        data = PublicationCommentSerializer(page, many=True).data
+    return paginator.get_paginated_data(data)
@@ -0,0 +1,10 @@
+from utils.caches import ReadThroughCache
+
+__all__ = ("publication_detail_cache",)
+
+
+# Payload of "GET /api/posts/{id}/" by publication id. It is invalidated when a comment is added to the publication
+# (check signal 'publications.invalidate_publication_detail_cache'). The sync view loads it again when it differs from
+# the validators (e.g. the author's counters changed), the async one may answer the author's counters stale up to the
+# backend timeout.
+publication_detail_cache = ReadThroughCache.from_settings("PUBLICATION_DETAIL_CACHE", key_prefix="publication_detail:")
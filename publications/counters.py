@@ -0,0 +1,81 @@
+from django.db import connection, transaction
+
+from publications.models import Publication, PublicationComment
+from users.models import Follow, User
+from utils.counters import WriteBehindCounters
+
+__all__ = (
+    "USER_COUNTER_SOURCES",
+    "reconcile_author_counters",
+    "reconcile_user_counters",
+    "user_counters",
+)
+
+
+# any constant shared by the processes, only one of them reconciles at a time
+RECONCILE_LOCK_ID = 0x636F756E
+
+# User counter -> (model whose rows it counts, column of the user)
+USER_COUNTER_SOURCES = {
+    "publications_count": (Publication, "author_id"),
+    "comments_count": (PublicationComment, "author_id"),
+    "followers_count": (Follow, "to_user_id"),
+    "following_count": (Follow, "from_user_id"),
+}
+
+
+def reconcile_user_counters(fields=tuple(USER_COUNTER_SOURCES), dry_run=False, wait=True):
+    """
+    Set the User counters "fields" to the grouped counts of their rows (one "GROUP BY" per counter, check
+    USER_COUNTER_SOURCES), in one UPDATE of the users whose counters drifted. Return the number of drifted users,
+    None when another process is reconciling and not "wait". Increments committed while it runs may be overwritten.
+    """
+    user_table, user_pk = User._meta.db_table, User._meta.pk.column
+    joins, columns, drifts = list(), list(), list()
+    for num, field in enumerate(fields):
+        model, user_column = USER_COUNTER_SOURCES[field]
+        joins.append(
+            f"LEFT JOIN (SELECT {user_column} AS user_id, COUNT(*) FROM {model._meta.db_table} "
+            f"GROUP BY {user_column}) c{num} ON c{num}.user_id = u.{user_pk}"
+        )
+        columns.append(f"COALESCE(c{num}.count, 0) AS {field}")
+        drifts.append(f"{user_table}.{field} <> counts.{field}")
+    counts = f"(SELECT u.{user_pk} AS id, {', '.join(columns)} FROM {user_table} u {' '.join(joins)}) counts"
+    where = f"{user_table}.{user_pk} = counts.id AND ({' OR '.join(drifts)})"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if wait:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s);", [RECONCILE_LOCK_ID])
+        else:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s);", [RECONCILE_LOCK_ID])
+            if not cursor.fetchone()[0]:
+                return None
+
+        if dry_run:
+            cursor.execute(f"SELECT COUNT(*) FROM {user_table} JOIN {counts} ON {where};")
+            return cursor.fetchone()[0]
+
+        assignments = ", ".join(f"{field} = counts.{field}" for field in fields)
+        cursor.execute(f"UPDATE {user_table} SET {assignments} FROM {counts} WHERE {where};")
+        return cursor.rowcount
+
+
+def reconcile_author_counters():
+    """
+    Reconciliation of the counters written behind (check "user_counters"), skipped while another process reconciles.
+    It runs as a process starts writing them, which may wait for it: it gives up on rows locked for too long.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SET LOCAL lock_timeout = '5s';")
+        return reconcile_user_counters(user_counters.fields, wait=False)
+
+
+# Increments of the authors' counters as publications and comments are created (check signals
+# 'publications.update_user_publications_count' and 'publications.update_user_comments_count'), written behind when
+# settings.USER_COUNTERS_WRITE_BEHIND is set.
+user_counters = WriteBehindCounters.from_settings(
+    "USER_COUNTERS_WRITE_BEHIND",
+    User,
+    ("publications_count", "comments_count"),
+    reconcile=reconcile_author_counters,
+)
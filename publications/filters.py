@@ -1,3 +1,6 @@
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db.models import F
+
 from django_filters.rest_framework import CharFilter, DateTimeFilter, FilterSet
 
 from publications.models import Publication
@@ -9,7 +12,29 @@ class PublicationFilter(FilterSet):
     author = CharFilter(field_name="author__id")
     from_date = DateTimeFilter(field_name="created", lookup_expr="gte", input_formats=["%d-%m-%Y"])
     to_date = DateTimeFilter(field_name="created", lookup_expr="lte", input_formats=["%d-%m-%Y"])
+    q = CharFilter(method="filter_search")
 
     class Meta:
         model = Publication
-        fields = ["author", "from_date", "to_date"]
+        fields = ["author", "from_date", "to_date", "q"]
+
+    # same configuration as the "publication_search_vector_trigger" trigger, otherwise the lexemes won't match
+    search_config = "english"
+    headline_options = {"config": search_config, "start_sel": "<mark>", "stop_sel": "</mark>"}
+
+    def filter_search(self, queryset, name, value):
+        """
+        Publications matching the web search syntax query (e.g. 'django "async views" -flask'), best ranked first,
+        with their title and content highlighted ("title_highlight" and "content_highlight").
+        """
+        query = SearchQuery(value, config=self.search_config, search_type="websearch")
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(
+                rank=SearchRank(F("search_vector"), query),
+                # whole title, and up to 3 fragments of the (up to 5,000 chars) content
+                title_highlight=SearchHeadline("title", query, highlight_all=True, **self.headline_options),
+                content_highlight=SearchHeadline("content", query, max_fragments=3, **self.headline_options),
+            )
+            .order_by("-rank", "-created", "-id")
+        )
@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+from statistics import quantiles
+from time import perf_counter
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+__all__ = ("Command",)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the read endpoints served by the sync DRF views under WSGI against the async views under ASGI, "
+        "and report requests/sec and latency percentiles of each one. Start both servers first, e.g.: "
+        "'uvicorn --interface wsgi chaindots.wsgi:application --port 8001' and "
+        "'uvicorn chaindots.asgi:application --port 8000'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wsgi-url", default="http://localhost:8001", help="Base URL of the WSGI server.")
+        parser.add_argument("--asgi-url", default="http://localhost:8000", help="Base URL of the ASGI server.")
+        parser.add_argument("--token", required=True, help="Authentication token of an existing user.")
+        parser.add_argument("--publication", type=int, required=True, help="Id of a publication with comments.")
+        parser.add_argument("--user", type=int, required=True, help="Id of a user.")
+        parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients.")
+        parser.add_argument("--duration", type=float, default=10, help="Seconds each endpoint is loaded.")
+
+    def handle(self, *args, wsgi_url, asgi_url, token, publication, user, concurrency, duration, **options):
+        endpoints = (
+            ("posts list", "/api/posts/", "/api/async/posts/"),
+            ("post detail", f"/api/posts/{publication}/", f"/api/async/posts/{publication}/"),
+            ("comments", f"/api/posts/{publication}/comments/", f"/api/async/posts/{publication}/comments/"),
+            ("user detail", f"/api/users/{user}/", f"/api/async/users/{user}/"),
+        )
+        headers = {"Authorization": f"Token {token}"}
+
+        self.stdout.write(
+            f"{'endpoint':<12} {'server':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+        )
+        for name, sync_path, async_path in endpoints:
+            for server, url in (("wsgi", f"{wsgi_url}{sync_path}"), ("asgi", f"{asgi_url}{async_path}")):
+                timings, errors = self._load(url, headers, concurrency, duration)
+                p = quantiles(timings, n=100) if len(timings) > 1 else [0.0] * 99
+                self.stdout.write(
+                    f"{name:<12} {server:>6} {len(timings) / duration:>9.1f} "
+                    f"{p[49]:>8.2f} {p[94]:>8.2f} {p[98]:>8.2f} {errors:>7}"
+                )
+
+    def _load(self, url, headers, concurrency, duration):
+        def client():
+            timings, errors = list(), 0
+            deadline = perf_counter() + duration
+            while perf_counter() < deadline:
+                start = perf_counter()
+                try:
+                    with urlopen(Request(url, headers=headers)) as response:
+                        response.read()
+                except OSError:
+                    errors += 1
+                    continue
+                timings.append((perf_counter() - start) * 1_000)
+            return timings, errors
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda _: client(), range(concurrency)))
+        return [timing for timings, _ in results for timing in timings], sum(errors for _, errors in results)
@@ -0,0 +1,109 @@
+from random import Random
+from statistics import quantiles
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.db.models import Count, Max, Min
+from django.test import Client
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from publications.models import Publication
+
+__all__ = ("Command",)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay GET requests of the posts list, detail and comments, in process, with a new DB connection per "
+        "request, with persistent connections, and with persistent connections preparing their statements. Reports "
+        "the latency percentiles of each mode, the connections opened and the statements prepared. Run it over a "
+        "dataset generated by 'seed_bench', outside of a transaction."
+    )
+
+    modes = (
+        # name, CONN_MAX_AGE, prepare the statements
+        ("per request", 0, False),
+        ("persistent", 600, False),
+        ("prepared", 600, True),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1_000, help="Requests replayed per mode, warm-up excluded.")
+        parser.add_argument("--warmup", type=int, default=50, help="Requests replayed before measuring each mode.")
+        parser.add_argument("--page-size", type=int, default=20, help="Page size of the lists.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator.")
+
+    def handle(self, *args, requests, warmup, page_size, seed, **options):
+        if connection.in_atomic_block:
+            raise CommandError("Connections can't be closed inside a transaction, run it outside of one.")
+        if connection.vendor != "postgresql" or not hasattr(connection, "prepare_threshold"):
+            raise CommandError("The 'default' database must use the 'utils.postgresql' backend.")
+
+        ids = Publication.objects.aggregate(min_id=Min("id"), max_id=Max("id"))
+        author = Publication.objects.values("author_id").annotate(count=Count("id")).order_by("-count").first()
+        if author is None:
+            raise CommandError("There are no publications, generate a dataset with 'seed_bench' first.")
+
+        token, created = Token.objects.get_or_create(user_id=author["author_id"])
+        client = Client(headers={"Authorization": f"Token {token.key}"})
+        self.page_size = page_size
+
+        settings_dict, prepare_threshold = connection.settings_dict, connection.prepare_threshold
+        conn_max_age = settings_dict["CONN_MAX_AGE"]
+        connections_opened = list()
+        connection_created.connect(lambda **kwargs: connections_opened.append(1), weak=False, dispatch_uid=__name__)
+        self.stdout.write(f"{'mode':<12}{'p50_ms':>10}{'p95_ms':>10}{'p99_ms':>10}{'connections':>13}{'prepared':>10}")
+        try:
+            for name, max_age, prepare in self.modes:
+                settings_dict["CONN_MAX_AGE"] = max_age
+                connection.prepare_threshold = (prepare_threshold or 2) if prepare else None
+                connection.close()
+                connection.ensure_connection()  # the warm-up requests may not query (e.g. cached responses)
+
+                rng = Random(seed)  # the same requests in each mode
+                timings = list()
+                for num in range(warmup + requests):
+                    kind, pk = rng.choice(("list", "detail", "comments")), rng.randint(ids["min_id"], ids["max_id"])
+                    path, params = self._get_request(kind, pk)
+                    if num == warmup:
+                        connections_opened.clear()
+                    timing = self._request(client, path, params)
+                    if num >= warmup:
+                        timings.append(timing)
+
+                percentiles = quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+                prepared = len([name for name in getattr(connection, "prepared_statements", {}).values() if name])
+                self.stdout.write(
+                    f"{name:<12}{percentiles[49]:>10.2f}{percentiles[94]:>10.2f}{percentiles[98]:>10.2f}"
+                    f"{len(connections_opened):>13}{prepared:>10}"
+                )
+        finally:
+            connection_created.disconnect(dispatch_uid=__name__)
+            settings_dict["CONN_MAX_AGE"] = conn_max_age
+            connection.prepare_threshold = prepare_threshold
+            connection.close()
+            if created:
+                token.delete()
+
+    def _get_request(self, kind, pk):
+        if kind == "list":
+            return reverse("publications-list"), {"page_size": self.page_size}
+        if kind == "detail":
+            return reverse("publications-detail", kwargs={"pk": pk}), None
+        return reverse("publications-comments", kwargs={"pk": pk}), {"page_size": self.page_size}
+
+    def _request(self, client, path, params):
+        # as the request handler does: connections past their CONN_MAX_AGE are closed when a request starts and
+        # when it finishes, after the response is sent (so out of the timing)
+        start = perf_counter()
+        close_old_connections()
+        response = client.get(path, params)
+        timing = (perf_counter() - start) * 1_000
+        close_old_connections()
+        if response.status_code >= 500:
+            raise CommandError(f"GET {path} failed with {response.status_code}.")
+        return timing
@@ -0,0 +1,162 @@
+import json
+
+from datetime import timedelta
+from random import Random
+from statistics import mean, quantiles
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+from publications.models import Publication
+from users.models import User
+
+__all__ = ("Command",)
+
+
+DEFAULT_MIX = "list=20,list-filtered=15,list-deep=10,detail=20,comments=15,feed=10,follow=10"
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a weighted mix of requests against the endpoints, in process, and report latency percentiles and "
+        "queries per request of each kind. Run it over a dataset generated by 'seed_bench'. The requests run inside "
+        "a transaction that is rolled back (e.g. the follows), so runs over the same dataset and --seed replay the "
+        "same requests. Save a run with --output and compare a later one against it with --compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2_000, help="Requests replayed, warm-up excluded.")
+        parser.add_argument("--warmup", type=int, default=100, help="Requests replayed before measuring.")
+        parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weight of each kind of request ({DEFAULT_MIX}).")
+        parser.add_argument("--clients", type=int, default=100, help="Users the requests are made by.")
+        parser.add_argument("--page-size", type=int, default=20, help="Page size of the lists.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator.")
+        parser.add_argument("--output", help="Save the results to this JSON file.")
+        parser.add_argument("--compare", help="Compare the results against the ones saved in this JSON file.")
+
+    def handle(self, *args, requests, warmup, mix, clients, page_size, seed, output, compare, **options):
+        self.rng = Random(seed)
+        self.page_size = page_size
+        weights = self._parse_mix(mix)
+        previous = self._load(compare) if compare else None
+
+        with transaction.atomic():
+            self._set_up(clients)
+            kinds = self.rng.choices(list(weights), weights=list(weights.values()), k=warmup + requests)
+            results = {kind: {"timings": list(), "queries": list(), "errors": 0} for kind in weights}
+            for num, kind in enumerate(kinds):
+                timing, queries, ok = self._request(kind)
+                if num >= warmup:
+                    results[kind]["timings"].append(timing)
+                    results[kind]["queries"].append(queries)
+                    results[kind]["errors"] += not ok
+            transaction.set_rollback(True)
+
+        summary = {kind: self._summarize(result) for kind, result in results.items() if result["timings"]}
+        self._report(summary, previous)
+        if output:
+            with open(output, "w") as file:
+                json.dump(summary, file, indent=2)
+
+    def _parse_mix(self, mix):
+        weights = dict()
+        for item in mix.split(","):
+            kind, _, weight = item.partition("=")
+            if not hasattr(self, f"_get_{kind.strip().replace('-', '_')}_request") or not weight.strip().isdigit():
+                raise CommandError(f"Invalid --mix item '{item}', expected <kind>=<weight> with kinds of {DEFAULT_MIX}")
+            weights[kind.strip()] = int(weight)
+        return weights
+
+    def _load(self, path):
+        with open(path) as file:
+            return json.load(file)
+
+    def _set_up(self, clients):
+        user_ids = User.objects.filter(following__isnull=False).distinct().values_list("id", flat=True)
+        self.clients = list()
+        for user_id in self.rng.sample(sorted(user_ids), min(clients, len(user_ids))):
+            token, _ = Token.objects.get_or_create(user_id=user_id)
+            followed_ids = list(User.objects.filter(followers=user_id).order_by("id").values_list("id", flat=True))
+            self.clients.append((user_id, followed_ids, Client(headers={"Authorization": f"Token {token.key}"})))
+        if not self.clients:
+            raise CommandError("There are no users following others, generate a dataset with 'seed_bench' first.")
+
+        ids = Publication.objects.aggregate(min_id=Min("id"), max_id=Max("id"))
+        self.publication_ids = (ids["min_id"], ids["max_id"])
+        self.user_ids = User.objects.aggregate(min_id=Min("id"), max_id=Max("id"))
+        self.last_page = max(Publication.objects.count() // self.page_size, 1)
+
+    def _request(self, kind):
+        user_id, followed_ids, client = self.rng.choice(self.clients)
+        method, path, params = getattr(self, f"_get_{kind.replace('-', '_')}_request")(user_id, followed_ids)
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            response = getattr(client, method)(path, params)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            timing = (perf_counter() - start) * 1_000
+        return timing, len(queries), response.status_code < 400
+
+    # requests of each kind of the mix: (method, path, params)
+
+    def _get_list_request(self, user_id, followed_ids):
+        return "get", reverse("publications-list"), {"page_size": self.page_size}
+
+    def _get_list_filtered_request(self, user_id, followed_ids):
+        from_date = timezone.now() - timedelta(days=self.rng.randint(1, 365))
+        params = {"author": self.rng.choice(followed_ids), "from_date": from_date.strftime("%d-%m-%Y")}
+        return "get", reverse("publications-list"), params | {"page_size": self.page_size}
+
+    def _get_list_deep_request(self, user_id, followed_ids):
+        page = self.rng.randint(self.last_page // 2, self.last_page)
+        return "get", reverse("publications-list"), {"page_size": self.page_size, "page": page}
+
+    def _get_detail_request(self, user_id, followed_ids):
+        return "get", reverse("publications-detail", kwargs={"pk": self.rng.randint(*self.publication_ids)}), None
+
+    def _get_comments_request(self, user_id, followed_ids):
+        pk = self.rng.randint(*self.publication_ids)
+        return "get", reverse("publications-comments", kwargs={"pk": pk}), {"page_size": self.page_size}
+
+    def _get_feed_request(self, user_id, followed_ids):
+        return "get", reverse("feed-list"), {"page_size": self.page_size}
+
+    def _get_follow_request(self, user_id, followed_ids):
+        followed_pk = self.rng.randint(self.user_ids["min_id"], self.user_ids["max_id"])
+        return "post", reverse("users-follow", kwargs={"pk": user_id, "followed_pk": followed_pk}), None
+
+    # report
+
+    def _summarize(self, result):
+        timings = result["timings"]
+        percentiles = quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+        return {
+            "requests": len(timings),
+            "p50_ms": round(percentiles[49], 2),
+            "p95_ms": round(percentiles[94], 2),
+            "p99_ms": round(percentiles[98], 2),
+            "queries": round(mean(result["queries"]), 2),
+            "errors": result["errors"],
+        }
+
+    def _report(self, summary, previous):
+        columns = ("requests", "p50_ms", "p95_ms", "p99_ms", "queries", "errors")
+        self.stdout.write(f"{'kind':<14}" + "".join(f"{column:>10}" for column in columns))
+        for kind, row in summary.items():
+            self.stdout.write(f"{kind:<14}" + "".join(f"{row[column]:>10}" for column in columns))
+            if previous and kind in previous:
+                deltas = (self._delta(row[column], previous[kind][column]) for column in columns[1:5])
+                self.stdout.write(f"{'  vs previous':<14}{'':>10}" + "".join(f"{delta:>10}" for delta in deltas))
+
+    def _delta(self, value, previous_value):
+        if not previous_value:
+            return "-"
+        return f"{(value - previous_value) / previous_value:+.0%}"
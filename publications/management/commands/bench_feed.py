@@ -0,0 +1,107 @@
+from statistics import quantiles
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from publications.models import Publication, TimelineEntry
+from publications.tasks import copy_publications_to_timelines
+from publications.views import FeedViewSet
+from users.models import Follow, User
+
+__all__ = ("Command",)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the home timeline (GET /api/feed/) strategies, fan-out on write vs fan-out on read, for each amount "
+        "of follow edges. The dataset is created inside a transaction that is rolled back, don't run it in production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--edges", type=int, nargs="+", default=[10_000, 100_000], help="Follow edges per run.")
+        parser.add_argument("--following", type=int, default=1_000, help="Authors followed by each reader.")
+        parser.add_argument("--posts-per-author", type=int, default=3)
+        parser.add_argument("--pages", type=int, default=10, help="Feed pages read by each reader.")
+        parser.add_argument("--readers", type=int, default=10, help="Readers whose feed is read.")
+
+    def handle(self, *args, edges, following, posts_per_author, pages, readers, **options):
+        self.stdout.write(f"{'edges':>8} {'strategy':>10} {'fan-out s':>10} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8}")
+        for edges_count in edges:
+            with transaction.atomic():
+                reader_ids = self._create_dataset(edges_count, following, posts_per_author)
+                reader_ids = reader_ids[:readers]
+
+                # inserted by "bulk_create", not by the API: no publication is fanned out, the feed reads all on demand
+                self._write_row(edges_count, "read", None, *self._read_feeds(reader_ids, pages))
+
+                start = perf_counter()
+                # the task is called, not enqueued: the timelines are built here even with settings.TASK_QUEUE_ENABLED
+                for publication_id in Publication.objects.filter(fanned_out=False).values_list("id", flat=True):
+                    copy_publications_to_timelines([publication_id])
+                Publication.objects.update(fanned_out=True)
+                fan_out_time = perf_counter() - start
+
+                self._write_row(edges_count, "write", fan_out_time, *self._read_feeds(reader_ids, pages))
+                self.stdout.write(f"{'':>8} {TimelineEntry.objects.count()} timeline entries")
+
+                transaction.set_rollback(True)
+
+    def _create_dataset(self, edges_count, following, posts_per_author):
+        readers_count = max(edges_count // following, 1)
+        users = User.objects.bulk_create(
+            User(username=f"bench_feed_{num}", email=f"bench_feed_{num}@localhost.com", password="!")
+            for num in range(readers_count + following)
+        )
+        reader_ids = [user.id for user in users[:readers_count]]
+        author_ids = [user.id for user in users[readers_count:]]
+
+        Follow.objects.bulk_create(
+            (
+                Follow(from_user_id=reader_id, to_user_id=author_id)
+                for reader_id in reader_ids
+                for author_id in author_ids
+            ),
+            batch_size=10_000,
+        )
+        Publication.objects.bulk_create(
+            (
+                Publication(author_id=author_id, title="title", content="content")
+                for _ in range(posts_per_author)
+                for author_id in author_ids
+            ),
+            batch_size=10_000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")  # the planner must see the new rows
+        return reader_ids
+
+    def _read_feeds(self, reader_ids, pages):
+        view = FeedViewSet.as_view({"get": "list"})
+        factory = APIRequestFactory()
+
+        timings, queries_counts = list(), list()
+        for reader in User.objects.filter(id__in=reader_ids):
+            url = "/api/feed/"
+            for _ in range(pages):
+                request = factory.get(url)
+                force_authenticate(request, user=reader)
+                reset_queries()  # with DEBUG the queries log is bounded, a full one can't be captured
+                with CaptureQueriesContext(connection) as queries:
+                    start = perf_counter()
+                    response = view(request)
+                    timings.append((perf_counter() - start) * 1_000)
+                queries_counts.append(len(queries))
+                url = response.data["next"]
+                if url is None:
+                    break
+
+        percentiles = quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+        return percentiles[49], percentiles[94], max(queries_counts)
+
+    def _write_row(self, edges_count, strategy, fan_out_time, p50, p95, queries_count):
+        fan_out = f"{fan_out_time:.2f}" if fan_out_time is not None else "-"
+        self.stdout.write(f"{edges_count:>8} {strategy:>10} {fan_out:>10} {p50:>8.2f} {p95:>8.2f} {queries_count:>8}")
@@ -0,0 +1,72 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.text import compress_string
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from publications.models import Publication
+from publications.views import PublicationModelViewSet
+from users.models import User
+from utils.renderers import ORJSONRenderer
+
+__all__ = ("Command",)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the encode time of JSONRenderer against ORJSONRenderer, and the bytes on the wire of each response "
+        "compression, for a page of GET /api/posts/. The dataset is created inside a transaction that is rolled back, "
+        "don't run it in production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=100, help="Publications in the page.")
+        parser.add_argument("--content-length", type=int, default=500, help="Characters of each publication.")
+        parser.add_argument("--iterations", type=int, default=500, help="Renders measured per renderer.")
+
+    def handle(self, *args, page_size, content_length, iterations, **options):
+        with transaction.atomic():
+            data = self._get_page_data(page_size, content_length)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'renderer':<16} {'encode us':>10} {'bytes':>8}")
+        for renderer in (JSONRenderer(), ORJSONRenderer()):
+            start = perf_counter()
+            for _ in range(iterations):
+                content = renderer.render(data)
+            encode_time = (perf_counter() - start) / iterations * 1_000_000
+            self.stdout.write(f"{type(renderer).__name__:<16} {encode_time:>10.1f} {len(content):>8}")
+
+        self.stdout.write(f"\n{'encoding':<16} {'compress us':>12} {'bytes':>8} {'ratio':>6}")
+        for name, compress in (
+            ("identity", lambda body: body),
+            ("gzip", compress_string),
+            (f"br (quality {settings.COMPRESSION_BROTLI_QUALITY})", self._brotli_compress),
+        ):
+            start = perf_counter()
+            for _ in range(iterations):
+                compressed = compress(content)
+            compress_time = (perf_counter() - start) / iterations * 1_000_000
+            self.stdout.write(
+                f"{name:<16} {compress_time:>12.1f} {len(compressed):>8} {len(content) / len(compressed):>5.1f}x"
+            )
+
+    def _get_page_data(self, page_size, content_length):
+        author = User.objects.create(username="bench_renderers", email="bench_renderers@localhost.com", password="!")
+        Publication.objects.bulk_create(
+            Publication(author=author, title=f"title {num}", content=f"content {num} ".ljust(content_length, "x"))
+            for num in range(page_size)
+        )
+
+        request = APIRequestFactory().get("/api/posts/", {"page_size": page_size})
+        force_authenticate(request, user=author)
+        return PublicationModelViewSet.as_view({"get": "list"})(request).data
+
+    def _brotli_compress(self, body):
+        import brotli
+
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
@@ -0,0 +1,74 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from publications.models import Publication, PublicationComment
+from publications.serializers import PublicationCommentSerializer, PublicationSerializer
+from users.models import User
+from users.serializers import UserSerializer
+from utils.serializers import LeanSerializer
+
+__all__ = ("Command",)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the rows/sec of the list serializers (ModelSerializer instances) against their LeanSerializer, "
+        "reading and serializing one page at a time. The dataset is created inside a transaction that is rolled back, "
+        "don't run it in production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=100, help="Rows read and serialized per iteration.")
+        parser.add_argument("--iterations", type=int, default=200, help="Pages serialized by each serializer.")
+
+    def handle(self, *args, page_size, iterations, **options):
+        self.stdout.write(f"{'serializer':<30} {'serializer rows/s':>18} {'lean rows/s':>12} {'speedup':>8}")
+        with transaction.atomic():
+            self._create_dataset(page_size)
+
+            for serializer_class, queryset in (
+                (PublicationSerializer, Publication.objects.order_by("-created", "-id")),
+                (PublicationCommentSerializer, PublicationComment.objects.order_by("-created", "-id")),
+                (UserSerializer, User.objects.order_by("id")),
+            ):
+                lean_serializer = LeanSerializer.for_serializer(serializer_class)
+                if lean_serializer.to_representation(lean_serializer.values(queryset[:page_size])) != (
+                    serializer_class(queryset[:page_size], many=True).data
+                ):
+                    raise CommandError(f"{serializer_class.__name__} and its LeanSerializer give different data")
+
+                rows_per_sec = self._measure(
+                    lambda: serializer_class(list(queryset[:page_size]), many=True).data, page_size, iterations
+                )
+                lean_rows_per_sec = self._measure(
+                    lambda: lean_serializer.to_representation(list(lean_serializer.values(queryset)[:page_size])),
+                    page_size,
+                    iterations,
+                )
+                self.stdout.write(
+                    f"{serializer_class.__name__:<30} {rows_per_sec:>18,.0f} {lean_rows_per_sec:>12,.0f} "
+                    f"{lean_rows_per_sec / rows_per_sec:>7.1f}x"
+                )
+
+            transaction.set_rollback(True)
+
+    def _create_dataset(self, page_size):
+        users = User.objects.bulk_create(
+            User(username=f"bench_serializers_{num}", email=f"bench_serializers_{num}@localhost.com", password="!")
+            for num in range(page_size)
+        )
+        publications = Publication.objects.bulk_create(
+            Publication(author=user, title=f"title {num}", content="content " * 100) for num, user in enumerate(users)
+        )
+        PublicationComment.objects.bulk_create(
+            PublicationComment(author=user, publication=publication, content="comment " * 20)
+            for user, publication in zip(users, publications)
+        )
+
+    def _measure(self, serialize_page, page_size, iterations):
+        start = perf_counter()
+        for _ in range(iterations):
+            serialize_page()
+        return page_size * iterations / (perf_counter() - start)
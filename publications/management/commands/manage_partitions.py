@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from publications.models import Publication, PublicationComment
+from utils.partitions import MonthlyPartitions, add_months
+
+__all__ = ("Command",)
+
+
+class Command(BaseCommand):
+    help = (
+        "Keep the monthly partitions (by 'created') of the publications and comments tables: create the ones of the "
+        "current month and the next PARTITION_MONTHS_AHEAD, and detach (and archive) the old ones with "
+        "--detach-before. Tables that aren't partitioned are skipped, --convert partitions them first, copying their "
+        "rows while they are locked (a one-off, for a maintenance window). Run it daily, e.g. from cron."
+    )
+
+    models = (Publication, PublicationComment)
+
+    def add_arguments(self, parser):
+        parser.add_argument("--convert", action="store_true", help="Partition the tables that aren't yet.")
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.PARTITION_MONTHS_AHEAD,
+            help="Months after the current one with a partition.",
+        )
+        parser.add_argument(
+            "--detach-before", type=self._parse_month, help="Detach the partitions of the months before YYYY-MM."
+        )
+        parser.add_argument("--archive-schema", help="Move the detached partitions to this schema.")
+
+    def handle(self, *args, convert, months_ahead, detach_before, archive_schema, **options):
+        if archive_schema and not detach_before:
+            raise CommandError("--archive-schema needs --detach-before.")
+
+        current_month = timezone.now().date().replace(day=1)
+        until = add_months(current_month, months_ahead)
+        for model in self.models:
+            partitions = MonthlyPartitions(model)
+            if not partitions.is_partitioned():
+                if not convert:
+                    self.stdout.write(f"{partitions.table}: not partitioned, run with --convert to partition it")
+                    continue
+                try:
+                    names = partitions.convert(until)
+                except ValueError as exc:
+                    raise CommandError(str(exc))
+                self.stdout.write(f"{partitions.table}: partitioned, {len(names)} monthly partitions")
+
+            for name in partitions.create(current_month, until):
+                self.stdout.write(f"{partitions.table}: created {name}")
+            if detach_before:
+                for name in partitions.detach(detach_before, schema=archive_schema):
+                    self.stdout.write(
+                        f"{partitions.table}: detached {name}" + (f" to {archive_schema}" if archive_schema else "")
+                    )
+
+    @staticmethod
+    def _parse_month(value):
+        try:
+            return datetime.strptime(value, "%Y-%m").date()
+        except ValueError:
+            raise CommandError(f"Invalid month '{value}', expected YYYY-MM.")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from publications.models import Publication
+from publications.serializers import rebuild_recent_comments
+
+__all__ = ("Command",)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Publication.comments_count and Publication.recent_comments from the comments tables, e.g. to "
+        "backfill them after migrating or after deleting comments in bulk, and save the publications that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("publication_ids", nargs="*", type=int, help="Only these publications (all by default).")
+        parser.add_argument("--batch-size", type=int, default=1_000, help="Publications locked and saved per batch.")
+
+    def handle(self, *args, publication_ids, batch_size, **options):
+        updated = 0
+        for start in range(0, len(publication_ids), batch_size):
+            updated += rebuild_recent_comments(publication_ids[start : start + batch_size])
+
+        if not publication_ids:
+            last_id = 0
+            while batch := list(
+                Publication.objects.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size]
+            ):
+                updated += rebuild_recent_comments(batch)
+                last_id = batch[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"{updated} publication(s) with drifted comments updated."))
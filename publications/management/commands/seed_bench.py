@@ -0,0 +1,191 @@
+import csv
+
+from bisect import bisect_left
+from datetime import timedelta
+from io import StringIO
+from itertools import accumulate
+from random import Random
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from faker import Faker
+
+from publications.models import Publication, PublicationComment
+from users.models import Follow, User
+
+__all__ = ("Command",)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a benchmark dataset: users, a power-law follow graph (a few users are followed by many), "
+        "publications (a few authors write most of them) and comments (a few publications get most of them). Rows "
+        "are loaded with COPY, so millions of them take minutes, and the same --seed gives the same dataset. The "
+        "publications aren't fanned out, the feed reads them on demand. Meant for a benchmark DB, check "
+        "'bench_endpoints'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10_000, help="Users to create.")
+        parser.add_argument("--follows-per-user", type=int, default=50, help="Users followed by each user, on average.")
+        parser.add_argument("--publications", type=int, default=200_000, help="Publications to create.")
+        parser.add_argument("--comments", type=int, default=1_000_000, help="Comments to create.")
+        parser.add_argument("--days", type=int, default=365, help="Rows are created along the last N days.")
+        parser.add_argument("--zipf", type=float, default=1.1, help="Exponent of the popularity distributions.")
+        parser.add_argument("--prefix", default="bench_", help="Prefix of the usernames, they must not exist yet.")
+        parser.add_argument("--password", default="bench", help="Password of every user.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator.")
+        parser.add_argument("--batch-size", type=int, default=50_000, help="Rows per COPY.")
+
+    def handle(self, *args, users, follows_per_user, publications, comments, zipf, prefix, password, **options):
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f"There are users with the prefix '{prefix}' already, use another --prefix.")
+
+        self.rng = Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now()
+        self.since = self.now - timedelta(days=options["days"])
+        self.zipf = zipf
+        self.words = Faker("en_US").get_words_list()
+        self.words_cum_weights = self._get_cum_weights(len(self.words), shuffle=False)  # a few words are common
+
+        with transaction.atomic():
+            user_ids = self._run("users", self._create_users, users, prefix, password)
+            self._run("follows", self._create_follows, user_ids, follows_per_user)
+            publication_rows = self._run("publications", self._create_publications, user_ids, publications)
+            self._run("comments", self._create_comments, user_ids, publication_rows, comments)
+
+        call_command("reconcile_user_counters", stdout=self.stdout)
+        call_command("rebuild_publication_comments", stdout=self.stdout)
+        with connection.cursor() as cursor:  # planner statistics of the new rows, the benchmarks depend on them
+            for model in (User, Follow, Publication, PublicationComment):
+                cursor.execute(f"ANALYZE {model._meta.db_table};")
+
+    def _run(self, name, create, *args):
+        start = perf_counter()
+        rows = create(*args)
+        self.stdout.write(f"{name:<14} {len(rows):>12,} rows {perf_counter() - start:>8.1f}s")
+        return rows
+
+    # random values
+
+    def _get_cum_weights(self, size, shuffle=True):
+        """Cumulative weights of a Zipf distribution over "size" items, the ranks are shuffled unless "shuffle"."""
+        ranks = list(range(1, size + 1))
+        if shuffle:
+            self.rng.shuffle(ranks)
+        return list(accumulate(1 / rank**self.zipf for rank in ranks))
+
+    def _choice(self, cum_weights):
+        """Index picked with "cum_weights", as random.choices does but without building a list for each pick."""
+        return bisect_left(cum_weights, self.rng.random() * cum_weights[-1])
+
+    def _get_text(self, min_words, max_words):
+        words = (
+            self.words[self._choice(self.words_cum_weights)] for _ in range(self.rng.randint(min_words, max_words))
+        )
+        return " ".join(words).capitalize()
+
+    def _get_created(self, since=None):
+        since = since or self.since
+        return since + (self.now - since) * self.rng.random()
+
+    # loaders
+
+    def _copy(self, model, columns, rows):
+        """Load "rows" (tuples in the order of "columns") into the model's table, "batch_size" rows per COPY."""
+        # with an explicit NULL marker, empty values are empty strings instead of NULLs
+        sql = f"COPY {model._meta.db_table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        with connection.cursor() as cursor:
+            buffer = StringIO()
+            writer = csv.writer(buffer)
+            for num, row in enumerate(rows, start=1):
+                writer.writerow(row)
+                if num % self.batch_size == 0:
+                    buffer.seek(0)
+                    cursor.copy_expert(sql, buffer)
+                    buffer = StringIO()
+                    writer = csv.writer(buffer)
+            if buffer.tell():
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+
+    def _create_users(self, count, prefix, password):
+        password = make_password(password)  # hashed once, it's slow on purpose
+        columns = (
+            "username",
+            "email",
+            "password",
+            "first_name",
+            "last_name",
+            "is_superuser",
+            "is_staff",
+            "is_active",
+            "date_joined",
+            "created",
+            "publications_count",
+            "comments_count",
+            "followers_count",
+            "following_count",
+        )
+
+        def rows():
+            for num in range(count):
+                username, created = f"{prefix}{num}", self._get_created()
+                yield username, f"{username}@bench.localhost", password, "", "", 0, 0, 1, created, created, 0, 0, 0, 0
+
+        self._copy(User, columns, rows())
+        # identities increase along a COPY, so the ids follow the order of the usernames
+        return list(User.objects.filter(username__startswith=prefix).order_by("id").values_list("id", flat=True))
+
+    def _create_follows(self, user_ids, follows_per_user):
+        popularity = self._get_cum_weights(len(user_ids))
+        max_follows = len(user_ids) // 2  # picking targets by rejection gets slow close to everyone
+        edges = 0
+
+        def rows():
+            nonlocal edges
+            for from_index, from_user_id in enumerate(user_ids):
+                follows = min(round(self.rng.expovariate(1 / follows_per_user)), max_follows)
+                to_indexes = set()
+                while len(to_indexes) < follows:
+                    to_index = self._choice(popularity)
+                    if to_index != from_index:
+                        to_indexes.add(to_index)
+                edges += len(to_indexes)
+                for to_index in sorted(to_indexes):
+                    yield from_user_id, user_ids[to_index]
+
+        self._copy(Follow, ("from_user_id", "to_user_id"), rows())
+        return range(edges)
+
+    def _create_publications(self, user_ids, count):
+        activity = self._get_cum_weights(len(user_ids))
+        last_id = Publication.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+
+        def rows():
+            for _ in range(count):
+                author_id = user_ids[self._choice(activity)]
+                yield self._get_created(), self._get_text(3, 10), self._get_text(20, 150), author_id, False, 0, "[]"
+
+        columns = ("created", "title", "content", "author_id", "fanned_out", "comments_count", "recent_comments")
+        self._copy(Publication, columns, rows())
+        return list(Publication.objects.filter(id__gt=last_id).order_by("id").values_list("id", "created"))
+
+    def _create_comments(self, user_ids, publication_rows, count):
+        popularity = self._get_cum_weights(len(publication_rows))
+
+        def rows():
+            for _ in range(count):
+                publication_id, publication_created = publication_rows[self._choice(popularity)]
+                author_id = user_ids[self.rng.randrange(len(user_ids))]
+                yield self._get_created(since=publication_created), self._get_text(5, 40), author_id, publication_id
+
+        self._copy(PublicationComment, ("created", "content", "author_id", "publication_id"), rows())
+        return range(count)
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:18
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and it doesn't lock the tables against writes
+    atomic = False
+
+    dependencies = [
+        ("publications", "0004_remove_publication_updated_and_more"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="publication",
+            index=models.Index(fields=["-created", "-id"], name="publication_created_id_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="publication",
+            index=models.Index(fields=["author", "-created"], name="publication_author_created_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="publicationcomment",
+            index=models.Index(fields=["publication", "-created", "-id"], name="pubcomment_pub_created_id_idx"),
+        ),
+    ]
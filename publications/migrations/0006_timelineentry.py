@@ -0,0 +1,82 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:26
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and it doesn't lock the tables against writes
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("publications", "0005_publication_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimelineEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="publication",
+            name="fanned_out",
+            field=models.BooleanField(
+                default=False,
+                help_text="True when the Publication was copied to its author's followers timelines when created, otherwise the feed reads it from here. Check signals 'publications.set_publication_fanned_out' and 'publications.fan_out_publication'",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="publication",
+            index=models.Index(
+                condition=models.Q(("fanned_out", False)),
+                fields=["-created", "-id"],
+                name="publication_not_fanned_out_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="timelineentry",
+            name="owner",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="timeline_entries",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="timelineentry",
+            name="publication",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="timeline_entries",
+                to="publications.publication",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="timelineentry",
+            index=models.Index(
+                fields=["owner", "-created", "-publication"],
+                name="timeline_owner_created_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="timelineentry",
+            constraint=models.UniqueConstraint(
+                fields=("owner", "publication"), name="timeline_owner_publication_uniq"
+            ),
+        ),
+    ]
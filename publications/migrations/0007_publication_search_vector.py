@@ -0,0 +1,66 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:55
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The text search configuration must be the one of the queries, check "PublicationFilter.filter_search"
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('pg_catalog.english', coalesce({table}.title, '')), 'A') || "
+    "setweight(to_tsvector('pg_catalog.english', coalesce({table}.content, '')), 'B')"
+)
+
+CREATE_TRIGGER_SQL = f"""
+CREATE FUNCTION publication_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR_SQL.format(table="NEW")};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER publication_search_vector_trigger
+BEFORE INSERT OR UPDATE OF title, content, search_vector ON publications_publication
+FOR EACH ROW EXECUTE FUNCTION publication_search_vector_update();
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER publication_search_vector_trigger ON publications_publication;
+DROP FUNCTION publication_search_vector_update();
+"""
+
+BACKFILL_SQL = (
+    "UPDATE publications_publication "
+    f"SET search_vector = {SEARCH_VECTOR_SQL.format(table='publications_publication')} "
+    "WHERE search_vector IS NULL;"
+)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and it doesn't lock the tables against writes
+    atomic = False
+
+    dependencies = [
+        ("publications", "0006_timelineentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="publication",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False,
+                help_text="Weighted 'title' (A) and 'content' (B) lexemes, written by the DB trigger 'publication_search_vector_trigger' on every INSERT and UPDATE (bulk_create included)",
+                null=True,
+            ),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, reverse_sql=DROP_TRIGGER_SQL),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+        # built once the existing rows are filled, instead of updating the index row by row
+        AddIndexConcurrently(
+            model_name="publication",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="publication_search_vector_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+# Both columns start empty ("ADD COLUMN" with a default doesn't rewrite the table), the existing publications are
+# backfilled by "python manage.py rebuild_publication_comments" after migrating.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("publications", "0007_publication_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="publication",
+            name="comments_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Each time a PublicationComment is created, this field is updated. Check 'publications.serializers.add_recent_comments'",
+            ),
+        ),
+        migrations.AddField(
+            model_name="publication",
+            name="recent_comments",
+            field=models.JSONField(
+                default=list,
+                editable=False,
+                help_text="The last RECENT_COMMENTS_SIZE comments as PublicationCommentSerializer represents them, newest first. Each time a PublicationComment is created, this field is updated. Check 'publications.serializers.add_recent_comments' and command 'rebuild_publication_comments'",
+            ),
+        ),
+    ]
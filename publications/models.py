@@ -1,10 +1,26 @@
-from django.db.models import CASCADE, CharField, ForeignKey, TextField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models import (
+    CASCADE,
+    BooleanField,
+    CharField,
+    DateTimeField,
+    ForeignKey,
+    Index,
+    JSONField,
+    Model,
+    PositiveIntegerField,
+    Q,
+    TextField,
+    UniqueConstraint,
+)
 
 from utils.models import TimeStampModel
 
 __all__ = (
     "Publication",
     "PublicationComment",
+    "TimelineEntry",
 )
 
 
@@ -13,6 +29,52 @@ class Publication(TimeStampModel):
     title = CharField(max_length=200, blank=False, null=False)
     # "max_length" in a "TextField" is used to validate Forms but not as constraint in the DB
     content = TextField(max_length=5_000, blank=False, null=False)
+    fanned_out = BooleanField(
+        default=False,
+        help_text=(
+            "True when the Publication was copied to its author's followers timelines when created, otherwise the "
+            "feed reads it from here. Check signals 'publications.set_publication_fanned_out' and "
+            "'publications.fan_out_publication'"
+        ),
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        help_text=(
+            "Weighted 'title' (A) and 'content' (B) lexemes, written by the DB trigger "
+            "'publication_search_vector_trigger' on every INSERT and UPDATE (bulk_create included)"
+        ),
+    )
+    comments_count = PositiveIntegerField(
+        default=0,
+        help_text=(
+            "Each time a PublicationComment is created, this field is updated. "
+            "Check 'publications.serializers.add_recent_comments'"
+        ),
+    )
+    recent_comments = JSONField(
+        default=list,
+        editable=False,
+        help_text=(
+            "The last RECENT_COMMENTS_SIZE comments as PublicationCommentSerializer represents them, newest first. "
+            "Each time a PublicationComment is created, this field is updated. "
+            "Check 'publications.serializers.add_recent_comments' and command 'rebuild_publication_comments'"
+        ),
+    )
+
+    RECENT_COMMENTS_SIZE = 3
+
+    class Meta:
+        indexes = [
+            # feed ordering (and keyset pagination) without a sort step
+            Index(fields=["-created", "-id"], name="publication_created_id_idx"),
+            # "author" filter of PublicationFilter, alone or together with the "created" range
+            Index(fields=["author", "-created"], name="publication_author_created_idx"),
+            # publications the feed reads on demand (fan-out on read)
+            Index(fields=["-created", "-id"], condition=Q(fanned_out=False), name="publication_not_fanned_out_idx"),
+            # full text search of PublicationFilter ("q")
+            GinIndex(fields=["search_vector"], name="publication_search_vector_idx"),
+        ]
 
 
 class PublicationComment(TimeStampModel):
@@ -20,3 +82,27 @@ class PublicationComment(TimeStampModel):
     publication = ForeignKey("publications.Publication", on_delete=CASCADE, related_name="comments")
     # "max_length" in a "TextField" is used to validate Forms but not as constraint in the DB
     content = TextField(max_length=2_000, blank=False, null=False)
+
+    class Meta:
+        indexes = [
+            # comments of a publication from newest to oldest (comments list and last 3 comments)
+            Index(fields=["publication", "-created", "-id"], name="pubcomment_pub_created_id_idx"),
+        ]
+
+
+class TimelineEntry(Model):
+    """A Publication materialized in the home timeline (GET /api/feed/) of one of its author's followers."""
+
+    # indexed by "timeline_owner_created_idx"
+    owner = ForeignKey("users.User", on_delete=CASCADE, related_name="timeline_entries", db_index=False)
+    publication = ForeignKey("publications.Publication", on_delete=CASCADE, related_name="timeline_entries")
+    # copy of "publication.created", so the timeline is paged on its own index
+    created = DateTimeField()
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=["owner", "publication"], name="timeline_owner_publication_uniq"),
+        ]
+        indexes = [
+            Index(fields=["owner", "-created", "-publication"], name="timeline_owner_created_idx"),
+        ]
@@ -1,25 +1,105 @@
-from rest_framework.serializers import JSONField, ModelSerializer
+from collections import Counter, defaultdict
 
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Func
+from django.db.models import JSONField as JSONModelField
+from django.db.models import Value, Window
+from django.db.models.functions import Cast, RowNumber
+
+from rest_framework.serializers import FloatField, JSONField, ModelSerializer, SerializerMethodField
+
+from publications.caches import publication_detail_cache
 from publications.models import Publication, PublicationComment
+from publications.tasks import copy_publications_to_timelines, increment_user_counter
+from users.models import Follow
+from utils.serializers import BulkCreateListSerializer
 
 __all__ = (
+    "add_recent_comments",
+    "is_fanned_out",
+    "rebuild_recent_comments",
     "PublicationCreateSerializer",
     "PublicationSerializer",
+    "PublicationSearchSerializer",
+    "PublicationCommentBulkCreateSerializer",
     "PublicationCommentSerializer",
 )
 
 
+class AuthorCounterBulkCreateListSerializer(BulkCreateListSerializer):
+    """
+    "bulk_create" doesn't send "post_save", so the authors' counter of the created rows ("counter_field") is increased
+    once per author per batch instead of the per row signals.
+    """
+
+    counter_field = None
+
+    def batch_created(self, instances):
+        for author_id, count in Counter(instance.author_id for instance in instances).items():
+            increment_user_counter.enqueue(author_id, self.counter_field, count)
+
+
+class PublicationBulkCreateListSerializer(AuthorCounterBulkCreateListSerializer):
+    """
+    Nor does it send "pre_save": the publications are fanned out (or not) once per author, as the signals
+    'publications.set_publication_fanned_out' and 'publications.fan_out_publication' do for single ones.
+    """
+
+    counter_field = "publications_count"
+
+    def create(self, validated_data):
+        fanned_out = dict()
+        for attrs in validated_data:
+            author_id = attrs["author"].pk
+            if author_id not in fanned_out:
+                fanned_out[author_id] = is_fanned_out(author_id)
+            attrs["fanned_out"] = fanned_out[author_id]
+        return super().create(validated_data)
+
+    def batch_created(self, instances):
+        super().batch_created(instances)
+        publication_ids = [instance.pk for instance in instances if instance.fanned_out]
+        if publication_ids:
+            copy_publications_to_timelines.enqueue(
+                publication_ids, idempotency_key=f"publication_fan_out:{publication_ids[0]}-{publication_ids[-1]}"
+            )
+
+
+class PublicationCommentBulkCreateListSerializer(AuthorCounterBulkCreateListSerializer):
+    counter_field = "comments_count"
+
+    def batch_created(self, instances):
+        super().batch_created(instances)
+        add_recent_comments(instances)
+        for publication_id in {instance.publication_id for instance in instances}:
+            transaction.on_commit(
+                lambda publication_id=publication_id: publication_detail_cache.invalidate(publication_id)
+            )
+
+
 class PublicationSerializer(ModelSerializer):
     content = JSONField()
 
     class Meta:
         model = Publication
-        fields = "__all__"
+        exclude = ("fanned_out", "search_vector", "recent_comments")
+
+
+class PublicationSearchSerializer(PublicationSerializer):
+    """Result of the full text search ("q" of PublicationFilter), which annotates the rank and the highlights."""
+
+    rank = FloatField(read_only=True)
+    highlight = SerializerMethodField()
+
+    def get_highlight(self, obj):
+        return {"title": obj.title_highlight, "content": obj.content_highlight}
 
 
 class PublicationCreateSerializer(ModelSerializer):
     content = JSONField()
 
+    @transaction.atomic  # the "post_save" counter update runs in the same transaction as the INSERT
     def create(self, validated_data):
         validated_data["author"] = self.context["request"].user
         return super().create(validated_data)
@@ -32,6 +112,7 @@ class PublicationCreateSerializer(ModelSerializer):
     class Meta:
         model = Publication
         fields = ("title", "content")
+        list_serializer_class = PublicationBulkCreateListSerializer
 
 
 class PublicationCommentCreateSerializer(ModelSerializer):
@@ -41,6 +122,7 @@ class PublicationCommentCreateSerializer(ModelSerializer):
         model = PublicationComment
         fields = ("content", "publication")
 
+    @transaction.atomic  # the "post_save" counter update runs in the same transaction as the INSERT
     def create(self, validated_data):
         validated_data["author"] = self.context["author"]
         return super().create(validated_data)
@@ -51,9 +133,107 @@ class PublicationCommentCreateSerializer(ModelSerializer):
         return data
 
 
+class PublicationCommentBulkCreateSerializer(ModelSerializer):
+    """Item of a bulk of comments to the same publication, "author" and "publication" are given to "save"."""
+
+    content = JSONField()
+
+    class Meta:
+        model = PublicationComment
+        fields = ("content",)
+        list_serializer_class = PublicationCommentBulkCreateListSerializer
+
+    def to_representation(self, obj):
+        data = super().to_representation(obj)
+        data["author"] = obj.author_id
+        data["publication"] = obj.publication_id
+        return data
+
+
 class PublicationCommentSerializer(ModelSerializer):
     content = JSONField()
 
     class Meta:
         model = PublicationComment
         fields = "__all__"
+
+
+def is_fanned_out(author_id):
+    """Whether the new publications of the author are fanned out on write: up to FEED_FANOUT_MAX_FOLLOWERS followers."""
+    return not Follow.objects.filter(to_user_id=author_id)[settings.FEED_FANOUT_MAX_FOLLOWERS :].exists()
+
+
+# "Publication.comments_count" and "Publication.recent_comments" are kept by the comments' write path: the post_save
+# signal 'publications.update_publication_comments' for single comments, the bulk serializer for bulks.
+
+
+class _PrependToJSONArray(Func):
+    """The items of the JSON array "items" followed by the ones of "expression", up to "size" items."""
+
+    arg_joiner = " || "
+    template = "jsonb_path_query_array(%(expressions)s, '$[0 to %(last_index)s]')"
+
+    def __init__(self, items, expression, size):
+        items = Cast(Value(items, output_field=JSONModelField()), JSONModelField())
+        super().__init__(items, expression, last_index=int(size) - 1, output_field=JSONModelField())
+
+
+def add_recent_comments(comments):
+    """
+    Count the just created "comments" (oldest first) in their publications and put the newest ones first in their
+    "recent_comments", with one UPDATE per publication. Both are computed from the row locked by the UPDATE, so
+    concurrent comments to the same publication aren't lost.
+    """
+    size = Publication.RECENT_COMMENTS_SIZE
+    comments_by_publication = defaultdict(list)
+    for comment in comments:
+        comments_by_publication[comment.publication_id].append(comment)
+
+    for publication_id, publication_comments in comments_by_publication.items():
+        newest_comments = PublicationCommentSerializer(publication_comments[: -size - 1 : -1], many=True).data
+        Publication.objects.filter(pk=publication_id).update(
+            comments_count=F("comments_count") + len(publication_comments),
+            recent_comments=_PrependToJSONArray(newest_comments, F("recent_comments"), size),
+        )
+
+
+def rebuild_recent_comments(publication_ids):
+    """
+    Recompute "comments_count" and "recent_comments" of the publications from their comments, and save the ones
+    that drifted. Returns how many were saved. The publications are locked meanwhile, comments created concurrently
+    wait for it instead of being overwritten.
+    """
+    size = Publication.RECENT_COMMENTS_SIZE
+    with transaction.atomic():
+        publications = list(
+            Publication.objects.filter(pk__in=publication_ids)
+            .select_for_update()
+            .only("id", "comments_count", "recent_comments")
+            .order_by("id")
+        )
+        comments = PublicationComment.objects.filter(
+            publication_id__in=[publication.id for publication in publications]
+        )
+        counts = dict(comments.order_by().values_list("publication_id").annotate(count=Count("id")))
+        recent_comments = defaultdict(list)
+        for comment in (
+            comments.annotate(
+                row_number=Window(RowNumber(), partition_by=F("publication_id"), order_by=("-created", "-id"))
+            )
+            .filter(row_number__lte=size)
+            .order_by("publication_id", "-created", "-id")
+        ):
+            recent_comments[comment.publication_id].append(comment)
+
+        drifted_publications = list()
+        for publication in publications:
+            expected = (
+                counts.get(publication.id, 0),
+                PublicationCommentSerializer(recent_comments[publication.id], many=True).data,
+            )
+            if (publication.comments_count, publication.recent_comments) != expected:
+                publication.comments_count, publication.recent_comments = expected
+                drifted_publications.append(publication)
+
+        Publication.objects.bulk_update(drifted_publications, ["comments_count", "recent_comments"])
+    return len(drifted_publications)
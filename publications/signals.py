@@ -1,29 +1,115 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from publications.models import Publication, PublicationComment
+from publications.caches import publication_detail_cache
+from publications.models import Publication, PublicationComment, TimelineEntry
+from publications.serializers import add_recent_comments, is_fanned_out, rebuild_recent_comments
+from publications.tasks import copy_publications_to_timelines, increment_user_counter
+from users.models import Follow
 
 __all__ = (
     "update_user_publications_count",
     "update_user_comments_count",
+    "update_publication_comments",
+    "rebuild_publication_comments",
+    "invalidate_publication_detail_cache",
+    "set_publication_fanned_out",
+    "fan_out_publication",
+    "update_follower_timeline",
 )
 
 
+# The counters are incremented by the DB itself ("SET x = x + 1"), so concurrent writes of the same author don't lose
+# increments. Errors are not swallowed: the creating transaction must be rolled back together with the counter. With
+# settings.USER_COUNTERS_WRITE_BEHIND, the increments are buffered after commit and flushed in batches instead (check
+# "publications.counters.user_counters"). With settings.TASK_QUEUE_ENABLED, they are tasks run by the workers, enqueued
+# in the creating transaction (check "tasks.queue").
+
+
 @receiver(post_save, sender=Publication)
 def update_user_publications_count(sender, instance, created, **kwargs):
     if created:
-        instance.author.publications_count += 1
-        try:
-            instance.author.save(update_fields=["publications_count"])
-        except Exception as exc:
-            print(f"Signal 'update_user_publications_count' error: {exc}")
+        increment_user_counter.enqueue(
+            instance.author_id, "publications_count", idempotency_key=f"publication_author_count:{instance.pk}"
+        )
 
 
 @receiver(post_save, sender=PublicationComment)
 def update_user_comments_count(sender, instance, created, **kwargs):
     if created:
-        instance.author.comments_count += 1
-        try:
-            instance.author.save(update_fields=["comments_count"])
-        except Exception as exc:
-            print(f"Signal 'update_user_publications_count' error: {exc}")
+        increment_user_counter.enqueue(
+            instance.author_id, "comments_count", idempotency_key=f"comment_author_count:{instance.pk}"
+        )
+
+
+@receiver(post_save, sender=PublicationComment)
+def update_publication_comments(sender, instance, created, **kwargs):
+    if created:
+        add_recent_comments([instance])
+
+
+@receiver(post_delete, sender=PublicationComment)
+def rebuild_publication_comments(sender, instance, **kwargs):
+    # comments are only deleted outside the API (e.g. the admin, or deleting their author), recomputed after commit
+    publication_id = instance.publication_id
+    transaction.on_commit(lambda: rebuild_recent_comments([publication_id]))
+
+
+@receiver(post_save, sender=PublicationComment)
+@receiver(post_delete, sender=PublicationComment)
+def invalidate_publication_detail_cache(sender, instance, created=True, **kwargs):
+    if created:
+        # after commit, otherwise a concurrent read could cache the detail again without the new (or deleted) comment
+        publication_id = instance.publication_id
+        transaction.on_commit(lambda: publication_detail_cache.invalidate(publication_id))
+
+
+# Home timelines are materialized when a Publication is created (fan-out on write, a task), unless its author has more
+# than settings.FEED_FANOUT_MAX_FOLLOWERS followers: those publications are read on demand by the feed (fan-out on
+# read).
+
+
+@receiver(pre_save, sender=Publication)
+def set_publication_fanned_out(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance.fanned_out = is_fanned_out(instance.author_id)
+
+
+@receiver(post_save, sender=Publication)
+def fan_out_publication(sender, instance, created, **kwargs):
+    if created and instance.fanned_out:
+        copy_publications_to_timelines.enqueue([instance.pk], idempotency_key=f"publication_fan_out:{instance.pk}")
+
+
+@receiver(m2m_changed, sender=Follow)
+def update_follower_timeline(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove") or not pk_set:
+        return
+
+    # "reverse" when the relation is changed from the followed user side ("followed.followers.add(...)")
+    follower_ids, followed_ids = (list(pk_set), [instance.pk]) if reverse else ([instance.pk], list(pk_set))
+    if action == "post_remove":
+        TimelineEntry.objects.filter(owner_id__in=follower_ids, publication__author_id__in=followed_ids).delete()
+        return
+
+    # the latest fanned out publications of each followed user (the others are already read on demand), in one query
+    # however many users are followed: a LATERAL join runs the "author, -created" index scan for each one
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT publication.id, publication.created FROM unnest(%s) AS followed(id) CROSS JOIN LATERAL ("
+            f"SELECT id, created FROM {Publication._meta.db_table} WHERE author_id = followed.id AND fanned_out "
+            f"ORDER BY created DESC, id DESC LIMIT %s) AS publication;",
+            [followed_ids, settings.FEED_BACKFILL_SIZE],
+        )
+        publications = cursor.fetchall()
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(owner_id=follower_id, publication_id=pk, created=created)
+            for follower_id in follower_ids
+            for pk, created in publications
+        ],
+        ignore_conflicts=True,
+        batch_size=settings.BULK_CREATE_BATCH_SIZE,
+    )
@@ -0,0 +1,33 @@
+from django.db import connection
+
+from publications.counters import user_counters
+from publications.models import Publication, TimelineEntry
+from tasks.queue import task
+from users.models import Follow
+
+__all__ = (
+    "copy_publications_to_timelines",
+    "increment_user_counter",
+)
+
+
+# Side effects of creating publications and comments, enqueued by their signals (check "publications.signals").
+
+
+@task
+def increment_user_counter(user_id, field, delta=1):
+    user_counters.increment(user_id, field, delta)
+
+
+@task
+def copy_publications_to_timelines(publication_ids):
+    # one INSERT ... SELECT: nothing for the publications deleted meanwhile, and followers that followed the author
+    # meanwhile have them already (check "update_follower_timeline")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {TimelineEntry._meta.db_table} (owner_id, publication_id, created) "
+            f"SELECT follow.from_user_id, publication.id, publication.created FROM {Publication._meta.db_table} "
+            f"publication JOIN {Follow._meta.db_table} follow ON follow.to_user_id = publication.author_id "
+            f"WHERE publication.id = ANY(%s) ON CONFLICT DO NOTHING;",
+            [list(publication_ids)],
+        )
@@ -1,17 +1,64 @@
+import csv
+import gzip
+import json
+
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from decimal import Decimal
+from fnmatch import fnmatch
+from io import StringIO
+from time import sleep
 from urllib.parse import urlencode
+from uuid import UUID
+from zoneinfo import ZoneInfo
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import F, Value
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy
+
+import brotli
 
-from pytest import fixture, mark
+from pytest import fixture, mark, raises
 from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
-from publications.models import Publication
+from publications.caches import publication_detail_cache
+from publications.counters import reconcile_author_counters, user_counters
+from publications.filters import PublicationFilter
+from publications.models import Publication, PublicationComment, TimelineEntry
+from publications.serializers import (
+    PublicationBulkCreateListSerializer,
+    PublicationCommentSerializer,
+    PublicationSearchSerializer,
+    PublicationSerializer,
+)
 from publications.signals import update_user_comments_count, update_user_publications_count
 from publications.tests.factories import PublicationCommentFactory, PublicationFactory
+from publications.views import get_publication_detail_data
+from users.models import Follow
+from users.serializers import UserDetailWithFollowsSerializer, UserSerializer
 from users.tests.factories import UserFactory
+from utils.authentication import CachingTokenAuthentication, token_cache
+from utils.caches import LRUCache, RedisCache
+from utils.counters import LocalCounterBuffer, RedisCounterBuffer
+from utils.db_routers import ReplicaRouter, health_check, read_from_replicas
+from utils.metrics import registry
+from utils.middleware import replica_pin_cache
+from utils.paginations import count_cache
+from utils.partitions import MonthlyPartitions, add_months
+from utils.query_budget import assert_query_budget
+from utils.renderers import ORJSONRenderer
+from utils.serializers import LeanSerializer
 
 User = get_user_model()
 
@@ -57,6 +104,21 @@ class TestPublicationModelViewSet:
             reverse(f"{self.reverse_name}-comments", kwargs={"pk": pk}), headers=headers, data=data, format="json"
         )
 
+    def _post_bulk(self, data, authenticate=True):
+        headers = self._get_auth_token_headers() if authenticate else dict()
+        return self.client.post(reverse(f"{self.reverse_name}-bulk"), data, headers=headers, format="json")
+
+    def _post_comments_bulk(self, pk, data, authenticate=True):
+        headers = self._get_auth_token_headers() if authenticate else dict()
+        return self.client.post(
+            reverse(f"{self.reverse_name}-comments-bulk", kwargs={"pk": pk}), data, headers=headers, format="json"
+        )
+
+    def _export(self, query_params=None, pk=None, authenticate=True):
+        url = reverse(f"{self.reverse_name}-{'comments-export' if pk else 'export'}", kwargs={"pk": pk} if pk else None)
+        headers = self._get_auth_token_headers() if authenticate else dict()
+        return self.client.get(url, query_params, headers=headers)
+
     def _get_comments(self, pk, authenticate=True):
         headers = self._get_auth_token_headers() if authenticate else dict()
         return self.client.get(
@@ -117,7 +179,7 @@ class TestPublicationModelViewSet:
 
         createds, createds_2 = list(), list()
         for res in response.data["results"]:
-            assert set(res.keys()) == {"author", "content", "created", "id", "title"}
+            assert set(res.keys()) == {"author", "comments_count", "content", "created", "id", "title"}
             createds.append(res["created"])
             createds_2.append(res["created"])
 
@@ -138,6 +200,19 @@ class TestPublicationModelViewSet:
 
         assert response.status_code == status.HTTP_200_OK
 
+    @mark.success
+    @mark.django_db
+    def test_list_publications_comments_count(self):
+        # "comments_count" is in the posts of the list, detail, search, feed and export, "recent_comments" is not
+        pub, other_pub = PublicationFactory(author=self.user), PublicationFactory(author=self.user)
+        PublicationCommentFactory.create_batch(2, author=self.user, publication=pub)
+
+        response = self._list_data()
+        counts = {res["id"]: res["comments_count"] for res in response.data["results"]}
+        assert counts == {pub.id: 2, other_pub.id: 0}
+        assert not any("recent_comments" in res for res in response.data["results"])
+        assert response.status_code == status.HTTP_200_OK
+
     @mark.success
     @mark.django_db
     def test_list_publications_with_filter_success(self):
@@ -177,6 +252,114 @@ class TestPublicationModelViewSet:
         assert [res["id"] for res in response_page_2.data["results"]] == filtered_pubs_ids[4:]
         assert response.status_code == status.HTTP_200_OK
 
+    @mark.success
+    @mark.django_db
+    def test_list_publications_cursor_success(self):
+        now = datetime.now()
+        created = now - timedelta(days=3)
+        pubs = [PublicationFactory(author=self.user, created=now - timedelta(days=num)) for num in range(5)]
+        pubs += [PublicationFactory(author=self.user, created=created) for _ in range(3)]  # ties on "created"
+        expected_ids = list(Publication.objects.order_by("-created", "-id").values_list("id", flat=True))
+        headers = self._get_auth_token_headers()
+
+        url = f"{reverse(f'{self.reverse_name}-list')}?{urlencode({'pagination': 'cursor', 'page_size': 3})}"
+        ids, pages = list(), list()
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = self.client.get(url, headers=headers, format="json")
+                assert response.status_code == status.HTTP_200_OK
+                assert set(response.data.keys()) == {"next", "previous", "page_size", "results"}
+                ids += [res["id"] for res in response.data["results"]]
+                pages.append(response.data)
+                url = response.data["next"]
+
+        assert ids == expected_ids
+        assert len(pages) == 3
+        assert pages[0]["previous"] is None
+        assert not any("COUNT(" in query["sql"] for query in queries.captured_queries)
+
+        # walking back from the last page returns the previous page unchanged
+        response = self.client.get(pages[-1]["previous"], headers=headers, format="json")
+        assert [res["id"] for res in response.data["results"]] == [res["id"] for res in pages[-2]["results"]]
+        assert response.status_code == status.HTTP_200_OK
+
+    @mark.success
+    @mark.django_db
+    def test_list_publications_cursor_with_filter_success(self):
+        now, user_2 = datetime.now(), UserFactory()
+        for num in (5, 10, 15, 20, 25, 30, 35, 40):
+            PublicationFactory(author=self.user, created=now - timedelta(days=num))
+            PublicationFactory(author=user_2, created=now - timedelta(days=num))
+
+        from_date = now - timedelta(days=37)
+        to_date = now - timedelta(days=7)
+        query_params = {
+            "pagination": "cursor",
+            "author": self.user.id,
+            "from_date": from_date.strftime("%d-%m-%Y"),
+            "to_date": to_date.strftime("%d-%m-%Y"),
+            "page_size": 4,
+        }
+        filtered_pubs_ids = list(
+            Publication.objects.filter(author_id=self.user.id, created__gte=from_date, created__lte=to_date)
+            .order_by("-created", "-id")
+            .values_list("id", flat=True)
+        )
+
+        response = self._list_data(query_params=query_params)
+        assert [res["id"] for res in response.data["results"]] == filtered_pubs_ids[:4]
+
+        response_page_2 = self.client.get(response.data["next"], headers=self._get_auth_token_headers())
+        assert [res["id"] for res in response_page_2.data["results"]] == filtered_pubs_ids[4:]
+        assert response_page_2.data["next"] is None
+        assert response_page_2.status_code == status.HTTP_200_OK
+
+    @mark.success
+    @mark.django_db
+    def test_list_publications_search_success(self):
+        in_title = PublicationFactory(author=self.user, title="Running Django", content="nothing else")
+        in_content = PublicationFactory(author=self.user, title="a title", content="we run django apps")
+        PublicationFactory(author=self.user, title="another title", content="flask apps")
+        self._post_bulk([{"title": "bulk", "content": "bulk created, django runs here"}])  # written without signals
+        bulk_created = Publication.objects.get(title="bulk")
+
+        response = self._list_data(query_params={"q": "django run"})
+
+        # stemmed matches, title matches ranked first
+        results = {item["id"]: item for item in response.data["results"]}
+        assert list(results)[0] == in_title.id
+        assert set(results) == {in_title.id, in_content.id, bulk_created.id}
+        assert results[in_title.id]["highlight"]["title"] == "<mark>Running</mark> <mark>Django</mark>"
+        assert (
+            results[in_content.id]["highlight"]["content"] == "<mark>run</mark> <mark>django</mark> apps"
+        )  # fragment around the matches
+        assert results[in_title.id]["rank"] > results[in_content.id]["rank"]
+        assert response.status_code == status.HTTP_200_OK
+
+        in_content.content = "we run flask apps"  # the trigger updates the search vector
+        in_content.save()
+        response = self._list_data(query_params={"q": 'django -"bulk created"', "author": self.user.id})
+        assert [item["id"] for item in response.data["results"]] == [in_title.id]
+        assert response.data["total_items"] == 1
+
+    @mark.error
+    @mark.django_db
+    def test_list_publications_invalid_cursor_error(self):
+        response = self._list_data(query_params={"cursor": "not-a-cursor"})
+        assert response.json()["detail"] == "Invalid cursor"
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    @mark.error
+    @mark.django_db
+    def test_list_publications_search_with_cursor_error(self):
+        PublicationFactory(author=self.user, title="django")
+        for query_params in ({"q": "django", "pagination": "cursor"}, {"q": "django", "cursor": "any"}):
+            response = self._list_data(query_params=query_params)
+            assert response.json() == {
+                "q": ["Search results are ranked, they can't be paged with 'pagination=cursor'."]
+            }
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+
     @mark.unauthorized
     @mark.django_db
     def test_list_without_auth(self):
@@ -199,9 +382,9 @@ class TestPublicationModelViewSet:
 
         # fmt: off
         assert set(response.data["author"].keys()) == {
-            'comments_count', 'created', 'date_joined', 'email', 'first_name', 'id', 'is_active',
-            'is_staff', 'is_superuser', 'last_login', 'last_name', 'publications_count',
-            'username'
+            'comments_count', 'created', 'date_joined', 'email', 'first_name', 'followers_count',
+            'following_count', 'id', 'is_active', 'is_staff', 'is_superuser', 'last_login', 'last_name',
+            'publications_count', 'username'
         }
         # fmt: on
         assert response.data["author"]["id"] == self.user.id
@@ -212,7 +395,14 @@ class TestPublicationModelViewSet:
 
         assert set(comment_data["id"] for comment_data in response.data["last_3_comments"]) == set(comment_ids[-3:])
 
-        assert set(response.data["publication"].keys()) == {"author", "content", "created", "id", "title"}
+        assert set(response.data["publication"].keys()) == {
+            "author",
+            "comments_count",
+            "content",
+            "created",
+            "id",
+            "title",
+        }
         assert response.data["publication"]["id"] == pub.id
 
         assert response.status_code == status.HTTP_200_OK
@@ -252,6 +442,21 @@ class TestPublicationModelViewSet:
         assert self.user.comments_count == 1
         assert response.status_code == status.HTTP_201_CREATED
 
+    @mark.success
+    @mark.django_db
+    def test_user_counters_increment_is_atomic(self):
+        # two stale copies of the same author, as two concurrent requests would hold
+        author_copy_1, author_copy_2 = User.objects.get(pk=self.user.pk), User.objects.get(pk=self.user.pk)
+
+        pub = PublicationFactory(author=author_copy_1)
+        PublicationFactory(author=author_copy_2)
+        PublicationCommentFactory(author=author_copy_1, publication=pub)
+        PublicationCommentFactory(author=author_copy_2, publication=pub)
+
+        self.user.refresh_from_db()
+        assert self.user.publications_count == 2
+        assert self.user.comments_count == 2
+
     @mark.unauthorized
     @mark.django_db
     def test_publication_comment_without_auth(self):
@@ -301,3 +506,1833 @@ class TestPublicationModelViewSet:
         response = self._get_comments(pub.id, authenticate=False)
         assert response.json()["detail"] == "Authentication credentials were not provided."
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @mark.success
+    @mark.django_db
+    def test_bulk_create_publications_success(self, settings):
+        settings.BULK_CREATE_BATCH_SIZE = 2
+        data = [{"title": f"title {num}", "content": f"content {num}"} for num in range(3)]
+        data.insert(1, {"title": True, "content": [1, 2, 3]})
+        headers = self._get_auth_token_headers()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse(f"{self.reverse_name}-bulk"), data, headers=headers, format="json")
+
+        inserts = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('INSERT INTO "publications_publication"')
+        ]
+        counter_updates = [
+            query for query in queries.captured_queries if query["sql"].startswith('UPDATE "users_user"')
+        ]
+        assert (len(inserts), len(counter_updates)) == (2, 2)  # one of each per batch
+
+        assert [res["title"] for res in response.data["results"]] == ["title 0", "title 1", "title 2"]
+        assert {res["author"] for res in response.data["results"]} == {self.user.id}
+        assert [error["index"] for error in response.data["errors"]] == [1]
+        assert set(response.data["errors"][0]["errors"].keys()) == {"title"}
+
+        assert Publication.objects.filter(author=self.user).count() == 3
+        self.user.refresh_from_db()
+        assert self.user.publications_count == 3
+        assert response.status_code == status.HTTP_201_CREATED
+
+    @mark.error
+    @mark.django_db
+    def test_bulk_create_publications_bad_data_error(self):
+        response = self._post_bulk(data=[{"title": True}, {"content": "content"}])
+        assert [error["index"] for error in response.data["errors"]] == [0, 1]
+        assert response.data["results"] == []
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = self._post_bulk(data={"title": "title", "content": "content"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        assert Publication.objects.count() == 0
+        self.user.refresh_from_db()
+        assert self.user.publications_count == 0
+
+    @mark.success
+    @mark.django_db
+    def test_bulk_create_empty_list(self):
+        response = self._post_bulk(data=[])
+        assert response.data == {"results": [], "errors": []}
+        assert response.status_code == status.HTTP_201_CREATED
+
+    @mark.error
+    @mark.django_db
+    def test_bulk_create_publications_is_atomic(self, settings, monkeypatch):
+        settings.BULK_CREATE_BATCH_SIZE = 2
+        batch_created = PublicationBulkCreateListSerializer.batch_created
+        batches = list()
+
+        def fail_second_batch(serializer, instances):
+            batches.append(instances)
+            if len(batches) == 2:
+                raise DatabaseError("boom")
+            batch_created(serializer, instances)
+
+        monkeypatch.setattr(PublicationBulkCreateListSerializer, "batch_created", fail_second_batch)
+        with raises(DatabaseError):
+            self._post_bulk(data=[{"title": f"title {num}", "content": "content"} for num in range(3)])
+
+        assert len(batches) == 2
+        assert Publication.objects.count() == 0  # the first batch rolled back too
+        self.user.refresh_from_db()
+        assert self.user.publications_count == 0
+
+    @mark.unauthorized
+    @mark.django_db
+    def test_bulk_create_publications_without_auth(self):
+        response = self._post_bulk(data=[{"title": "title", "content": "content"}], authenticate=False)
+        assert response.json()["detail"] == "Authentication credentials were not provided."
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @mark.success
+    @mark.django_db
+    def test_bulk_create_comments_success(self):
+        pub = PublicationFactory()
+
+        response = self._post_comments_bulk(pub.id, data=[{"content": "comment 1"}, {}, {"content": "comment 2"}])
+
+        assert [res["content"] for res in response.data["results"]] == ["comment 1", "comment 2"]
+        assert {(res["author"], res["publication"]) for res in response.data["results"]} == {(self.user.id, pub.id)}
+        assert [error["index"] for error in response.data["errors"]] == [1]
+        assert pub.comments.count() == 2
+        self.user.refresh_from_db()
+        assert self.user.comments_count == 2
+        assert response.status_code == status.HTTP_201_CREATED
+
+    @mark.error
+    @mark.django_db
+    def test_bulk_create_comments_wrong_publication_id(self):
+        response = self._post_comments_bulk(666, data=[{"content": "comment"}])
+        assert response.json()["detail"] == "No Publication matches the given query."
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    @mark.success
+    @mark.django_db
+    def test_export_publications_ndjson_success(self):
+        now, user_2 = datetime.now(), UserFactory()
+        for num in range(5):
+            PublicationFactory(author=self.user if num % 2 else user_2, created=now - timedelta(days=num))
+
+        response = self._export(query_params={"author": self.user.id})
+
+        assert response.streaming
+        assert response["Content-Type"] == "application/x-ndjson; charset=utf-8"
+        assert response["Content-Disposition"] == 'attachment; filename="posts.ndjson"'
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        # same items as the list, without the page size limit
+        expected = self._list_data(query_params={"author": self.user.id}).json()["results"]
+        assert [json.loads(line) for line in lines] == expected
+        assert len(expected) == 2
+        assert response.status_code == status.HTTP_200_OK
+
+    @mark.success
+    @mark.django_db
+    def test_export_publications_csv_success(self, settings):
+        settings.EXPORT_CHUNK_SIZE = 2  # several round trips of the server-side cursor
+        publications = [PublicationFactory(author=self.user, content=f'content, "{num}"\nend') for num in range(5)]
+
+        response = self._export(query_params={"format": "csv"})
+
+        assert response["Content-Type"] == "text/csv; charset=utf-8"
+        assert response["Content-Disposition"] == 'attachment; filename="posts.csv"'
+        rows = list(csv.DictReader(StringIO(b"".join(response.streaming_content).decode())))
+        assert [int(row["id"]) for row in rows] == [publication.id for publication in reversed(publications)]
+        assert rows[0]["content"] == 'content, "4"\nend'
+        assert rows[0]["author"] == str(self.user.id)
+        assert rows[0]["created"] == self._list_data().json()["results"][0]["created"]
+        assert response.status_code == status.HTTP_200_OK
+
+    @mark.success
+    @mark.django_db
+    def test_export_comments_success(self):
+        pub, pub_2 = PublicationFactory(author=self.user), PublicationFactory()
+        comments = [PublicationCommentFactory(author=self.user, publication=pub) for _ in range(3)]
+        PublicationCommentFactory(author=self.user, publication=pub_2)
+
+        response = self._export(pk=pub.id)
+
+        assert response["Content-Disposition"] == f'attachment; filename="post_{pub.id}_comments.ndjson"'
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert [json.loads(line) for line in lines] == self._get_comments(pub.id).json()["results"]
+        assert {json.loads(line)["id"] for line in lines} == {comment.id for comment in comments}
+        assert response.status_code == status.HTTP_200_OK
+
+    @mark.error
+    @mark.django_db
+    def test_export_errors(self):
+        assert self._export(pk=1234).status_code == status.HTTP_404_NOT_FOUND
+        assert self._export(query_params={"format": "xml"}).status_code == status.HTTP_404_NOT_FOUND
+
+        response = self._export(query_params={"from_date": "not a date"})
+        assert json.loads(response.content) == {"from_date": ["Enter a valid date/time."]}
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @mark.unauthorized
+    @mark.django_db
+    def test_export_without_auth(self):
+        response = self._export(authenticate=False)
+        assert json.loads(response.content)["detail"] == "Authentication credentials were not provided."
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestFeedViewSet:
+    @fixture(autouse=True)
+    def set_up(self, settings):
+        settings.FEED_FANOUT_MAX_FOLLOWERS = 1
+
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.user.set_password(self.user.username)
+        self.user.save()
+
+        self.author, self.celebrity, self.stranger = UserFactory(), UserFactory(), UserFactory()
+        self.user.following.add(self.author, self.celebrity)
+        self.stranger.following.add(self.celebrity)  # 2 followers: the celebrity's publications are not fanned out
+
+        self.client = APIClient()
+
+    # private methods
+    def _get_auth_token_headers(self):
+        response = self.client.post(
+            reverse("api_token_auth"),
+            data={"username": self.user.username, "password": self.user.username},
+            format="json",
+        )
+        return {"Authorization": f"Token {response.data.get('token')}"}
+
+    def _list_feed(self, query_params=None, authenticate=True):
+        query_params_str = f"?{urlencode(query_params)}" if query_params else ""
+        headers = self._get_auth_token_headers() if authenticate else dict()
+        return self.client.get(f"{reverse('feed-list')}{query_params_str}", headers=headers, format="json")
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_list_feed_success(self):
+        pubs = list()
+        for num in range(6):
+            pubs.append(PublicationFactory(author=self.author if num % 2 == 0 else self.celebrity))
+            PublicationFactory(author=self.stranger)
+
+        assert [pub.fanned_out for pub in pubs] == [True, False] * 3
+        assert TimelineEntry.objects.filter(owner=self.user).count() == 3
+        assert not TimelineEntry.objects.filter(publication__author=self.celebrity).exists()
+
+        headers = self._get_auth_token_headers()
+        url, ids = f"{reverse('feed-list')}?page_size=4", list()
+        while url:
+            response = self.client.get(url, headers=headers, format="json")
+            assert set(response.data.keys()) == {"next", "previous", "page_size", "results"}
+            assert set(response.data["results"][0].keys()) == {
+                "author",
+                "comments_count",
+                "content",
+                "created",
+                "id",
+                "title",
+            }
+            ids += [res["id"] for res in response.data["results"]]
+            url = response.data["next"]
+
+        assert ids == [pub.id for pub in reversed(pubs)]  # merged from newest to oldest
+        assert response.status_code == status.HTTP_200_OK
+
+    @mark.success
+    @mark.django_db
+    def test_follow_and_unfollow_update_timeline(self):
+        new_author = UserFactory()
+        pubs = [PublicationFactory(author=new_author) for _ in range(3)]
+
+        self.user.following.add(new_author)
+        response = self._list_feed()
+        assert [res["id"] for res in response.data["results"]] == [pub.id for pub in reversed(pubs)]
+
+        self.user.following.remove(new_author)
+        assert not TimelineEntry.objects.filter(owner=self.user).exists()
+        assert self._list_feed().data["results"] == []
+
+    @mark.success
+    @mark.django_db
+    def test_bulk_created_publications_fanned_out(self):
+        self.author.following.add(self.user)
+        headers = self._get_auth_token_headers()
+        data = [{"title": "title", "content": "content"}] * 2
+
+        response = self.client.post(reverse("publications-bulk"), data, headers=headers, format="json")
+        assert response.status_code == status.HTTP_201_CREATED
+        pubs = Publication.objects.filter(author=self.user)
+        assert [pub.fanned_out for pub in pubs] == [True, True]
+        assert set(TimelineEntry.objects.filter(owner=self.author).values_list("publication_id", flat=True)) == {
+            pub.id for pub in pubs
+        }
+
+        self.stranger.following.add(self.user)  # 2 followers: read on demand
+        response = self.client.post(reverse("publications-bulk"), data, headers=headers, format="json")
+        assert response.status_code == status.HTTP_201_CREATED
+        pubs = Publication.objects.filter(author=self.user, fanned_out=False)
+        assert len(pubs) == 2
+        assert not TimelineEntry.objects.filter(publication__in=pubs).exists()
+
+    @mark.success
+    @mark.django_db
+    def test_bench_feed_with_task_queue(self, settings):
+        settings.TASK_QUEUE_ENABLED = True
+        out = StringIO()
+        call_command(
+            "bench_feed", "--edges=20", "--following=5", "--posts-per-author=1", "--pages=1", "--readers=2", stdout=out
+        )
+        assert out.getvalue().splitlines()[-1].split() == ["20", "timeline", "entries"]  # 4 readers x 5 publications
+
+    @mark.success
+    @mark.django_db
+    def test_list_feed_uses_timeline_index(self):
+        PublicationFactory(author=self.author)
+        queryset = (
+            Publication.objects.filter(timeline_entries__owner=self.user)
+            .annotate(timeline_created=F("timeline_entries__created"))
+            .order_by("-timeline_created", "-id")[:20]
+        )
+        with connection.cursor() as cursor:
+            # once the tables are analyzed, a hash join plus a sort can look cheaper for a handful of rows, so rule
+            # sorting out too: the plan must then read the timeline rows already ordered through the index
+            cursor.execute(
+                "SET LOCAL enable_seqscan = off; SET LOCAL enable_bitmapscan = off; SET LOCAL enable_sort = off;"
+            )
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(f"EXPLAIN {sql}", params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+
+        assert "timeline_owner_created_idx" in plan, plan
+        assert "Sort" not in plan, plan
+
+    @mark.unauthorized
+    @mark.django_db
+    def test_list_feed_without_auth(self):
+        response = self._list_feed(authenticate=False)
+        assert response.json()["detail"] == "Authentication credentials were not provided."
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestPublicationAsyncViews:
+    @fixture(autouse=True)
+    def set_up(self):
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.user.set_password(self.user.username)
+        self.user.save()
+
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("api_token_auth"), data={"username": self.user.username, "password": self.user.username}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+        publication_detail_cache.clear()
+
+        now, user_2 = datetime.now(), UserFactory()
+        self.publications = [
+            PublicationFactory(author=self.user if num % 2 else user_2, created=now - timedelta(days=num + 5))
+            for num in range(5)
+        ]
+        for num in range(4):
+            PublicationCommentFactory(author=self.user if num % 2 else user_2, publication=self.publications[0])
+
+    # private methods
+    def _assert_same_response(self, sync_url, async_url, query_params=None):
+        response = self.client.get(sync_url, query_params)
+        async_response = self.client.get(async_url, query_params)
+        # the pagination links point to the async endpoint itself
+        assert async_response.content.replace(b"/api/async/", b"/api/") == response.content
+        assert async_response.status_code == response.status_code
+        return async_response
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_async_list_publications_success(self):
+        sync_url, async_url = reverse("publications-list"), reverse("async-publications-list")
+        response = self._assert_same_response(sync_url, async_url, {"page_size": 2, "page_number": 2})
+        assert len(response.json()["results"]) == 2
+
+        query_params = {"author": self.user.id, "from_date": (datetime.now() - timedelta(days=8)).strftime("%d-%m-%Y")}
+        response = self._assert_same_response(sync_url, async_url, query_params)
+        assert [res["id"] for res in response.json()["results"]] == [self.publications[1].id, self.publications[3].id]
+        assert response.status_code == status.HTTP_200_OK
+
+    @mark.error
+    @mark.django_db
+    def test_async_list_publications_bad_params_error(self):
+        sync_url, async_url = reverse("publications-list"), reverse("async-publications-list")
+        response = self._assert_same_response(sync_url, async_url, {"from_date": "yesterday"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = self._assert_same_response(sync_url, async_url, {"page_number": 100})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    @mark.success
+    @mark.django_db
+    def test_async_list_count_strategies(self, settings, monkeypatch):
+        def sync_to_async(*args, **kwargs):
+            raise AssertionError("read in a thread")
+
+        sync_url, async_url = reverse("publications-list"), reverse("async-publications-list")
+        with monkeypatch.context() as patch:  # the count and the page are read with the async ORM
+            patch.setattr("utils.paginations.sync_to_async", sync_to_async)
+            for strategy in ("exact", "cached"):
+                settings.PAGINATION_COUNT_STRATEGY = strategy
+                count_cache.clear()
+                response = self._assert_same_response(sync_url, async_url, {"page_size": 2, "page_number": 3})
+                assert response.json()["total_items"] == 5
+            response = self._assert_same_response(sync_url, async_url, {"page_size": 2, "count": "none"})
+            assert response.json()["next"] is not None and response.json()["total_items"] is None
+            response = self._assert_same_response(sync_url, async_url, {"page_number": 2, "count": "none"})
+            assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        settings.PAGINATION_COUNT_STRATEGY = "estimate"  # a small table, counted
+        response = self._assert_same_response(sync_url, async_url, {"page_size": 2})
+        assert response.json()["total_items"] == 5
+
+    @mark.success
+    @mark.django_db
+    def test_async_retrieve_publication_success(self):
+        pk = self.publications[0].id
+        sync_url, async_url = reverse("publications-detail", kwargs={"pk": pk}), f"/api/async/posts/{pk}/"
+
+        async_response = self.client.get(async_url)  # loaded by the async view
+        publication_detail_cache.clear()
+        response = self.client.get(sync_url)  # loaded by the sync view
+
+        assert async_response.json() == response.json()
+        assert len(async_response.json()["last_3_comments"]) == 3
+        assert async_response.json()["author"]["id"] == self.publications[0].author_id
+        assert async_response.status_code == status.HTTP_200_OK
+
+    @mark.error
+    @mark.django_db
+    def test_async_retrieve_publication_wrong_id(self):
+        response = self._assert_same_response(
+            reverse("publications-detail", kwargs={"pk": 666}), reverse("async-publications-detail", kwargs={"pk": 666})
+        )
+        assert response.json()["detail"] == "No Publication matches the given query."
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    @mark.success
+    @mark.django_db
+    def test_async_publication_comments_success(self):
+        kwargs = {"pk": self.publications[0].id}
+        response = self._assert_same_response(
+            reverse("publications-comments", kwargs=kwargs),
+            reverse("async-publications-comments", kwargs=kwargs),
+            {"page_size": 3},
+        )
+        assert len(response.json()["results"]) == 3
+        assert response.json()["total_items"] == 4
+
+    @mark.unauthorized
+    @mark.django_db
+    def test_async_views_without_auth(self):
+        self.client.credentials()
+        response = self._assert_same_response(reverse("publications-list"), reverse("async-publications-list"))
+        assert response.json()["detail"] == "Authentication credentials were not provided."
+        assert response["WWW-Authenticate"] == "Token"
+
+        self.client.credentials(HTTP_AUTHORIZATION="Token wrong")
+        response = self._assert_same_response(reverse("publications-list"), reverse("async-publications-list"))
+        assert response.json()["detail"] == "Invalid token."
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @mark.error
+    @mark.django_db
+    def test_async_views_method_not_allowed(self):
+        response = self.client.post(reverse("async-publications-list"), {"title": "title", "content": "content"})
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+
+class TestPublicationIndexes:
+    @fixture(autouse=True)
+    def set_up(self):
+        self.user = UserFactory()
+        self.publication = PublicationFactory(author=self.user)
+        for _ in range(3):
+            PublicationCommentFactory(author=self.user, publication=self.publication)
+
+    # private methods
+    def _explain(self, sql, params=()):
+        with connection.cursor() as cursor:
+            # with a handful of rows the planner would rather read the whole table, so make it pick as it would
+            # for a big one (SET LOCAL only lasts until the test transaction is rolled back)
+            cursor.execute("SET LOCAL enable_seqscan = off; SET LOCAL enable_bitmapscan = off;")
+            cursor.execute(f"EXPLAIN {sql}", params)
+            return "\n".join(row[0] for row in cursor.fetchall())
+
+    def _explain_queryset(self, queryset):
+        return self._explain(*queryset.query.sql_with_params())
+
+    def _assert_index_scan(self, plan, index_name):
+        assert f"Index Scan using {index_name}" in plan, plan
+        assert "Sort" not in plan, plan
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_list_uses_created_id_index(self):
+        queryset = Publication.objects.order_by("-created", "-id")[:20]
+        self._assert_index_scan(self._explain_queryset(queryset), "publication_created_id_idx")
+
+    @mark.success
+    @mark.django_db
+    def test_list_with_filters_uses_author_created_index(self):
+        data = {"author": self.user.id, "from_date": "01-01-2024", "to_date": "01-01-2030"}
+        for params in ({"author": self.user.id}, data):
+            queryset = PublicationFilter(params, queryset=Publication.objects.order_by("-created")).qs[:20]
+            self._assert_index_scan(self._explain_queryset(queryset), "publication_author_created_idx")
+
+    @mark.success
+    @mark.django_db
+    def test_search_uses_search_vector_index(self):
+        queryset = PublicationFilter({"q": "django"}, queryset=Publication.objects.all()).qs[:20]
+        with connection.cursor() as cursor:
+            # GIN indexes are only read through bitmap scans
+            cursor.execute(
+                "SET LOCAL enable_seqscan = off; SET LOCAL enable_indexscan = off; SET LOCAL enable_indexonlyscan = off;"
+            )
+            cursor.execute(f"EXPLAIN {queryset.query.sql_with_params()[0]}", queryset.query.sql_with_params()[1])
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+
+        assert "Bitmap Index Scan on publication_search_vector_idx" in plan, plan
+
+    @mark.success
+    @mark.django_db
+    def test_comments_use_publication_created_id_index(self):
+        queryset = PublicationComment.objects.filter(publication=self.publication.id).order_by("-created", "-id")[:20]
+        self._assert_index_scan(self._explain_queryset(queryset), "pubcomment_pub_created_id_idx")
+
+        plan = self._explain(
+            "SELECT * FROM publications_publicationcomment "
+            "WHERE publication_id = %s ORDER BY created DESC, id DESC LIMIT 3;",
+            [self.publication.id],
+        )
+        self._assert_index_scan(plan, "pubcomment_pub_created_id_idx")
+
+
+class TestPartitions:
+    @fixture(autouse=True)
+    def set_up(self):
+        # DDL is transactional in Postgres, the partitioned tables are rolled back with the test transaction
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.now = timezone.now()
+        self.current_month = self.now.date().replace(day=1)
+
+        self.publications = dict()  # months ago -> Publication
+        for months_ago in (0, 1, 5):
+            publication = PublicationFactory(author=self.user, title=f"title {months_ago}")
+            created = self._get_month_start(-months_ago) + timedelta(days=2)
+            Publication.objects.filter(pk=publication.pk).update(created=created)
+            PublicationCommentFactory.create_batch(2, author=self.user, publication=publication)
+            PublicationComment.objects.filter(publication=publication).update(created=created + timedelta(hours=1))
+            self.publications[months_ago] = publication
+
+    # private methods
+    def _get_month_start(self, months):
+        return datetime.combine(add_months(self.current_month, months), datetime.min.time(), ZoneInfo("UTC"))
+
+    def _manage_partitions(self, *args):
+        out = StringIO()
+        call_command("manage_partitions", *args, stdout=out)
+        return out.getvalue()
+
+    def _get_partition(self, model, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT tableoid::regclass::text FROM {model._meta.db_table} WHERE id = %s;", [pk])
+            return cursor.fetchone()[0]
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_convert(self):
+        output = self._manage_partitions("--convert", "--months-ahead=1")
+        partitions = MonthlyPartitions(Publication)
+
+        assert partitions.is_partitioned() and MonthlyPartitions(PublicationComment).is_partitioned()
+        assert partitions.get_months() == [add_months(self.current_month, months) for months in range(-5, 2)]
+        assert "publications_publication: partitioned, 7 monthly partitions" in output
+        assert Publication.objects.count() == 3 and PublicationComment.objects.count() == 6
+        old_publication = self.publications[5]
+        assert self._get_partition(Publication, old_publication.pk) == partitions.get_name(
+            add_months(self.current_month, -5)
+        )
+
+        # the API is the same: new rows continue the ids, the search vector trigger and the indexes are kept
+        response = self.client.post(
+            reverse("publications-list"), {"title": "new", "content": "partitioned"}, format="json"
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Publication.objects.get(title="new").id > max(
+            publication.id for publication in self.publications.values()
+        )
+        response = self.client.get(reverse("publications-list"), {"q": "partitioned"})
+        assert [item["title"] for item in response.json()["results"]] == ["new"]
+        response = self.client.get(reverse("publications-detail", kwargs={"pk": old_publication.pk}))
+        assert response.status_code == status.HTTP_200_OK
+        response = self.client.get(reverse("publications-comments", kwargs={"pk": old_publication.pk}))
+        assert response.json()["total_items"] == 2
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = %s::regclass;", [partitions.table]
+            )
+            assert {"publication_created_id_idx", "publication_search_vector_idx"} <= {
+                name for name, in cursor.fetchall()
+            }
+
+        # foreign keys can't reference a partitioned table, Django cascades the deletes
+        old_publication.delete()
+        assert not PublicationComment.objects.filter(publication=old_publication.pk).exists()
+
+    @mark.success
+    @mark.django_db
+    def test_date_filters_prune_partitions(self):
+        self._manage_partitions("--convert", "--months-ahead=1")
+        from_date = self._get_month_start(-1)
+        params = {"from_date": from_date.strftime("%d-%m-%Y")}
+        queryset = PublicationFilter(params, queryset=Publication.objects.order_by("-created", "-id")).qs[:20]
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {queryset.query.sql_with_params()[0]}", queryset.query.sql_with_params()[1])
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+
+        partitions = MonthlyPartitions(Publication)
+        assert partitions.get_name(add_months(self.current_month, -1)) in plan
+        assert partitions.get_name(add_months(self.current_month, -2)) not in plan, plan
+        response = self.client.get(reverse("publications-list"), params)
+        assert [item["title"] for item in response.json()["results"]] == ["title 0", "title 1"]
+
+    @mark.success
+    @mark.django_db
+    def test_create_moves_rows_from_default_partition(self):
+        self._manage_partitions("--convert", "--months-ahead=0")
+        publication = PublicationFactory(author=self.user)
+        Publication.objects.filter(pk=publication.pk).update(created=self._get_month_start(2))
+        assert self._get_partition(Publication, publication.pk) == "publications_publication_default"
+
+        output = self._manage_partitions("--months-ahead=2")
+        name = MonthlyPartitions(Publication).get_name(add_months(self.current_month, 2))
+        assert f"publications_publication: created {name}" in output
+        assert self._get_partition(Publication, publication.pk) == name
+        assert self._manage_partitions("--months-ahead=2") == ""  # nothing left to create
+
+    @mark.success
+    @mark.django_db
+    def test_detach_to_archive_schema(self):
+        self._manage_partitions("--convert", "--months-ahead=0")
+        before = add_months(self.current_month, -1)
+        output = self._manage_partitions("--detach-before", f"{before:%Y-%m}", "--archive-schema=archive")
+        name = MonthlyPartitions(Publication).get_name(add_months(self.current_month, -5))
+
+        assert f"publications_publication: detached {name} to archive" in output
+        assert set(Publication.objects.values_list("title", flat=True)) == {"title 0", "title 1"}
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT title FROM archive.{name};")
+            assert cursor.fetchall() == [("title 5",)]
+
+    @mark.success
+    @mark.django_db
+    def test_estimated_count_of_partitioned_table(self, settings):
+        settings.PAGINATION_COUNT_STRATEGY = "estimate"
+        settings.PAGINATION_COUNT_ESTIMATE_MIN_ROWS = 1
+        self._manage_partitions("--convert", "--months-ahead=0")
+        PublicationFactory(author=self.user)  # not seen by the estimate (of the partitions), ANALYZE ran before
+        response = self.client.get(reverse("publications-list"))
+        assert response.json()["total_items"] == 3
+
+    @mark.error
+    @mark.django_db
+    def test_not_partitioned_and_invalid_arguments(self):
+        assert "not partitioned, run with --convert" in self._manage_partitions()
+        assert not MonthlyPartitions(Publication).is_partitioned()
+
+        Publication.objects.filter(pk=self.publications[0].pk).update(created=None)
+        with raises(CommandError, match="1 rows of publications_publication have no created"):
+            self._manage_partitions("--convert")
+        with raises(CommandError, match="Invalid month '2024-13'"):
+            self._manage_partitions("--detach-before=2024-13")
+        with raises(CommandError, match="--archive-schema needs --detach-before"):
+            self._manage_partitions("--archive-schema=archive")
+
+
+class FakeRedis:
+    """In-memory stand-in of the redis-py client methods used by "utils.caches.RedisCache"."""
+
+    def __init__(self):
+        self.data = dict()
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode()
+        return True
+
+    def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, match="*"):
+        return [key for key in self.data if fnmatch(key, match)]
+
+    def hincrby(self, key, field, amount):
+        fields = self.data.setdefault(key, dict())
+        fields[field.encode()] = str(int(fields.get(field.encode(), 0)) + amount).encode()
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, dict()))
+
+    def pipeline(self, transaction=True):
+        return FakeRedisPipeline(self)
+
+
+class FakeRedisPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = list()
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class TestWriteBehindCounters:
+    @fixture(autouse=True)
+    def set_up(self, monkeypatch):
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.user.set_password(self.user.username)
+        self.user.save()
+
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("api_token_auth"), data={"username": self.user.username, "password": self.user.username}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+        # enabled without its thread, the tests flush
+        monkeypatch.setattr(user_counters, "buffer", LocalCounterBuffer())
+
+    # tests
+
+    @mark.success
+    @mark.django_db
+    def test_increments_written_behind(self, django_capture_on_commit_callbacks):
+        other_user = UserFactory()
+        with django_capture_on_commit_callbacks(execute=True):
+            self.client.post(reverse("publications-list"), data={"title": "title", "content": "content"}, format="json")
+            publication = Publication.objects.get()
+            self.client.post(
+                reverse("publications-comments", kwargs={"pk": publication.id}), data={"content": "x"}, format="json"
+            )
+            PublicationFactory.create_batch(2, author=other_user)
+            response = self.client.post(
+                reverse("publications-bulk"), data=[{"title": "title", "content": "content"}] * 3, format="json"
+            )
+        assert response.status_code == status.HTTP_201_CREATED
+
+        self.user.refresh_from_db()
+        assert (self.user.publications_count, self.user.comments_count) == (0, 0)  # not flushed yet
+
+        with CaptureQueriesContext(connection) as queries:
+            assert user_counters.flush() == 2
+        assert len([query for query in queries if query["sql"].startswith("UPDATE")]) == 1  # both authors
+        self.user.refresh_from_db()
+        other_user.refresh_from_db()
+        assert (self.user.publications_count, self.user.comments_count) == (4, 1)
+        assert (other_user.publications_count, other_user.comments_count) == (2, 0)
+        assert user_counters.flush() == 0  # nothing pending
+
+    @mark.success
+    @mark.django_db
+    def test_rolled_back_rows_not_counted(self, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            with transaction.atomic():
+                PublicationFactory(author=self.user)
+                transaction.set_rollback(True)
+        assert user_counters.buffer.drain() == dict()
+
+    @mark.success
+    @mark.django_db
+    def test_redis_buffer(self, monkeypatch, django_capture_on_commit_callbacks):
+        fake_redis = FakeRedis()
+        monkeypatch.setattr(user_counters, "buffer", RedisCounterBuffer(client=fake_redis))
+        publication = PublicationFactory()  # its increment is never committed
+        with django_capture_on_commit_callbacks(execute=True):
+            PublicationCommentFactory.create_batch(2, author=self.user, publication=publication)
+        assert fake_redis.data == {"chaindots:counters": {f"{self.user.id}:comments_count".encode(): b"2"}}
+
+        assert user_counters.flush() == 1
+        assert fake_redis.data == dict()
+        self.user.refresh_from_db()
+        assert self.user.comments_count == 2
+
+    @mark.success
+    @mark.django_db(transaction=True)  # the thread flushes with its own connection
+    def test_flush_thread_reconciles_first(self, monkeypatch):
+        other_user = UserFactory()
+        User.objects.filter(pk=other_user.pk).update(publications_count=7)  # e.g. increments lost by a crashed process
+        monkeypatch.setattr(user_counters, "interval", 0.05)
+        monkeypatch.setattr(user_counters, "reconcile", reconcile_author_counters)
+        try:
+            # the first increment of the process starts the thread, inside the atomic create
+            response = self.client.post(
+                reverse("publications-list"), data={"title": "title", "content": "content"}, format="json"
+            )
+            assert response.status_code == status.HTTP_201_CREATED
+            for _ in range(100):
+                self.user.refresh_from_db()
+                if self.user.publications_count:
+                    break
+                sleep(0.05)
+            sleep(0.2)  # a few more flushes
+        finally:
+            user_counters.stop()
+
+        self.user.refresh_from_db()
+        other_user.refresh_from_db()
+        assert self.user.publications_count == 1  # counted once, by the flush
+        assert other_user.publications_count == 0  # reconciled
+
+    @mark.success
+    @mark.django_db
+    def test_reconcile_author_counters(self):
+        PublicationCommentFactory(author=self.user)  # its publication has another author
+        User.objects.update(publications_count=5, comments_count=0)  # e.g. increments lost by a crashed process
+
+        assert reconcile_author_counters() == 2
+        self.user.refresh_from_db()
+        assert (self.user.publications_count, self.user.comments_count) == (0, 1)
+        assert User.objects.exclude(pk=self.user.pk).get().publications_count == 1
+        assert reconcile_author_counters() == 0  # nothing drifted
+
+
+class TestPublicationCommentsSnapshot:
+    @fixture(autouse=True)
+    def set_up(self):
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.user.set_password(self.user.username)
+        self.user.save()
+
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("api_token_auth"), data={"username": self.user.username, "password": self.user.username}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+        self.publication = PublicationFactory(author=self.user)
+
+    # private methods
+    def _assert_snapshot(self, publication):
+        publication.refresh_from_db()
+        last_comments = publication.comments.order_by("-created", "-id")
+        assert publication.comments_count == last_comments.count()
+        assert publication.recent_comments == PublicationCommentSerializer(last_comments[:3], many=True).data
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_comments_update_the_snapshot(self):
+        url = reverse("publications-comments", kwargs={"pk": self.publication.id})
+        for num in range(5):
+            self.client.post(url, {"content": f"comment {num} ✓"}, format="json")
+            self._assert_snapshot(self.publication)
+
+        assert [comment["content"] for comment in self.publication.recent_comments] == [
+            "comment 4 ✓",
+            "comment 3 ✓",
+            "comment 2 ✓",
+        ]
+        response = self.client.get(reverse("publications-detail", kwargs={"pk": self.publication.id}))
+        assert response.data["last_3_comments"] == self.publication.recent_comments
+        assert response.data["publication"]["comments_count"] == 5
+
+    @mark.success
+    @mark.django_db
+    def test_bulk_comments_update_the_snapshot(self):
+        other_publication = PublicationFactory(author=self.user)
+        PublicationCommentFactory(author=self.user, publication=self.publication)
+
+        response = self.client.post(
+            reverse("publications-comments-bulk", kwargs={"pk": self.publication.id}),
+            [{"content": f"comment {num}"} for num in range(4)],
+            format="json",
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        self._assert_snapshot(self.publication)
+        assert self.publication.comments_count == 5
+        self._assert_snapshot(other_publication)
+        assert other_publication.recent_comments == []
+
+    @mark.success
+    @mark.django_db
+    def test_deleted_comment_rebuilds_the_snapshot(self, django_capture_on_commit_callbacks):
+        comments = [PublicationCommentFactory(author=self.user, publication=self.publication) for _ in range(4)]
+        with django_capture_on_commit_callbacks(execute=True):
+            comments[-1].delete()
+
+        self._assert_snapshot(self.publication)
+        assert [comment["id"] for comment in self.publication.recent_comments] == [
+            comment.id for comment in comments[2::-1]
+        ]
+
+    @mark.success
+    @mark.django_db
+    def test_rebuild_publication_comments_command(self):
+        other_publication = PublicationFactory(author=self.user)
+        for publication in (self.publication, other_publication):
+            PublicationCommentFactory(author=self.user, publication=publication)
+        Publication.objects.update(comments_count=0, recent_comments=[])  # e.g. just migrated
+
+        out = StringIO()
+        call_command("rebuild_publication_comments", "--batch-size=1", stdout=out)
+        assert "2 publication(s) with drifted comments updated." in out.getvalue()
+        self._assert_snapshot(self.publication)
+        self._assert_snapshot(other_publication)
+
+        Publication.objects.update(comments_count=0)
+        out = StringIO()
+        call_command("rebuild_publication_comments", str(other_publication.id), stdout=out)
+        assert "1 publication(s) with drifted comments updated." in out.getvalue()
+        assert Publication.objects.filter(comments_count=1).get() == other_publication
+
+
+class TestConditionalRequests:
+    @fixture(autouse=True)
+    def set_up(self):
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.publication = PublicationFactory(author=self.user)
+        PublicationCommentFactory(author=self.user, publication=self.publication)
+        publication_detail_cache.clear()
+
+    # private methods
+    def _get(self, url_name, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name, kwargs={"pk": self.publication.id}), headers=headers)
+        return response, [query["sql"] for query in queries]
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_detail_not_modified(self, django_capture_on_commit_callbacks):
+        response, _ = self._get("publications-detail")
+        etag = response["ETag"]
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Cache-Control"] == "private, no-cache"
+        assert "Last-Modified" not in response
+
+        assert etag.startswith('W/"')  # the author's "last_login" is not part of it
+
+        response, queries = self._get("publications-detail", if_none_match=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b"" and response["ETag"] == etag
+        assert len(queries) == 1 and "LIMIT 1" in queries[0]  # the validators, neither serializers nor the cache
+
+        User.objects.filter(pk=self.user.pk).update(last_login=timezone.now())  # a login
+        response, _ = self._get("publications-detail", if_none_match=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        # the cached detail has the previous counters of the author, it's not answered
+        User.objects.filter(pk=self.user.pk).update(followers_count=F("followers_count") + 1)
+        response, _ = self._get("publications-detail", if_none_match=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["author"]["followers_count"] == 1
+        etag = response["ETag"]
+
+        with django_capture_on_commit_callbacks(execute=True):  # the cached detail is invalidated on commit
+            self.client.post(
+                reverse("publications-comments", kwargs={"pk": self.publication.id}), {"content": "new"}, format="json"
+            )
+        response, _ = self._get("publications-detail", if_none_match=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+        assert response.json()["last_3_comments"][0]["content"] == "new"
+
+    @mark.success
+    @mark.django_db
+    def test_comments_not_modified(self):
+        response, _ = self._get("publications-comments")
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        comment = PublicationComment.objects.get(publication=self.publication)
+        assert response.status_code == status.HTTP_200_OK
+        assert last_modified == http_date(comment.created.timestamp())
+
+        response, queries = self._get("publications-comments", if_none_match=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response["Last-Modified"] == last_modified
+        assert len(queries) == 1 and "LIMIT 1" in queries[0]  # the validators, neither COUNT nor page
+        response, _ = self._get("publications-comments", if_modified_since=last_modified)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        PublicationCommentFactory(author=self.user, publication=self.publication)
+        response, _ = self._get("publications-comments", if_none_match=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["total_items"] == 2
+
+    @mark.error
+    @mark.django_db
+    def test_conditional_requests_of_missing_and_unauthenticated(self):
+        response, _ = self._get("publications-detail")
+        etag = response["ETag"]
+
+        self.publication.pk = 0
+        for url_name in ("publications-detail", "publications-comments"):
+            response, _ = self._get(url_name, if_none_match=etag)
+            assert response.status_code != status.HTTP_304_NOT_MODIFIED
+            assert "ETag" not in response
+
+        self.client.force_authenticate(None)  # credentials are checked before the validators
+        self.publication.pk = PublicationComment.objects.get().publication_id
+        response, _ = self._get("publications-detail", if_none_match=etag)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestPublicationDetailCache:
+    @fixture(autouse=True)
+    def set_up(self):
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.user.set_password(self.user.username)
+        self.user.save()
+
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self._get_auth_token()}")
+        publication_detail_cache.clear()
+
+    # private methods
+    def _get_auth_token(self):
+        response = self.client.post(
+            reverse("api_token_auth"),
+            data={"username": self.user.username, "password": self.user.username},
+            format="json",
+        )
+        return response.data.get("token")
+
+    def _retrieve_data(self, pk):
+        return self.client.get(reverse("publications-detail", kwargs={"pk": pk}), format="json")
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_retrieve_publication_hit_and_miss(self):
+        pub = PublicationFactory(author=self.user)
+        PublicationCommentFactory(author=self.user, publication=pub)
+
+        response = self._retrieve_data(pub.id)
+        assert publication_detail_cache.stats == {"hits": 0, "misses": 1}
+
+        with CaptureQueriesContext(connection) as queries:
+            response_2 = self._retrieve_data(pub.id)
+
+        assert publication_detail_cache.stats == {"hits": 1, "misses": 1}
+        assert response_2.data == response.data
+        assert len(queries) == 1  # the validators, the publication and its author aren't read again
+
+        self.user.refresh_from_db()
+        self.user.publications_count += 1  # the author changed: the cached detail is stale
+        self.user.save()
+        response_3 = self._retrieve_data(pub.id)
+        assert publication_detail_cache.stats == {"hits": 1, "misses": 2}
+        assert response_3.data["author"]["publications_count"] == self.user.publications_count
+        assert response_2.status_code == status.HTTP_200_OK
+
+    @mark.success
+    @mark.django_db
+    def test_retrieve_publication_invalidated_by_new_comment(self, django_capture_on_commit_callbacks):
+        pub = PublicationFactory(author=self.user)
+        response = self._retrieve_data(pub.id)
+        assert response.data["last_3_comments"] == []
+
+        with django_capture_on_commit_callbacks(execute=True):
+            comment_response = self.client.post(
+                reverse("publications-comments", kwargs={"pk": pub.id}), data={"content": "comment"}, format="json"
+            )
+
+        assert comment_response.status_code == status.HTTP_201_CREATED
+
+        response = self._retrieve_data(pub.id)
+        assert [comment["id"] for comment in response.data["last_3_comments"]] == [pub.comments.get().id]
+        assert publication_detail_cache.stats == {"hits": 0, "misses": 2}
+
+    @mark.error
+    @mark.django_db
+    def test_retrieve_publication_not_found_is_not_cached(self):
+        for _ in range(2):
+            response = self._retrieve_data(666)
+            assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert publication_detail_cache.stats == {"hits": 0, "misses": 0}  # not found by the validators' query
+
+    @mark.success
+    @mark.django_db
+    def test_retrieve_publication_with_redis_backend(self, monkeypatch):
+        fake_redis = FakeRedis()
+        monkeypatch.setattr(publication_detail_cache, "backend", RedisCache(client=fake_redis))
+        pub = PublicationFactory(author=self.user)
+
+        response = self._retrieve_data(pub.id)
+        response_2 = self._retrieve_data(pub.id)
+
+        assert list(fake_redis.data) == [f"chaindots:publication_detail:{pub.id}"]
+        assert response_2.data == response.data
+        assert publication_detail_cache.stats == {"hits": 1, "misses": 1}
+
+        publication_detail_cache.invalidate(pub.id)
+        assert fake_redis.data == dict()
+
+
+class TestLRUCache:
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+    def test_expires_entries(self):
+        cache = LRUCache(timeout=0)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+
+
+class TestPaginationCounts:
+    @fixture(autouse=True)
+    def set_up(self):
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.user.set_password(self.user.username)
+        self.user.save()
+
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("api_token_auth"), data={"username": self.user.username, "password": self.user.username}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+        count_cache.clear()
+
+        self.url = reverse("publications-list")
+        self.publications = [PublicationFactory(author=self.user) for _ in range(5)]
+
+    # private methods
+    def _list_data(self, query_params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, query_params)
+        counts = [query["sql"] for query in context.captured_queries if "COUNT(*)" in query["sql"]]
+        return response, counts
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_list_without_count(self):
+        response, counts = self._list_data({"count": "none", "page_size": 2})
+        assert counts == list()
+        assert response.json()["total_items"] is None
+        assert response.json()["total_pages"] is None
+        assert response.json()["next"].endswith("count=none&page_number=2&page_size=2")
+        assert response.json()["previous"] is None
+
+        response, counts = self._list_data({"count": "none", "page_size": 2, "page_number": 3})
+        assert counts == list()
+        assert [item["id"] for item in response.json()["results"]] == [self.publications[0].id]
+        assert response.json()["next"] is None
+        assert response.status_code == status.HTTP_200_OK
+
+    @mark.error
+    @mark.django_db
+    def test_list_without_count_past_last_page(self):
+        response, _ = self._list_data({"count": "none", "page_size": 5, "page_number": 2})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        response, _ = self._list_data({"count": "none", "page_number": "last"})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    @mark.success
+    @mark.django_db
+    def test_list_estimated_count(self, settings):
+        settings.PAGINATION_COUNT_STRATEGY = "estimate"
+        settings.PAGINATION_COUNT_ESTIMATE_MIN_ROWS = 1
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE publications_publication;")
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = 'publications_publication'::regclass;")
+            estimate = int(cursor.fetchone()[0])
+        PublicationFactory(author=self.user)  # not seen by the estimate until the next ANALYZE
+
+        response, counts = self._list_data({"page_size": 2})
+        assert counts == list()
+        assert response.json()["total_items"] == estimate
+        assert response.status_code == status.HTTP_200_OK
+
+        response, counts = self._list_data({"page_size": 2, "author": self.user.id})  # filtered lists are counted
+        assert len(counts) == 1
+        assert response.json()["total_items"] == 6
+
+    @mark.success
+    @mark.django_db
+    def test_list_estimated_count_of_small_table(self, settings):
+        settings.PAGINATION_COUNT_STRATEGY = "estimate"
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE publications_publication;")
+
+        response, counts = self._list_data({"page_size": 2})
+        assert len(counts) == 1
+        assert response.json()["total_items"] == 5
+
+    @mark.success
+    @mark.django_db
+    def test_list_cached_count(self, settings):
+        settings.PAGINATION_COUNT_STRATEGY = "cached"
+
+        response, counts = self._list_data({"page_size": 2, "author": self.user.id})
+        assert len(counts) == 1
+        assert response.json()["total_items"] == 5
+
+        PublicationFactory(author=self.user)
+        for query_params in (
+            {"page_size": 3, "author": self.user.id},
+            {"page_number": 2, "page_size": 4, "author": self.user.id},
+        ):
+            response, counts = self._list_data(query_params)  # only the page changes, the count is cached
+            assert counts == list()
+            assert response.json()["total_items"] == 5
+
+        response, counts = self._list_data({"page_size": 2})  # other filters, other count
+        assert len(counts) == 1
+        assert response.json()["total_items"] == 6
+        assert count_cache.stats == {"hits": 2, "misses": 2}
+
+
+class TestLeanSerialization:
+    @fixture(autouse=True)
+    def set_up(self):
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.user.set_password(self.user.username)
+        self.user.save()
+
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("api_token_auth"), data={"username": self.user.username, "password": self.user.username}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+
+        now = datetime.now()
+        self.publication = PublicationFactory(author=self.user, title='ünïcödé "title"', content="😀\n<b>&</b>")
+        PublicationFactory(author=self.user, created=now.replace(microsecond=0))
+        PublicationFactory(author=UserFactory(), created=None)
+        for num in range(3):
+            PublicationCommentFactory(author=self.user, publication=self.publication, content=f"comment {num} ✓")
+
+    # private methods
+    def _assert_same_content(self, settings, url, query_params=None):
+        settings.LEAN_SERIALIZATION = False
+        response = self.client.get(url, query_params)
+        settings.LEAN_SERIALIZATION = True
+        lean_response = self.client.get(url, query_params)
+
+        assert lean_response.content == response.content
+        assert lean_response.status_code == response.status_code == status.HTTP_200_OK
+        return lean_response
+
+    # tests
+    @mark.success
+    @mark.django_db
+    @mark.parametrize(
+        "query_params",
+        [None, {"page_size": 2, "page_number": 2}, {"from_date": "01-01-2000"}, {"pagination": "cursor"}],
+    )
+    def test_list_publications_parity(self, settings, query_params):
+        response = self._assert_same_content(settings, reverse("publications-list"), query_params)
+        assert response.json()["results"]
+
+    @mark.success
+    @mark.django_db
+    def test_list_publications_cursor_pages_parity(self, settings):
+        response = self._assert_same_content(
+            settings, reverse("publications-list"), {"pagination": "cursor", "page_size": 1}
+        )
+        self._assert_same_content(settings, response.json()["next"])
+
+    @mark.success
+    @mark.django_db
+    def test_list_comments_parity(self, settings):
+        url = reverse("publications-comments", kwargs={"pk": self.publication.id})
+        assert len(self._assert_same_content(settings, url).json()["results"]) == 3
+
+    @mark.success
+    @mark.django_db
+    def test_lean_serializer_support(self):
+        assert LeanSerializer.for_serializer(PublicationSerializer) is not None
+        assert LeanSerializer.for_serializer(PublicationCommentSerializer) is not None
+        assert LeanSerializer.for_serializer(PublicationSearchSerializer) is None  # SerializerMethodField
+        assert LeanSerializer.for_serializer(UserDetailWithFollowsSerializer) is None
+
+        rows = LeanSerializer.for_serializer(PublicationSerializer).values(Publication.objects.order_by("id"))
+        with CaptureQueriesContext(connection) as context:
+            data = LeanSerializer.for_serializer(PublicationSerializer).to_representation(rows)
+        assert len(context.captured_queries) == 1
+        assert data == PublicationSerializer(Publication.objects.order_by("id"), many=True).data
+
+
+class TestJSONRenderingAndCompression:
+    @fixture(autouse=True)
+    def set_up(self):
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.user.set_password(self.user.username)
+        self.user.save()
+
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("api_token_auth"), data={"username": self.user.username, "password": self.user.username}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+
+        self.publication = PublicationFactory(author=self.user)
+        for num in range(30):
+            PublicationCommentFactory(author=self.user, publication=self.publication, content=f"comment {num} " * 5)
+        self.url = reverse("publications-comments", kwargs={"pk": self.publication.id})
+
+    # private methods
+    def _get(self, url, accept_encoding, query_params=None):
+        return self.client.get(url, query_params, HTTP_ACCEPT_ENCODING=accept_encoding)
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_orjson_renderer_same_bytes_as_json_renderer(self):
+        now = timezone.now()
+        data = {
+            "datetimes": [now, now.replace(microsecond=0), now.astimezone(ZoneInfo("America/Argentina/Buenos_Aires"))],
+            "naive": datetime(2024, 1, 2, 3, 4, 5),
+            "date": now.date(),
+            "decimal": Decimal("1.50"),
+            "uuid": UUID("12345678-1234-5678-1234-567812345678"),
+            "lazy": gettext_lazy("Not found."),
+            "text": 'ünïcödé "quoted" \\ \u2028 \u2029 😀',
+            "numbers": (1, -2.5, 10**15, True, None),
+            1: "int key",
+        }
+        assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+        assert ORJSONRenderer().render(None) == b""
+        # indented (browsable API) is rendered by JSONRenderer
+        assert ORJSONRenderer().render(data, "application/json; indent=4") == JSONRenderer().render(
+            data, "application/json; indent=4"
+        )
+
+    @mark.success
+    @mark.django_db
+    def test_orjson_parser(self):
+        response = self.client.post(self.url, '{"content": "ünïcödé 😀"}', content_type="application/json")
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.json()["content"] == "ünïcödé 😀"
+
+        response = self.client.post(self.url, '{"content": ', content_type="application/json")
+        assert response.json()["detail"].startswith("JSON parse error - ")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @mark.success
+    @mark.django_db
+    def test_compression_negotiation(self):
+        content = self._get(self.url, "").content
+        assert len(content) > settings.COMPRESSION_MIN_SIZE
+
+        for accept_encoding, encoding in (
+            ("gzip, deflate, br", "br"),
+            ("gzip", "gzip"),
+            ("br;q=0.5, gzip", "gzip"),
+            ("br;q=0, gzip;q=0", None),
+            ("deflate", None),
+        ):
+            response = self._get(self.url, accept_encoding)
+            assert response.get("Content-Encoding") == encoding, accept_encoding
+            assert "Accept-Encoding" in response["Vary"]
+            if encoding == "br":
+                assert brotli.decompress(response.content) == content
+            elif encoding == "gzip":
+                assert gzip.decompress(response.content) == content
+            else:
+                assert response.content == content
+            assert response.status_code == status.HTTP_200_OK
+
+    @mark.success
+    @mark.django_db
+    def test_small_responses_are_not_compressed(self):
+        response = self._get(self.url, "br, gzip", query_params={"page_size": 1})
+        assert len(response.content) < settings.COMPRESSION_MIN_SIZE
+        assert not response.has_header("Content-Encoding")
+
+    @mark.success
+    @mark.django_db
+    def test_streamed_responses_are_compressed(self):
+        response = self._get(reverse("publications-comments-export", kwargs={"pk": self.publication.id}), "br")
+        assert response["Content-Encoding"] == "br"
+        lines = brotli.decompress(b"".join(response.streaming_content)).decode().splitlines()
+        assert len(lines) == 30
+
+
+class TestRequestMetrics:
+    @fixture(autouse=True)
+    def set_up(self):
+        self.user = UserFactory(username="tester", email="tester@localhost.com", is_staff=True)
+        self.user.set_password(self.user.username)
+        self.user.save()
+
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("api_token_auth"), data={"username": self.user.username, "password": self.user.username}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+        token_cache.clear()
+        registry.clear()
+
+        self.publication = PublicationFactory(author=self.user)
+        PublicationCommentFactory(author=self.user, publication=self.publication)
+
+    # private methods
+    def _get_metrics(self):
+        response = self.client.get(reverse("metrics"))
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"] == "text/plain; version=0.0.4; charset=utf-8"
+        return {
+            name: float(value)
+            for name, value in (line.rsplit(" ", 1) for line in response.content.decode().splitlines())
+            if not name.startswith("#")
+        }
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_metrics_by_route(self):
+        for _ in range(2):
+            self.client.get(reverse("publications-list"))
+        self.client.get(reverse("publications-detail", kwargs={"pk": 666}))
+
+        metrics = self._get_metrics()
+        labels = 'route="publications-list",method="GET"'
+        assert metrics[f'chaindots_http_requests_total{{{labels},status="200"}}'] == 2
+        assert metrics['chaindots_http_requests_total{route="publications-detail",method="GET",status="404"}'] == 1
+        assert metrics[f'chaindots_http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'] == 2
+        assert metrics[f"chaindots_http_request_duration_seconds_sum{{{labels}}}"] > 0
+        # token (the first time, then it's cached), COUNT and page
+        assert metrics[f'chaindots_db_queries_per_request_bucket{{{labels},le="2"}}'] == 1
+        assert metrics[f'chaindots_db_queries_per_request_bucket{{{labels},le="3"}}'] == 2
+        assert metrics[f"chaindots_db_queries_per_request_sum{{{labels}}}"] == 5
+        assert metrics[f"chaindots_db_duration_seconds_total{{{labels}}}"] > 0
+        assert metrics[f'chaindots_timer_duration_seconds_total{{{labels},timer="serializer"}}'] > 0
+        assert metrics[f'chaindots_timer_duration_seconds_total{{{labels},timer="render"}}'] > 0
+        assert metrics['chaindots_cache_requests_total{cache="auth_token",result="hits"}'] == 3  # "/metrics" too
+        assert metrics['chaindots_cache_requests_total{cache="auth_token",result="misses"}'] == 1
+
+    @mark.success
+    @mark.django_db
+    def test_metrics_of_async_views(self):
+        publication_detail_cache.clear()
+        self.client.get(reverse("async-publications-detail", kwargs={"pk": self.publication.id}))
+
+        metrics = self._get_metrics()
+        labels = 'route="async-publications-detail",method="GET"'
+        assert metrics[f"chaindots_db_queries_per_request_sum{{{labels}}}"] == 2  # token, publication with its author
+        assert metrics[f'chaindots_timer_duration_seconds_total{{{labels},timer="serializer"}}'] > 0
+
+    @mark.success
+    @mark.django_db
+    def test_slow_request_logged_with_its_queries(self, settings, caplog):
+        settings.METRICS_SLOW_REQUEST_THRESHOLD = 0
+        self.client.get(reverse("publications-comments", kwargs={"pk": self.publication.id}))
+
+        [record] = [record for record in caplog.records if record.name == "utils.middleware"]
+        message = record.getMessage()
+        assert message.startswith(
+            f"Slow request GET /api/posts/{self.publication.id}/comments/ (publications-comments)"
+        )
+        assert "4 queries" in message  # token, validators, COUNT, page
+        assert 'FROM "publications_publicationcomment"' in message
+
+    @mark.unauthorized
+    @mark.django_db
+    def test_metrics_only_for_admin_users(self):
+        User.objects.filter(pk=self.user.pk).update(is_staff=False)
+        token_cache.clear()
+
+        response = self.client.get(reverse("metrics"))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestReplicaRouting:
+    @fixture(autouse=True)
+    def set_up(self, settings):
+        # "replica" reads the test DB through another connection, "broken_replica" a port nobody listens on
+        connections.settings["replica"] = dict(connections.settings["default"])
+        connections.settings["broken_replica"] = {
+            **connections.settings["default"],
+            "PORT": 1,
+            "OPTIONS": {"connect_timeout": 1},
+        }
+        settings.DATABASE_REPLICAS = ["replica"]
+        health_check.clear()
+        health_check.is_healthy("replica")  # its "SELECT 1" isn't counted by the tests
+        replica_pin_cache.clear()
+        token_cache.clear()
+
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        PublicationFactory(author=self.user)
+
+        yield
+        for alias in ("replica", "broken_replica"):
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+
+    # private methods
+    def _get_list_queries(self, client=None):
+        with CaptureQueriesContext(connections["default"]) as default_queries:
+            with CaptureQueriesContext(connections["replica"]) as replica_queries:
+                response = (client or self.client).get(reverse("publications-list"))
+        assert response.status_code == status.HTTP_200_OK
+        return [query["sql"] for query in default_queries], [query["sql"] for query in replica_queries]
+
+    # tests
+    @mark.success
+    @mark.django_db(transaction=True)
+    def test_safe_requests_read_from_replica(self):
+        default_queries, replica_queries = self._get_list_queries()
+
+        assert len(replica_queries) == 2  # COUNT and page
+        assert all('"publications_publication"' in sql for sql in replica_queries)
+        assert len(default_queries) == 1 and '"authtoken_token"' in default_queries[0]  # not a routed app
+
+    @mark.success
+    @mark.django_db(transaction=True)
+    def test_unsafe_request_pins_client_to_default(self):
+        data = {"title": "title", "content": "content"}
+        response = self.client.post(reverse("publications-list"), data, format="json")
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.cookies[settings.REPLICA_PIN_COOKIE]["max-age"] == settings.REPLICA_PIN_SECONDS
+
+        # pinned by the cookie, and by the token for a client without the cookie (the token is cached by now)
+        default_queries, replica_queries = self._get_list_queries()
+        assert (len(default_queries), len(replica_queries)) == (2, 0)
+        client = APIClient(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        default_queries, replica_queries = self._get_list_queries(client)
+        assert (len(default_queries), len(replica_queries)) == (2, 0)
+
+        replica_pin_cache.clear()  # the pins expired
+        self.client.cookies.clear()
+        default_queries, replica_queries = self._get_list_queries()
+        assert (len(default_queries), len(replica_queries)) == (0, 2)
+
+    @mark.success
+    @mark.django_db
+    def test_no_pin_without_replicas(self, settings):
+        settings.DATABASE_REPLICAS = []
+        data = {"title": "title", "content": "content"}
+        response = self.client.post(reverse("publications-list"), data, format="json")
+        assert response.status_code == status.HTTP_201_CREATED
+        assert settings.REPLICA_PIN_COOKIE not in response.cookies
+        assert replica_pin_cache.get(CachingTokenAuthentication.get_cache_key(f"Token {self.token.key}")) is None
+
+    @mark.error
+    @mark.django_db(transaction=True)
+    def test_unhealthy_replica_falls_back_to_default(self, settings, caplog):
+        settings.DATABASE_REPLICAS = ["broken_replica", "replica"]
+
+        for _ in range(3):  # only "replica" is picked, "broken_replica" isn't tried again until its next check
+            default_queries, replica_queries = self._get_list_queries()
+            assert len(replica_queries) == 2
+        assert len([record for record in caplog.records if record.name == "utils.db_routers"]) == 1
+
+        settings.DATABASE_REPLICAS = ["broken_replica"]
+        default_queries, replica_queries = self._get_list_queries()
+        assert (len(default_queries), len(replica_queries)) == (2, 0)  # token cached, COUNT and page
+
+    @mark.success
+    @mark.django_db
+    def test_reads_inside_transactions_stay_on_default(self):
+        with read_from_replicas():
+            assert ReplicaRouter().db_for_read(Publication) == "default"  # each test runs in a transaction
+            assert ReplicaRouter().db_for_read(Token) == "default"
+        assert ReplicaRouter().db_for_write(Publication) == "default"
+
+
+class TestPreparedStatements:
+    @fixture(autouse=True)
+    def set_up(self, monkeypatch):
+        # the connection outlives the tests, they start without prepared statements
+        monkeypatch.setattr(connection, "prepared_statements", OrderedDict())
+        monkeypatch.setattr(connection, "executions", dict())
+        monkeypatch.setattr(connection, "prepare_threshold", 2)
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        PublicationFactory.create_batch(3, author=self.user)
+
+    # private methods
+    def _execute(self, sql, params, times=3):
+        with connection.cursor() as cursor:
+            for _ in range(times):
+                cursor.execute(sql, params)
+                row = cursor.fetchone()
+        return row
+
+    def _get_server_statements(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM pg_prepared_statements")
+            return {name for name, in cursor.fetchall()}
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_repeated_statements_are_prepared(self):
+        responses = list()
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                responses.append(self.client.get(reverse("publications-list")).json())
+        names = {name for name in connection.prepared_statements.values() if name}
+
+        assert responses[0] == responses[1] == responses[2]
+        assert names and names <= self._get_server_statements()
+        assert not any(query["sql"].startswith("EXECUTE") for query in queries)  # the statements are logged
+        assert any(sql.startswith("SELECT COUNT(*)") for sql, casts in connection.prepared_statements)
+
+    @mark.success
+    @mark.django_db
+    def test_prepared_statements_keep_parameter_types(self):
+        now = timezone.now()
+        assert self._execute("SELECT %s, %s, %s, %s", [1, "1", None, now]) == (1, "1", None, now)
+        assert self._execute("SELECT %s", ["text"]) == ("text",)
+        assert self._execute("SELECT %s", [True]) == (True,)  # the same SQL, parameters of another type
+        assert [casts for sql, casts in connection.prepared_statements if sql == "SELECT %s"] == [("",), ("::boolean",)]
+
+        # "Value(1)" is a bare "%s", it's still an integer
+        values = Publication.objects.annotate(one=Value(1)).values_list("one", flat=True)
+        assert [list(values.filter(author=self.user)[:1]) for _ in range(3)] == [[1]] * 3
+
+    @mark.error
+    @mark.django_db
+    def test_statement_that_cant_be_prepared(self):
+        # the type of the parameter can't be inferred by PREPARE, the query runs as usual and the transaction is intact
+        assert self._execute("SELECT pg_typeof(%s)", ["text"]) == ("unknown",)
+        assert connection.prepared_statements[("SELECT pg_typeof(%s)", ("",))] is None
+        assert Publication.objects.count() == 3
+
+        # floats aren't prepared, psycopg2 sends them as numerics
+        assert self._execute("SELECT %s", [1.5]) == (Decimal("1.5"),)
+        assert not any(sql == "SELECT %s" for sql, casts in connection.prepared_statements)
+
+    @mark.success
+    @mark.django_db
+    def test_least_recently_used_statements_are_deallocated(self, monkeypatch):
+        monkeypatch.setattr(connection, "prepared_max", 2)
+        self._execute("SELECT %s + 0", [1])
+        self._execute("SELECT %s + 1", [1])
+        evicted_name = connection.prepared_statements[("SELECT %s + 1", ("::bigint",))]
+        self._execute("SELECT %s + 0", [1], times=1)  # the most recently used now
+        self._execute("SELECT %s + 2", [1])
+
+        assert [sql for sql, casts in connection.prepared_statements] == ["SELECT %s + 0", "SELECT %s + 2"]
+        assert set(connection.prepared_statements.values()) <= self._get_server_statements()
+        assert evicted_name not in self._get_server_statements()
+
+    @mark.success
+    @mark.django_db
+    def test_preparing_disabled(self, monkeypatch):
+        monkeypatch.setattr(connection, "prepare_threshold", None)
+        assert self._execute("SELECT %s", [1]) == (1,)
+        assert ("SELECT %s", ("::bigint",)) not in connection.prepared_statements
+
+
+class TestBenchmarkCommands:
+    # private methods
+    def _seed(self, *args):
+        out = StringIO()
+        call_command(
+            "seed_bench",
+            "--users=50",
+            "--follows-per-user=5",
+            "--publications=200",
+            "--comments=500",
+            *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_seed_bench(self):
+        output = self._seed()
+
+        users = User.objects.filter(username__startswith="bench_")
+        assert users.count() == 50
+        assert Publication.objects.count() == 200
+        assert PublicationComment.objects.count() == 500
+        assert Follow.objects.exclude(from_user=F("to_user")).count() == Follow.objects.count() > 0
+        assert "publications" in output and "comments" in output
+
+        # counters are reconciled, and a few users write most of the publications
+        counts = sorted(users.values_list("publications_count", flat=True), reverse=True)
+        assert sum(counts) == 200
+        assert sum(counts[:10]) > sum(counts[10:])
+
+    @mark.success
+    @mark.django_db
+    def test_seed_bench_is_reproducible(self):
+        self._seed()
+        edges = list(Follow.objects.order_by("id").values_list("from_user__username", "to_user__username"))
+        titles = list(Publication.objects.order_by("id").values_list("title", flat=True))
+
+        self._seed("--prefix=other_")
+        other_edges = Follow.objects.filter(from_user__username__startswith="other_").order_by("id")
+        assert [
+            (from_username.replace("other_", "bench_"), to_username.replace("other_", "bench_"))
+            for from_username, to_username in other_edges.values_list("from_user__username", "to_user__username")
+        ] == edges
+        assert list(Publication.objects.order_by("id").values_list("title", flat=True)[200:]) == titles
+
+    @mark.error
+    @mark.django_db
+    def test_seed_bench_existing_prefix(self):
+        self._seed()
+        with raises(CommandError, match="There are users with the prefix 'bench_' already"):
+            self._seed()
+
+    @mark.success
+    @mark.django_db
+    def test_bench_endpoints(self, tmp_path):
+        self._seed()
+        output_path = tmp_path / "results.json"
+        call_command(
+            "bench_endpoints",
+            "--requests=50",
+            "--warmup=5",
+            "--clients=5",
+            f"--output={output_path}",
+            stdout=StringIO(),
+        )
+        results = json.loads(output_path.read_text())
+
+        out = StringIO()
+        call_command(
+            "bench_endpoints", "--requests=50", "--warmup=5", "--clients=5", f"--compare={output_path}", stdout=out
+        )
+
+        assert set(results) <= {"list", "list-filtered", "list-deep", "detail", "comments", "feed", "follow"}
+        assert sum(result["requests"] for result in results.values()) == 50
+        assert results["list"]["queries"] >= 2  # COUNT and page, plus the token when it isn't cached
+        assert all(result["errors"] == 0 for kind, result in results.items() if kind != "follow")
+        assert "vs previous" in out.getvalue()
+        assert not Token.objects.exists()  # rolled back
+
+    @mark.error
+    @mark.django_db
+    def test_bench_endpoints_invalid_mix(self):
+        with raises(CommandError, match="Invalid --mix item 'unknown=1'"):
+            call_command("bench_endpoints", "--mix=list=1,unknown=1")
+
+    @mark.success
+    @mark.django_db(transaction=True)
+    def test_bench_connections(self):
+        self._seed()
+        out = StringIO()
+        call_command("bench_connections", "--requests=20", "--warmup=5", stdout=out)
+        rows = {line[:12].strip(): line[12:].split() for line in out.getvalue().splitlines()[1:]}
+
+        assert list(rows) == ["per request", "persistent", "prepared"]
+        # a connection per request (but the ones answered from a cache), and none when they're persistent
+        assert int(rows["per request"][3]) > 10
+        assert int(rows["persistent"][3]) == 0
+        assert int(rows["prepared"][4]) > 0
+        assert connection.prepare_threshold == settings.DATABASES["default"]["OPTIONS"]["prepare_threshold"]
+        assert not Token.objects.exists()
+
+    @mark.error
+    @mark.django_db
+    def test_bench_connections_inside_transaction(self):
+        with raises(CommandError, match="Connections can't be closed inside a transaction"):
+            call_command("bench_connections")
+
+
+class TestPublicationQueryBudgets:
+    @fixture(autouse=True)
+    def set_up(self):
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.user.set_password(self.user.username)
+        self.user.save()
+
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("api_token_auth"), data={"username": self.user.username, "password": self.user.username}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+        publication_detail_cache.clear()
+
+        user_2 = UserFactory()
+        self.user.following.add(user_2)
+        self.publications = [PublicationFactory(author=self.user if num % 2 else user_2) for num in range(6)]
+        for num in range(6):
+            PublicationCommentFactory(author=self.user if num % 2 else user_2, publication=self.publications[0])
+
+    # tests
+    @mark.success
+    @mark.django_db
+    @mark.parametrize("page_size", [1, 20])
+    def test_list_query_budgets(self, page_size):
+        url = reverse("publications-list")
+        with assert_query_budget("publications-list"):
+            self.client.get(url, {"page_size": page_size})
+        with assert_query_budget("publications-list"):
+            self.client.get(url, {"page_size": page_size, "author": self.user.id, "from_date": "01-01-2024"})
+        with assert_query_budget("publications-list-cursor"):
+            self.client.get(url, {"page_size": page_size, "pagination": "cursor"})
+        with assert_query_budget("publications-list-uncounted"):
+            self.client.get(url, {"page_size": page_size, "count": "none"})
+        with assert_query_budget("publications-comments-list"):
+            self.client.get(
+                reverse("publications-comments", kwargs={"pk": self.publications[0].id}), {"page_size": page_size}
+            )
+        with assert_query_budget("feed-list"):
+            self.client.get(reverse("feed-list"), {"page_size": page_size})
+
+    @mark.success
+    @mark.django_db
+    def test_detail_query_budget(self):
+        url = reverse("publications-detail", kwargs={"pk": self.publications[0].id})
+        with assert_query_budget("publications-detail"):
+            self.client.get(url)
+        with assert_query_budget("publications-detail", budget=2):  # token and validators, the detail is cached
+            self.client.get(url)
+
+    @mark.success
+    @mark.django_db
+    def test_detail_serializes_the_author_once(self, monkeypatch):
+        publication = Publication.objects.select_related("author").get(pk=self.publications[1].pk)
+        serialized = list()
+        to_representation = UserSerializer.to_representation
+        monkeypatch.setattr(
+            UserSerializer, "to_representation", lambda *args: serialized.append(args[1]) or to_representation(*args)
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            data = get_publication_detail_data(publication)
+        assert serialized == [publication.author] and len(queries) == 0
+        assert data["publication"]["author"] == data["author"]["id"] == self.user.id
+
+    @mark.success
+    @mark.django_db
+    def test_create_query_budgets(self):
+        with assert_query_budget("publications-create"):
+            self.client.post(reverse("publications-list"), {"title": "title", "content": "content"}, format="json")
+        with assert_query_budget("publications-comments-create"):
+            self.client.post(
+                reverse("publications-comments", kwargs={"pk": self.publications[0].id}),
+                {"content": "content"},
+                format="json",
+            )
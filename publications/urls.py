@@ -2,12 +2,18 @@ from django.urls import include, path
 
 from rest_framework.routers import SimpleRouter
 
-from publications.views import PublicationModelViewSet
+from publications.async_views import publication_comments, publication_detail, publication_list
+from publications.views import FeedViewSet, PublicationModelViewSet
 
 router = SimpleRouter()
 router.register(r"posts", PublicationModelViewSet, basename="publications")
+router.register(r"feed", FeedViewSet, basename="feed")
 
 
 urlpatterns = [
     path("", include(router.urls)),
+    # async (ASGI) read endpoints
+    path("async/posts/", publication_list, name="async-publications-list"),
+    path("async/posts/<int:pk>/", publication_detail, name="async-publications-detail"),
+    path("async/posts/<int:pk>/comments/", publication_comments, name="async-publications-comments"),
 ]
@@ -1,57 +1,148 @@
+from django.conf import settings
+from django.db.models import F, OuterRef, Subquery
+from django.http import Http404, StreamingHttpResponse
+
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.viewsets import GenericViewSet, ModelViewSet
 
+from publications.caches import publication_detail_cache
 from publications.filters import PublicationFilter
 from publications.models import Publication, PublicationComment
 from publications.serializers import (
+    PublicationCommentBulkCreateSerializer,
     PublicationCommentCreateSerializer,
     PublicationCommentSerializer,
     PublicationCreateSerializer,
+    PublicationSearchSerializer,
     PublicationSerializer,
 )
-from users.serializers import UserSerializer
+from users.models import Follow
+from users.serializers import USER_VALIDATOR_FIELDS, UserSerializer
+from utils.metrics import timed
+from utils.paginations import KeysetCursorPagination, MergedKeysetCursorPagination
+from utils.renderers import CSVRenderer, NDJSONRenderer
+from utils.views import ConditionalGetMixin, LeanListModelMixin, get_etag
+
+__all__ = (
+    "PublicationModelViewSet",
+    "FeedViewSet",
+    "get_publication_detail_data",
+)
 
-__all__ = ("PublicationModelViewSet",)
+
+def get_publication_detail_data(publication):
+    """
+    Payload of "GET /api/posts/{id}/", shared by the sync and the async views and cached by both. The last comments
+    are already serialized in "recent_comments", "publication.author" must be selected with the publication. The author
+    is serialized once, by UserSerializer: the "author" of the publication is its "author_id" column.
+    """
+    with timed("serializer"):
+        return {
+            "publication": PublicationSerializer(publication).data,
+            "last_3_comments": publication.recent_comments,
+            "author": UserSerializer(publication.author).data,
+        }
 
 
-class PublicationModelViewSet(ModelViewSet):
+class PublicationModelViewSet(ConditionalGetMixin, LeanListModelMixin, ModelViewSet):
     http_method_names = ["get", "post"]
     filterset_class = PublicationFilter
+    lookup_value_regex = "[0-9]+"
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            self._paginator = self.get_pagination_class()()
+        return self._paginator
+
+    def get_pagination_class(self):
+        # "?pagination=cursor" (or any "?cursor=" link returned by it) opts in to keyset pagination. Its keyset is
+        # ("-created", "-id"), which would drop the rank order of the search results: "?q=" is paged by page number
+        query_params = self.request.query_params
+        if self.action == "list" and (query_params.get("pagination") == "cursor" or "cursor" in query_params):
+            if query_params.get("q"):
+                raise ValidationError(
+                    {"q": ["Search results are ranked, they can't be paged with 'pagination=cursor'."]}
+                )
+            return KeysetCursorPagination
+        return self.pagination_class
 
     def get_serializer_class(self):
-        if self.action == "create":
+        if self.action in ("create", "bulk"):
             return PublicationCreateSerializer
         if self.action == "list":
+            return PublicationSearchSerializer if self.request.query_params.get("q") else PublicationSerializer
+        if self.action == "export":
             return PublicationSerializer
-        if self.action == "comments":
+        if self.action in ("comments", "comments_export"):
             return PublicationCommentSerializer
+        if self.action == "comments_bulk":
+            return PublicationCommentBulkCreateSerializer
 
     def get_queryset(self):
         if self.action in ("retrieve", "create"):
             return Publication.objects.select_related("author")
         if self.action == "list":
+            # "author" is serialized as its id, it doesn't need select_related("author")
             return Publication.objects.order_by("-created")
-        if self.action == "comments":
+        if self.action == "export":
+            return Publication.objects.order_by("-created", "-id")
+        if self.action in ("comments", "comments_bulk", "comments_export"):
             return Publication.objects.all()
 
-    def retrieve(self, request, *args, **kwargs):
-        publication = self.get_object()
+    def get_validators(self):
+        if self.action == "retrieve":
+            # publications don't change but for their comments: those and the author's columns, read by the primary
+            # keys, are the ETag. The serializers (or the cache) are only read when it doesn't match
+            row = (
+                Publication.objects.filter(pk=self.kwargs["pk"])
+                .values_list("comments_count", "recent_comments", *(f"author__{f}" for f in USER_VALIDATOR_FIELDS))
+                .first()
+            )
+            if row is not None:
+                self.detail_validators = row
+                return f'W/"{get_etag(row)}"', None
+        if self.action == "comments":
+            # comments are only added (or deleted along with their publication or author): the last one and the
+            # count tell whether the list changed. Index scans of "pubcomment_pub_created_id_idx"
+            last_comments = PublicationComment.objects.filter(publication=OuterRef("pk")).order_by("-created", "-id")
+            row = (
+                Publication.objects.filter(pk=self.kwargs["pk"])
+                .annotate(
+                    last_comment_id=Subquery(last_comments.values("id")[:1]),
+                    last_comment_created=Subquery(last_comments.values("created")[:1]),
+                )
+                .values_list("created", "comments_count", "last_comment_id", "last_comment_created")
+                .first()
+            )
+            if row is not None:
+                created, comments_count, last_comment_id, last_comment_created = row
+                return get_etag(comments_count, last_comment_id), last_comment_created or created
+        return None
 
-        last_3_comments = PublicationComment.objects.raw(
-            f"SELECT * FROM publications_publicationcomment "
-            f"WHERE publication_id = {publication.id} ORDER BY id DESC LIMIT 3;"
+    def retrieve(self, request, *args, **kwargs):
+        if getattr(self, "detail_validators", None) is None:
+            raise Http404("No Publication matches the given query.")  # not found by "get_validators"
+        data = publication_detail_cache.get_or_set(
+            int(self.kwargs["pk"]),
+            lambda: get_publication_detail_data(self.get_object()),
+            is_fresh=self._is_fresh_detail,
         )
-
-        data = {
-            "publication": PublicationSerializer(publication).data,
-            "last_3_comments": PublicationCommentSerializer(last_3_comments, many=True).data,
-            "author": UserSerializer(publication.author).data,
-        }
-
         return Response(data)
 
+    def _is_fresh_detail(self, data):
+        # a cached detail whose comments or author changed since (e.g. the author's counters) is loaded again
+        author = data["author"]
+        shown = (
+            data["publication"]["comments_count"],
+            data["last_3_comments"],
+            *(author[field] for field in USER_VALIDATOR_FIELDS),
+        )
+        return shown == self.detail_validators
+
     @action(detail=True, methods=["get", "post"], url_path="comments")
     def comments(self, request, pk=None):
         if request.method == "POST":
@@ -69,14 +160,85 @@ class PublicationModelViewSet(ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def _comments_get(self, publication_id):
-        queryset = (
-            PublicationComment.objects.filter(publication=publication_id).select_related("author").order_by("-created")
-        )
+        # "author" is serialized as its id, the "author_id" column is enough (no join with users_user)
+        queryset = PublicationComment.objects.filter(publication=publication_id).order_by("-created", "-id")
+        return self.get_list_response(queryset, PublicationCommentSerializer)
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        serializer = self.get_serializer(data=request.data, many=True)
+        return self._bulk_create(serializer, author=request.user)
 
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = PublicationCommentSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+    @action(detail=True, methods=["post"], url_path="comments/bulk")
+    def comments_bulk(self, request, pk=None):
+        publication = self.get_object()
+        serializer = self.get_serializer(data=request.data, many=True)
+        return self._bulk_create(serializer, author=request.user, publication=publication)
+
+    @action(detail=False, methods=["get"], url_path="export", renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        return self._export(self.filter_queryset(self.get_queryset()), filename="posts")
 
-        serializer = PublicationCommentSerializer(queryset, many=True)
-        return Response(serializer.data)
+    @action(detail=True, methods=["get"], url_path="comments/export", renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def comments_export(self, request, pk=None):
+        publication = self.get_object()
+        queryset = PublicationComment.objects.filter(publication=publication).order_by("-created", "-id")
+        return self._export(queryset, filename=f"post_{publication.id}_comments")
+
+    def _export(self, queryset, filename):
+        """
+        Stream the whole queryset in the format picked by content negotiation ("?format=ndjson|csv" or "Accept").
+        Rows are read as tuples through a server-side cursor and encoded as they arrive, with the fields of the
+        action's serializer: memory doesn't grow with the size of the export.
+        """
+        fields = self.get_serializer().fields
+        rows = queryset.values_list(*(field.source for field in fields.values())).iterator(
+            chunk_size=settings.EXPORT_CHUNK_SIZE
+        )
+
+        renderer = self.request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(list(fields), rows), content_type=f"{renderer.media_type}; charset={renderer.charset}"
+        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}.{renderer.format}"'
+        return response
+
+    def _bulk_create(self, serializer, **save_kwargs):
+        serializer.is_valid(raise_exception=True)  # only when the payload is not a list, or it is too long
+        serializer.save(**save_kwargs)  # the invalid items are skipped, check "serializer.item_errors"
+
+        # 400 only when every item is invalid, an empty list creates nothing successfully
+        created = serializer.instance or not serializer.item_errors
+        data = {"results": serializer.data, "errors": serializer.item_errors}
+        return Response(data, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+
+class FeedViewSet(GenericViewSet):
+    """Home timeline: publications of the users followed by the authenticated user, from newest to oldest."""
+
+    serializer_class = PublicationSerializer
+    pagination_class = MergedKeysetCursorPagination
+
+    def list(self, request):
+        page = self.paginate_queryset(
+            (
+                # fan-out on write: publications copied to the user's timeline, paged on the timeline index
+                (
+                    Publication.objects.filter(timeline_entries__owner=request.user).annotate(
+                        timeline_created=F("timeline_entries__created")
+                    ),
+                    ("-timeline_created", "-id"),
+                ),
+                # fan-out on read: publications of followed authors with more than FEED_FANOUT_MAX_FOLLOWERS followers
+                (
+                    Publication.objects.filter(
+                        fanned_out=False,
+                        author_id__in=Follow.objects.filter(from_user=request.user).values("to_user_id"),
+                    ),
+                    ("-created", "-id"),
+                ),
+            )
+        )
+        with timed("serializer"):
+            data = self.get_serializer(page, many=True).data
+        return self.get_paginated_response(data)
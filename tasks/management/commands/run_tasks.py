@@ -0,0 +1,49 @@
+from datetime import timedelta
+from time import sleep
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from tasks.models import Task
+from tasks.queue import run_pending
+
+__all__ = ("Command",)
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker of the task queue: run the due tasks, oldest first, and poll for new ones every --interval seconds. "
+        "Run as many workers as needed, each task is run by one of them. Failed tasks are retried with a backoff, the "
+        "ones out of attempts are kept as 'failed'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit once no task is due.")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.TASK_QUEUE_POLL_INTERVAL,
+            help="Seconds to wait for new tasks when none is due.",
+        )
+        parser.add_argument("--batch-size", type=int, default=100, help="Tasks run between progress lines.")
+        parser.add_argument(
+            "--purge-days", type=int, help="Delete the tasks done more than N days ago (their keys can be reused)."
+        )
+
+    def handle(self, *args, once, interval, batch_size, purge_days, **options):
+        if purge_days is not None:
+            since = timezone.now() - timedelta(days=purge_days)
+            deleted, _ = Task.objects.filter(status=Task.DONE, finished__lt=since).delete()
+            self.stdout.write(f"{deleted} done task(s) deleted")
+
+        while True:
+            count = run_pending(limit=batch_size)
+            if count:
+                self.stdout.write(f"{count} task(s) run")
+            if count < batch_size:
+                if once:
+                    return
+                close_old_connections()  # as between requests, a connection past CONN_MAX_AGE (or broken) is closed
+                sleep(interval)
@@ -0,0 +1,42 @@
+from django.db.models import CharField, DateTimeField, Index, JSONField, PositiveIntegerField, Q, TextField
+from django.utils import timezone
+
+from utils.models import TimeStampModel
+
+__all__ = ("Task",)
+
+
+class Task(TimeStampModel):
+    """A call of a task function (check "tasks.queue.task"), run by the "run_tasks" workers."""
+
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
+    name = CharField(max_length=200, help_text="Dotted path of the task function")
+    args = JSONField(default=list, blank=True)
+    kwargs = JSONField(default=dict, blank=True)
+    idempotency_key = CharField(
+        max_length=200,
+        null=True,
+        blank=True,
+        unique=True,
+        help_text="Tasks enqueued again with the key of an existing one are dropped",
+    )
+    status = CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = PositiveIntegerField(default=0)
+    max_attempts = PositiveIntegerField(default=1)
+    run_after = DateTimeField(default=timezone.now, help_text="Not run before, pushed back after a failed attempt")
+    last_error = TextField(blank=True, default="")
+    finished = DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the next due task, the workers' only read
+            Index(fields=["run_after", "id"], condition=Q(status="pending"), name="task_pending_run_after_idx"),
+        ]
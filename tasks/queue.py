@@ -0,0 +1,109 @@
+import logging
+import traceback
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from tasks.models import Task
+
+__all__ = (
+    "enqueue",
+    "registry",
+    "run_next",
+    "run_pending",
+    "task",
+)
+
+logger = logging.getLogger(__name__)
+
+registry = dict()  # name -> task function
+
+
+def task(func=None, *, max_attempts=None):
+    """
+    Register "func" as a task, named after its dotted path, and add it an "enqueue(*args, idempotency_key=None,
+    **kwargs)" method. Arguments must be JSON serializable. A failed attempt is retried up to "max_attempts"
+    (settings.TASK_QUEUE_MAX_ATTEMPTS by default) with an exponential backoff.
+    """
+
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+        registry[name] = func
+
+        def _enqueue(*args, idempotency_key=None, **kwargs):
+            return enqueue(name, args, kwargs, idempotency_key=idempotency_key, max_attempts=max_attempts)
+
+        func.enqueue = _enqueue
+        return func
+
+    return decorator(func) if func is not None else decorator
+
+
+def enqueue(name, args=(), kwargs=None, idempotency_key=None, max_attempts=None):
+    """
+    Insert the task in the caller's transaction, so it's enqueued if (and only if) the caller's writes commit. A task
+    with the same "idempotency_key" as an existing one (run or not) is dropped. Without settings.TASK_QUEUE_ENABLED,
+    the task runs right away instead, in the caller's transaction.
+    """
+    if not settings.TASK_QUEUE_ENABLED:
+        registry[name](*args, **(kwargs or {}))
+        return
+
+    Task.objects.bulk_create(
+        [
+            Task(
+                name=name,
+                args=list(args),
+                kwargs=kwargs or {},
+                idempotency_key=idempotency_key,
+                max_attempts=max_attempts or settings.TASK_QUEUE_MAX_ATTEMPTS,
+            )
+        ],
+        ignore_conflicts=True,  # ON CONFLICT DO NOTHING, the idempotency key
+    )
+
+
+def run_next():
+    """
+    Run the next due task, return it (None when there is none). Workers claim tasks with "FOR UPDATE SKIP LOCKED", so
+    each one runs a different task, and a task's writes commit together with its status: a worker dying mid-task
+    leaves it pending, and a done task is never run again.
+    """
+    with transaction.atomic():
+        task = (
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(status=Task.PENDING, run_after__lte=timezone.now())
+            .order_by("run_after", "id")
+            .first()
+        )
+        if task is None:
+            return None
+
+        task.attempts += 1
+        try:
+            with transaction.atomic():  # its writes are rolled back if it fails
+                registry[task.name](*task.args, **task.kwargs)
+        except Exception:
+            task.last_error = traceback.format_exc()
+            if task.attempts >= task.max_attempts:
+                task.status, task.finished = Task.FAILED, timezone.now()
+                logger.error("Task %s (%s) failed after %s attempts", task.id, task.name, task.attempts)
+            else:
+                delay = settings.TASK_QUEUE_RETRY_DELAY * 2 ** (task.attempts - 1)
+                task.run_after = timezone.now() + timedelta(seconds=delay)
+                logger.warning("Task %s (%s) failed, retried in %ss", task.id, task.name, delay)
+        else:
+            task.status, task.finished = Task.DONE, timezone.now()
+        task.save(update_fields=["attempts", "status", "run_after", "last_error", "finished"])
+        return task
+
+
+def run_pending(limit=None):
+    """Run the due tasks, up to "limit", return the number of tasks run."""
+    count = 0
+    while (limit is None or count < limit) and run_next() is not None:
+        count += 1
+    return count
@@ -0,0 +1,140 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from pytest import fixture, mark
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from publications.models import Publication, TimelineEntry
+from tasks.models import Task
+from tasks.queue import run_next, run_pending, task
+from users.tests.factories import UserFactory
+from utils.query_budget import assert_query_budget
+
+User = get_user_model()
+
+
+calls = list()
+
+
+@task
+def record_call(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def rename_and_fail(user_id):
+    User.objects.filter(pk=user_id).update(first_name="renamed")
+    raise ValueError("boom")
+
+
+class TestTaskQueue:
+    @fixture(autouse=True)
+    def set_up(self, settings):
+        settings.TASK_QUEUE_ENABLED = True
+        calls.clear()
+
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.user.set_password(self.user.username)
+        self.user.save()
+
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("api_token_auth"), data={"username": self.user.username, "password": self.user.username}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+
+    # private methods
+
+    def _run_tasks(self):
+        out = StringIO()
+        call_command("run_tasks", "--once", stdout=out)
+        return out.getvalue()
+
+    # tests
+
+    @mark.success
+    @mark.django_db
+    def test_publication_side_effects_enqueued(self):
+        follower = UserFactory()
+        follower.following.add(self.user)
+
+        with assert_query_budget("publications-create"):  # the tasks' INSERTs instead of the side effects
+            response = self.client.post(
+                reverse("publications-list"), data={"title": "title", "content": "content"}, format="json"
+            )
+        assert response.status_code == status.HTTP_201_CREATED
+        publication = Publication.objects.get()
+
+        self.user.refresh_from_db()
+        assert self.user.publications_count == 0
+        assert not TimelineEntry.objects.exists()
+        assert Task.objects.filter(status=Task.PENDING).count() == 2  # author counter, fan-out
+
+        assert self._run_tasks() == "2 task(s) run\n"
+        self.user.refresh_from_db()
+        assert self.user.publications_count == 1
+        assert list(TimelineEntry.objects.values_list("owner_id", "publication_id")) == [(follower.id, publication.id)]
+        assert Task.objects.filter(status=Task.DONE).count() == 2
+        assert self._run_tasks() == ""  # nothing due
+
+    @mark.success
+    @mark.django_db
+    def test_run_right_away_when_disabled(self, settings):
+        settings.TASK_QUEUE_ENABLED = False
+        record_call.enqueue(1)
+        assert calls == [1]
+        assert not Task.objects.exists()
+
+    @mark.success
+    @mark.django_db
+    def test_idempotency_key(self):
+        record_call.enqueue(1, idempotency_key="once")
+        record_call.enqueue(2, idempotency_key="once")
+        assert run_pending() == 1
+        record_call.enqueue(3, idempotency_key="once")  # run already
+        assert run_pending() == 0
+        assert calls == [1]
+
+        record_call.enqueue(4)
+        record_call.enqueue(4)  # without a key, both run
+        assert run_pending() == 2
+        assert calls == [1, 4, 4]
+
+    @mark.error
+    @mark.django_db
+    def test_failed_task_retried(self):
+        rename_and_fail.enqueue(self.user.id)
+
+        task = run_next()
+        assert (task.status, task.attempts) == (Task.PENDING, 1)
+        assert "ValueError: boom" in task.last_error
+        assert task.run_after > timezone.now()  # backoff
+        self.user.refresh_from_db()
+        assert self.user.first_name != "renamed"  # its writes rolled back
+        assert run_next() is None  # not due yet
+
+        Task.objects.update(run_after=timezone.now() - timedelta(seconds=1))
+        task = run_next()
+        assert (task.status, task.attempts) == (Task.FAILED, 2)  # out of attempts
+        assert task.finished is not None
+        Task.objects.update(run_after=timezone.now() - timedelta(seconds=1))
+        assert run_next() is None
+
+    @mark.success
+    @mark.django_db
+    def test_purge_done_tasks(self):
+        record_call.enqueue(1, idempotency_key="old")
+        record_call.enqueue(2)
+        run_pending()
+        Task.objects.filter(idempotency_key="old").update(finished=timezone.now() - timedelta(days=8))
+
+        out = StringIO()
+        call_command("run_tasks", "--once", "--purge-days=7", stdout=out)
+        assert out.getvalue() == "1 done task(s) deleted\n"
+        assert list(Task.objects.values_list("args", flat=True)) == [[2]]
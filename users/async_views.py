@@ -0,0 +1,24 @@
+from django.http import Http404
+
+from users.models import User
+from users.views import UserCustomViewSet
+from utils.async_views import async_api_view
+from utils.metrics import timed
+
+__all__ = ("user_detail",)
+
+
+# Async (ASGI) version of "GET /api/users/{id}/" of UserCustomViewSet, same payload.
+
+
+@async_api_view
+async def user_detail(request, pk):
+    # Django 4.2 has no async prefetch, "aget" runs the user query and its prefetches in one thread hop
+    viewset = UserCustomViewSet(action="retrieve", request=request)
+    queryset = viewset.get_queryset()
+    try:
+        user = await queryset.aget(pk=pk)
+    except User.DoesNotExist:
+        raise Http404("No User matches the given query.")
+    with timed("serializer"):
+        return viewset.get_serializer_class()(user).data
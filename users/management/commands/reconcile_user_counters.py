@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from publications.counters import reconcile_user_counters, user_counters
+
+__all__ = ("Command",)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute User.publications_count, User.comments_count, User.followers_count and User.following_count from "
+        "the publications and follows tables (one grouped aggregate per counter) and save the users whose counters "
+        "drifted, in one UPDATE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report the drifted users without saving them.")
+
+    def handle(self, *args, dry_run, **options):
+        if not dry_run:
+            user_counters.flush()  # the increments written behind of this process (all of them with Redis)
+
+        # increments committed while this runs may be overwritten, run it when imports are done
+        drifted = reconcile_user_counters(dry_run=dry_run)
+
+        action = "would be updated" if dry_run else "updated"
+        self.stdout.write(self.style.SUCCESS(f"{drifted} user(s) with drifted counters {action}."))
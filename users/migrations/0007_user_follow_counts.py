@@ -0,0 +1,32 @@
+# Generated by Django 4.2.16 on 2026-10-18 10:49
+
+from django.db import migrations, models
+
+# Both columns start at 0 ("ADD COLUMN" with a default doesn't rewrite the table), the existing users are backfilled by
+# "python manage.py reconcile_user_counters" after migrating.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0006_user_username_trgm_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="followers_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Each time the User is followed or unfollowed, this field is updated. Check signal 'users.update_follow_counts'",
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="following_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Each time the User follows or unfollows, this field is updated. Check signal 'users.update_follow_counts'",
+            ),
+        ),
+    ]
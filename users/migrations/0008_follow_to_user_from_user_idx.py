@@ -0,0 +1,25 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:05
+
+from django.db import migrations
+
+# The follows table is the auto-created through table of User.following, which can't declare indexes: its unique
+# (from_user_id, to_user_id) index pages a user's following, this one pages a user's followers.
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and it doesn't lock the tables against writes
+    atomic = False
+
+    dependencies = [
+        ("users", "0007_user_follow_counts"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS users_user_following_to_user_from_user_idx "
+                "ON users_user_following (to_user_id, from_user_id);"
+            ),
+            reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS users_user_following_to_user_from_user_idx;",
+        ),
+    ]
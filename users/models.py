@@ -1,9 +1,14 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db.models import CharField, EmailField, ManyToManyField, PositiveIntegerField
+from django.db.models.functions import Upper
 
 from utils.models import TimeStampModel
 
-__all__ = ("User",)
+__all__ = (
+    "User",
+    "Follow",
+)
 
 
 class User(TimeStampModel, AbstractUser):
@@ -29,6 +34,30 @@ class User(TimeStampModel, AbstractUser):
             "Check signal 'publications.update_user_comments_count'"
         ),
     )
+    followers_count = PositiveIntegerField(
+        default=0,
+        help_text=(
+            "Each time the User is followed or unfollowed, this field is updated. "
+            "Check signal 'users.update_follow_counts'"
+        ),
+    )
+    following_count = PositiveIntegerField(
+        default=0,
+        help_text=(
+            "Each time the User follows or unfollows, this field is updated. "
+            "Check signal 'users.update_follow_counts'"
+        ),
+    )
 
     groups = None  # remove AbstractUser.groups field
     user_permissions = None  # remove AbstractUser.user_permissions field
+
+    class Meta:
+        indexes = [
+            # "username" filter of UserFilter: "icontains" is "UPPER(username) LIKE UPPER('%x%')", which a B-tree
+            # can't serve. Trigrams can, for 3 or more characters (requires the "pg_trgm" extension)
+            GinIndex(OpClass(Upper("username"), name="gin_trgm_ops"), name="user_username_trgm_idx"),
+        ]
+
+
+Follow = User.following.through  # "from_user" follows "to_user"
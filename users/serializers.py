@@ -1,12 +1,39 @@
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
+from django.db import router, transaction
+from django.db.models.signals import m2m_changed
 
-from rest_framework.serializers import ModelSerializer, SerializerMethodField
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import IntegerField, ListField, ModelSerializer, Serializer, SerializerMethodField
 
-from users.models import User
+from users.models import Follow, User
 
 __all__ = (
+    "USER_VALIDATOR_FIELDS",
     "UserSerializer",
     "UserDetailSerializer",
+    "UserDetailWithFollowsSerializer",
+    "FollowSerializer",
+    "follow_users",
+    "unfollow_users",
+)
+
+
+# Columns shown by UserSerializer and UserDetailSerializer that change after the user is created, but for "last_login"
+# and "password": the weak ETags of the responses showing a user are read from them, in the query of their validators
+# (check the views' "get_validators"). Responses that only differ in logins and password changes are equivalent.
+USER_VALIDATOR_FIELDS = (
+    "email",
+    "username",
+    "first_name",
+    "last_name",
+    "is_superuser",
+    "is_staff",
+    "is_active",
+    "publications_count",
+    "comments_count",
+    "followers_count",
+    "following_count",
 )
 
 
@@ -21,6 +48,8 @@ class UserSerializer(ModelSerializer):
             "last_login": {"read_only": True},
             "publications_count": {"read_only": True},
             "comments_count": {"read_only": True},
+            "followers_count": {"read_only": True},
+            "following_count": {"read_only": True},
         }
 
     def create(self, validated_data):
@@ -31,6 +60,16 @@ class UserSerializer(ModelSerializer):
 
 
 class UserDetailSerializer(UserSerializer):
+    # the followers and following are read from "GET /api/users/{id}/followers/" and ".../following/", paginated
+
+    class Meta:
+        model = User
+        exclude = ("following",)
+
+
+class UserDetailWithFollowsSerializer(UserDetailSerializer):
+    """Previous shape of the detail ("?follows=ids"): the complete lists of followers and following ids."""
+
     following = SerializerMethodField(required=False, read_only=True)
     followers = SerializerMethodField(required=False, read_only=True)
 
@@ -38,8 +77,80 @@ class UserDetailSerializer(UserSerializer):
         model = User
         fields = "__all__"
 
+    # ".all()" reads the "following" and "followers" prefetched by the view, instead of one query for each one
+
     def get_following(self, user):
-        return user.following.values_list("id", flat=True)
+        return [followed.id for followed in user.following.all()]
 
     def get_followers(self, user):
-        return user.followers.values_list("id", flat=True)
+        return [follower.id for follower in user.followers.all()]
+
+
+class FollowSerializer(Serializer):
+    """Ids of the users to follow (or unfollow), at most settings.FOLLOW_MAX_IDS per request."""
+
+    ids = ListField(child=IntegerField(min_value=1), allow_empty=False, max_length=settings.FOLLOW_MAX_IDS)
+
+
+# Follow edges are inserted and deleted in batches. The users involved are locked first, in id order: a follower's
+# concurrent batches can't count the same edge twice, and users following each other at once wait instead of
+# deadlocking over their counters. "m2m_changed" is sent as "user.following.add/remove()" would, so the counters and
+# the follower's timeline are kept up to date (check signals 'users.update_follow_counts' and
+# 'publications.update_follower_timeline').
+
+
+def follow_users(user, ids):
+    """
+    Make "user" follow the users of "ids" with a single INSERT. Returns the ids of the users it wasn't following yet,
+    raises ValidationError if any of them doesn't exist.
+    """
+    with transaction.atomic():
+        ids = _lock_users(user, ids)
+        followed_ids = set(
+            Follow.objects.filter(from_user_id=user.pk, to_user_id__in=ids).values_list("to_user_id", flat=True)
+        )
+        new_ids = ids - followed_ids
+        Follow.objects.bulk_create(
+            [Follow(from_user_id=user.pk, to_user_id=pk) for pk in new_ids],
+            ignore_conflicts=True,  # edges inserted outside these locks (e.g. "following.add") are skipped
+            batch_size=settings.BULK_CREATE_BATCH_SIZE,
+        )
+        _send_follows_changed(user, "post_add", new_ids)
+    return new_ids
+
+
+def unfollow_users(user, ids):
+    """
+    Make "user" unfollow the users of "ids" with a single DELETE. Returns the ids of the users it was following,
+    raises ValidationError if any of them doesn't exist.
+    """
+    with transaction.atomic():
+        ids = _lock_users(user, ids)
+        followed_ids = set(
+            Follow.objects.filter(from_user_id=user.pk, to_user_id__in=ids).values_list("to_user_id", flat=True)
+        )
+        Follow.objects.filter(from_user_id=user.pk, to_user_id__in=followed_ids).delete()
+        _send_follows_changed(user, "post_remove", followed_ids)
+    return followed_ids
+
+
+def _lock_users(user, ids):
+    ids = set(ids)
+    locked_ids = User.objects.select_for_update().filter(pk__in=ids | {user.pk}).order_by("pk")
+    missing_ids = ids - set(locked_ids.values_list("id", flat=True))
+    if missing_ids:
+        raise ValidationError({"ids": [f"Users with ids {sorted(missing_ids)} do not exist."]})
+    return ids
+
+
+def _send_follows_changed(user, action, pk_set):
+    if pk_set:
+        m2m_changed.send(
+            sender=Follow,
+            action=action,
+            instance=user,
+            reverse=False,
+            model=User,
+            pk_set=pk_set,
+            using=router.db_for_write(Follow, instance=user),
+        )
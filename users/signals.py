@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, When
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from users.models import Follow, User
+from utils.authentication import CachingTokenAuthentication, token_cache
+
+__all__ = (
+    "invalidate_token_cache_on_token_delete",
+    "invalidate_token_cache_on_user_save",
+    "update_follow_counts",
+)
+
+
+# The token cache keeps a snapshot of the user ("utils.authentication.token_cache"). It is invalidated after commit,
+# otherwise a concurrent request could cache the token again with the previous state.
+
+
+def _invalidate_token_cache(keys):
+    cache_keys = [CachingTokenAuthentication.get_cache_key(key) for key in keys]
+    transaction.on_commit(lambda: [token_cache.invalidate(cache_key) for cache_key in cache_keys])
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token_cache_on_token_delete(sender, instance, **kwargs):
+    _invalidate_token_cache([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_token_cache_on_user_save(sender, instance, created, update_fields, **kwargs):
+    if created:
+        return
+    # saves of fields out of the snapshot don't query the tokens, e.g. "last_login" on each login
+    if update_fields is not None and update_fields.isdisjoint(CachingTokenAuthentication.snapshot_fields):
+        return
+    # e.g. deactivated, or its username changed
+    _invalidate_token_cache(Token.objects.filter(user_id=instance.pk).values_list("key", flat=True))
+
+
+# "followers_count" and "following_count" are incremented by the DB itself, both sides in one UPDATE. The batch
+# follow/unfollow of the API sends "post_add"/"post_remove" itself (check "users.serializers.follow_users"), with the
+# ids of the edges it inserted or deleted.
+
+
+@receiver(m2m_changed, sender=Follow)
+def update_follow_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    # "reverse" when the relation is changed from the followed user side ("followed.followers.add(...)")
+    instance_column, other_column = ("to_user_id", "from_user_id") if reverse else ("from_user_id", "to_user_id")
+    edges = Follow.objects.filter(**{instance_column: instance.pk})
+
+    if action == "pre_remove":
+        # "remove()" reports every id it's given, followed or not: only the existing edges are counted
+        pk_set.intersection_update(edges.filter(**{f"{other_column}__in": pk_set}).values_list(other_column, flat=True))
+    elif action == "pre_clear":
+        # "clear()" doesn't report the ids, they are read before the edges are deleted
+        _update_follow_counts(instance.pk, reverse, set(edges.values_list(other_column, flat=True)), step=-1)
+    elif action in ("post_add", "post_remove"):
+        _update_follow_counts(instance.pk, reverse, pk_set, step=1 if action == "post_add" else -1)
+
+
+def _update_follow_counts(pk, reverse, pk_set, step):
+    if not pk_set:
+        return
+
+    pk_field, others_field = (
+        ("followers_count", "following_count") if reverse else ("following_count", "followers_count")
+    )
+    User.objects.filter(pk__in={pk, *pk_set}).update(
+        **{
+            pk_field: Case(
+                When(pk=pk, then=F(pk_field) + step * len(pk_set)), default=F(pk_field), output_field=IntegerField()
+            ),
+            others_field: Case(
+                When(pk__in=pk_set, then=F(others_field) + step), default=F(others_field), output_field=IntegerField()
+            ),
+        }
+    )
@@ -1,13 +1,25 @@
+from io import StringIO
 from urllib.parse import urlencode
 
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from pytest import fixture, mark
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
+from publications.tests.factories import PublicationCommentFactory, PublicationFactory
+from users.filters import UserFilter
+from users.models import Follow
 from users.tests.factories import UserFactory
+from utils.authentication import CachingTokenAuthentication, token_cache
+from utils.query_budget import assert_query_budget
 
 User = get_user_model()
 
@@ -34,10 +46,19 @@ class TestUserModelViewSet:
     def _post_data(self, data):  # without authentication required
         return self.client.post(reverse(f"{self.reverse_name}-list"), data, format="json")
 
-    def _retrieve_data(self, pk, authenticate=True):
+    def _retrieve_data(self, pk, query_params=None, authenticate=True):
         headers = self._get_auth_token_headers() if authenticate else dict()
         return self.client.get(
-            path=reverse(f"{self.reverse_name}-detail", kwargs={"pk": pk}), headers=headers, format="json"
+            path=reverse(f"{self.reverse_name}-detail", kwargs={"pk": pk}),
+            data=query_params,
+            headers=headers,
+            format="json",
+        )
+
+    def _list_follows(self, pk, action, query_params=None, authenticate=True):
+        headers = self._get_auth_token_headers() if authenticate else dict()
+        return self.client.get(
+            reverse(f"{self.reverse_name}-{action}", kwargs={"pk": pk}), query_params, headers=headers, format="json"
         )
 
     def _list_data(self, query_params=None, authenticate=True):
@@ -54,6 +75,15 @@ class TestUserModelViewSet:
             format="json",
         )
 
+    def _post_follow_many(self, pk, ids, action="follow-many", authenticate=True):
+        headers = self._get_auth_token_headers() if authenticate else dict()
+        return self.client.post(
+            reverse(f"{self.reverse_name}-{action}", kwargs={"pk": pk}), {"ids": ids}, headers=headers, format="json"
+        )
+
+    def _get_follow_counts(self, *users):
+        return [tuple(User.objects.values_list("followers_count", "following_count").get(pk=user.pk)) for user in users]
+
     # tests
     @mark.success
     @mark.django_db
@@ -97,6 +127,34 @@ class TestUserModelViewSet:
                 assert item[field] is not None, field
         assert response.status_code == status.HTTP_200_OK
 
+    @mark.success
+    @mark.django_db
+    def test_list_lean_serialization_parity(self, settings):
+        UserFactory(first_name="Zoë", last_login=timezone.now(), is_staff=True)
+        UserFactory(first_name="", last_name='"quoted"')
+
+        settings.LEAN_SERIALIZATION = False
+        response = self._list_data()
+        settings.LEAN_SERIALIZATION = True
+        lean_response = self._list_data()
+
+        assert lean_response.content == response.content
+        assert len(lean_response.json()["results"]) == 3
+        assert lean_response.status_code == status.HTTP_200_OK
+
+    @mark.success
+    @mark.django_db
+    def test_list_without_count_success(self):
+        ids = [self.user.id] + [UserFactory().id for _ in range(2)]
+
+        response = self._list_data(query_params={"count": "none", "page_size": 2})
+
+        assert response.data["total_items"] is None
+        assert response.data["total_pages"] is None
+        assert [item["id"] for item in response.data["results"]] == ids[:2]
+        assert response.data["next"] is not None
+        assert response.status_code == status.HTTP_200_OK
+
     @mark.success
     @mark.django_db
     def test_list_with_filter_success(self):
@@ -123,14 +181,30 @@ class TestUserModelViewSet:
     @mark.success
     @mark.django_db
     def test_retrieve_success(self):
+        self.user.following.add(UserFactory())
+
         response = self._retrieve_data(pk=self.user.id)
         # fmt: off
         assert set(response.data.keys()) == {
-            'comments_count', 'created', 'date_joined', 'email', 'first_name', 'followers',
-            'following', 'id', 'is_active', 'is_staff', 'is_superuser', 'last_login', 'last_name',
+            'comments_count', 'created', 'date_joined', 'email', 'first_name', 'followers_count',
+            'following_count', 'id', 'is_active', 'is_staff', 'is_superuser', 'last_login', 'last_name',
             'password', 'publications_count', 'username'
         }
         # fmt: off
+        assert (response.data["followers_count"], response.data["following_count"]) == (0, 1)
+        assert response.status_code == status.HTTP_200_OK
+
+    @mark.success
+    @mark.django_db
+    def test_retrieve_with_follow_ids_success(self):
+        followed, follower = UserFactory(), UserFactory()
+        self.user.following.add(followed)
+        self.user.followers.add(follower)
+
+        response = self._retrieve_data(pk=self.user.id, query_params={"follows": "ids"})
+
+        assert (response.data["following"], response.data["followers"]) == ([followed.id], [follower.id])
+        assert (response.data["followers_count"], response.data["following_count"]) == (1, 1)
         assert response.status_code == status.HTTP_200_OK
 
     @mark.unauthorized
@@ -147,6 +221,35 @@ class TestUserModelViewSet:
         assert response.json()["detail"] == "No User matches the given query."
         assert response.status_code == status.HTTP_404_NOT_FOUND
 
+    @mark.success
+    @mark.django_db
+    def test_retrieve_not_modified(self):
+        url = reverse(f"{self.reverse_name}-detail", kwargs={"pk": self.user.id})
+        headers = self._get_auth_token_headers()
+        response = self.client.get(url, headers=headers)
+        etag = response["ETag"]
+        assert response["Cache-Control"] == "private, no-cache"
+
+        assert etag.startswith('W/"')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, headers=headers | {"If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert len(queries) == 1  # the user (the token is cached)
+
+        User.objects.filter(pk=self.user.pk).update(last_login=timezone.now())  # a login
+        response = self.client.get(url, headers=headers | {"If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        self.user.following.add(UserFactory())  # the counters changed
+        response = self.client.get(url, headers=headers | {"If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["following_count"] == 1 and response["ETag"] != etag
+
+        # the ids can change while the counters don't, that detail has no validators
+        response = self.client.get(url, {"follows": "ids"}, headers=headers | {"If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK and "ETag" not in response
+
     @mark.success
     @mark.django_db
     def test_follow_success(self):
@@ -173,3 +276,423 @@ class TestUserModelViewSet:
         response = self._post_follow(self.user.id, followed.id, authenticate=False)
         assert response.json()["detail"] == "Authentication credentials were not provided."
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @mark.success
+    @mark.django_db
+    def test_follow_many_success(self):
+        followed = [UserFactory() for _ in range(3)]
+        self.user.following.add(followed[0])
+
+        response = self._post_follow_many(self.user.id, [user.id for user in followed] + [followed[1].id])
+
+        assert response.json() == {"followed": [followed[1].id, followed[2].id]}
+        assert set(self.user.following.values_list("id", flat=True)) == {user.id for user in followed}
+        assert self._get_follow_counts(self.user, *followed) == [(0, 3), (1, 0), (1, 0), (1, 0)]
+        assert response.status_code == status.HTTP_200_OK
+
+    @mark.error
+    @mark.django_db
+    def test_follow_many_wrong_id(self):
+        followed = UserFactory()
+
+        response = self._post_follow_many(self.user.id, [followed.id, 0, 999_999])
+
+        assert response.json() == {"ids": {"1": ["Ensure this value is greater than or equal to 1."]}}
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = self._post_follow_many(self.user.id, [followed.id, 999_999])
+
+        assert response.json() == {"ids": ["Users with ids [999999] do not exist."]}
+        assert self.user.following.count() == 0
+        assert self._get_follow_counts(self.user, followed) == [(0, 0), (0, 0)]
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @mark.success
+    @mark.django_db
+    def test_unfollow_success(self):
+        followed = [UserFactory() for _ in range(3)]
+        self._post_follow_many(self.user.id, [user.id for user in followed[:2]])
+
+        response = self._post_follow_many(self.user.id, [user.id for user in followed], action="unfollow")
+
+        assert response.json() == {"unfollowed": [followed[0].id, followed[1].id]}
+        assert self.user.following.count() == 0
+        assert self._get_follow_counts(self.user, *followed) == [(0, 0), (0, 0), (0, 0), (0, 0)]
+        assert response.status_code == status.HTTP_200_OK
+
+    @mark.unauthorized
+    @mark.django_db
+    def test_follow_for_another_user_forbidden(self):
+        other_user, followed = UserFactory(), UserFactory()
+        other_user.following.add(followed)
+
+        responses = (
+            self._post_follow(other_user.id, self.user.id),
+            self._post_follow_many(other_user.id, [self.user.id]),
+            self._post_follow_many(other_user.id, [followed.id], action="unfollow"),
+        )
+
+        for response in responses:
+            assert response.json()["detail"] == "You do not have permission to perform this action."
+            assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert list(other_user.following.values_list("id", flat=True)) == [followed.id]
+        assert self._get_follow_counts(other_user, self.user) == [(0, 1), (0, 0)]
+
+    @mark.unauthorized
+    @mark.django_db
+    def test_follow_many_without_auth(self):
+        response = self._post_follow_many(self.user.id, [UserFactory().id], authenticate=False)
+        assert response.json()["detail"] == "Authentication credentials were not provided."
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @mark.success
+    @mark.django_db
+    def test_list_followers_and_following_success(self):
+        users = [UserFactory() for _ in range(5)]
+        self.user.followers.add(*users)
+        self.user.following.add(users[0])
+
+        response = self._list_follows(self.user.id, "followers", {"page_size": 2})
+        pages = [response.json()]
+        while pages[-1]["next"]:
+            pages.append(self.client.get(pages[-1]["next"], headers=self._get_auth_token_headers()).json())
+
+        assert [[row["id"] for row in page["results"]] for page in pages] == [
+            [users[0].id, users[1].id],
+            [users[2].id, users[3].id],
+            [users[4].id],
+        ]
+        assert pages[0]["results"][0] == {"id": users[0].id, "username": users[0].username}
+        assert pages[0]["previous"] is None
+
+        previous_page = self.client.get(pages[-1]["previous"], headers=self._get_auth_token_headers()).json()
+        assert previous_page["results"] == pages[1]["results"]
+
+        response = self._list_follows(self.user.id, "following")
+        assert response.json()["results"] == [{"id": users[0].id, "username": users[0].username}]
+        assert response.status_code == status.HTTP_200_OK
+
+    @mark.error
+    @mark.django_db
+    def test_list_followers_wrong_id(self):
+        response = self._list_follows(666, "followers")
+        assert response.json()["detail"] == "No User matches the given query."
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        response = self._list_follows(self.user.id, "followers", {"cursor": "wrong"})
+        assert response.json()["detail"] == "Invalid cursor"
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    @mark.success
+    @mark.django_db
+    def test_follow_counts_of_related_managers(self):
+        users = [UserFactory() for _ in range(3)]
+
+        self.user.following.add(*users)
+        users[0].followers.add(users[1])
+        assert self._get_follow_counts(self.user, *users) == [(0, 3), (2, 0), (1, 1), (1, 0)]
+
+        self.user.following.remove(users[0], users[0].id, users[1])  # repeated ids are removed once
+        users[2].following.remove(self.user)  # not followed
+        assert self._get_follow_counts(self.user, *users) == [(0, 1), (1, 0), (0, 1), (1, 0)]
+
+        users[0].followers.clear()
+        assert self._get_follow_counts(self.user, *users) == [(0, 1), (0, 0), (0, 0), (1, 0)]
+
+
+class TestReconcileUserCountersCommand:
+    @fixture(autouse=True)
+    def set_up(self):
+        self.user, self.user_2 = UserFactory(), UserFactory()
+        pub = PublicationFactory(author=self.user)
+        PublicationFactory(author=self.user)
+        PublicationCommentFactory(author=self.user_2, publication=pub)
+
+        self.user.following.add(self.user_2)
+
+        # counters drifted, e.g. after an import that bypassed the signals
+        User.objects.filter(pk=self.user.pk).update(publications_count=7, comments_count=3, followers_count=5)
+
+    # private methods
+    def _call_command(self, *args):
+        out = StringIO()
+        call_command("reconcile_user_counters", *args, stdout=out)
+        return out.getvalue()
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_reconcile_user_counters(self):
+        output = self._call_command()
+
+        self.user.refresh_from_db()
+        self.user_2.refresh_from_db()
+        assert (self.user.publications_count, self.user.comments_count) == (2, 0)
+        assert (self.user_2.publications_count, self.user_2.comments_count) == (0, 1)
+        assert (self.user.followers_count, self.user.following_count) == (0, 1)
+        assert (self.user_2.followers_count, self.user_2.following_count) == (1, 0)
+        assert "1 user(s) with drifted counters updated." in output
+
+    @mark.success
+    @mark.django_db
+    def test_reconcile_user_counters_dry_run(self):
+        output = self._call_command("--dry-run")
+
+        self.user.refresh_from_db()
+        assert (self.user.publications_count, self.user.comments_count) == (7, 3)
+        assert "1 user(s) with drifted counters would be updated." in output
+
+
+class TestUserIndexes:
+    @fixture(autouse=True)
+    def set_up(self):
+        for username in ("tester", "another tester", "someone else"):
+            UserFactory(username=username)
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_username_filter_uses_trigram_index(self):
+        queryset = UserFilter({"username": "TEST"}, queryset=User.objects.order_by("id")).qs
+        assert set(queryset.values_list("username", flat=True)) == {"tester", "another tester"}
+
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            # with a handful of rows the planner would rather read a whole table or index, GIN is read with bitmap scans
+            cursor.execute(
+                "SET LOCAL enable_seqscan = off; SET LOCAL enable_indexscan = off; SET LOCAL enable_indexonlyscan = off;"
+            )
+            cursor.execute(f"EXPLAIN {sql}", params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+
+        assert "Bitmap Index Scan on user_username_trgm_idx" in plan, plan
+
+    @mark.success
+    @mark.django_db
+    def test_followers_page_uses_follows_index(self):
+        user = User.objects.get(username="tester")
+        user.followers.add(*User.objects.exclude(pk=user.pk))
+
+        queryset = Follow.objects.filter(to_user_id=user.pk, from_user_id__gt=0).order_by("from_user_id")[:21]
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off; SET LOCAL enable_bitmapscan = off;")
+            cursor.execute(f"EXPLAIN {sql}", params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+
+        assert "users_user_following_to_user_from_user_idx" in plan, plan
+
+
+class TestUserQueryBudgets:
+    @fixture(autouse=True)
+    def set_up(self):
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.user.set_password(self.user.username)
+        self.user.save()
+
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("api_token_auth"), data={"username": self.user.username, "password": self.user.username}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+
+        self.users = [UserFactory() for _ in range(5)]
+        self.user.following.add(*self.users[:3])
+        self.user.followers.add(*self.users[2:])
+
+    # tests
+    @mark.success
+    @mark.django_db
+    @mark.parametrize("page_size", [1, 20])
+    def test_list_query_budget(self, page_size):
+        with assert_query_budget("users-list"):
+            self.client.get(reverse("users-list"), {"page_size": page_size})
+
+    @mark.success
+    @mark.django_db
+    def test_detail_query_budget(self):
+        with assert_query_budget("users-detail"):
+            response = self.client.get(reverse("users-detail", kwargs={"pk": self.user.id}))
+        assert (response.data["following_count"], response.data["followers_count"]) == (3, 3)
+
+        with assert_query_budget("users-detail-follow-ids"):
+            response = self.client.get(reverse("users-detail", kwargs={"pk": self.user.id}), {"follows": "ids"})
+        assert set(response.data["following"]) == {user.id for user in self.users[:3]}
+        assert set(response.data["followers"]) == {user.id for user in self.users[2:]}
+
+    @mark.success
+    @mark.django_db
+    @mark.parametrize("page_size", [1, 20])
+    def test_followers_and_following_query_budgets(self, page_size):
+        for action in ("followers", "following"):
+            with assert_query_budget(f"users-{action}"):
+                self.client.get(reverse(f"users-{action}", kwargs={"pk": self.user.id}), {"page_size": page_size})
+
+    @mark.success
+    @mark.django_db
+    def test_create_and_follow_query_budgets(self):
+        with assert_query_budget("users-follow"):
+            self.client.post(reverse("users-follow", kwargs={"pk": self.user.id, "followed_pk": self.users[4].id}))
+        with assert_query_budget("users-follow"):
+            self.client.post(
+                reverse("users-follow-many", kwargs={"pk": self.user.id}), {"ids": [self.users[3].id]}, format="json"
+            )
+        with assert_query_budget("users-unfollow"):
+            self.client.post(
+                reverse("users-unfollow", kwargs={"pk": self.user.id}),
+                {"ids": [user.id for user in self.users]},
+                format="json",
+            )
+
+        self.client.credentials()  # creating a user doesn't require authentication
+        with assert_query_budget("users-create"):
+            self.client.post(
+                reverse("users-list"),
+                {"username": "new_user", "password": "new_user", "email": "new_user@localhost.com"},
+                format="json",
+            )
+
+
+class TestUserAsyncViews:
+    @fixture(autouse=True)
+    def set_up(self):
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.user.set_password(self.user.username)
+        self.user.save()
+
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("api_token_auth"), data={"username": self.user.username, "password": self.user.username}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_async_retrieve_success(self):
+        users = [UserFactory() for _ in range(3)]
+        self.user.following.add(*users[:2])
+        self.user.followers.add(users[2])
+
+        for query_params in (None, {"follows": "ids"}):
+            response = self.client.get(reverse("users-detail", kwargs={"pk": self.user.id}), query_params)
+            async_response = self.client.get(reverse("async-users-detail", kwargs={"pk": self.user.id}), query_params)
+            assert async_response.json() == response.json()
+            assert async_response.status_code == status.HTTP_200_OK
+
+        assert set(async_response.json()["following"]) == {users[0].id, users[1].id}
+
+    @mark.error
+    @mark.django_db
+    def test_async_retrieve_wrong_id(self):
+        response = self.client.get(reverse("async-users-detail", kwargs={"pk": 666}))
+        assert response.json()["detail"] == "No User matches the given query."
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    @mark.unauthorized
+    @mark.django_db
+    def test_async_retrieve_without_auth(self):
+        self.client.credentials()
+        response = self.client.get(reverse("async-users-detail", kwargs={"pk": self.user.id}))
+        assert response.json()["detail"] == "Authentication credentials were not provided."
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestCachingTokenAuthentication:
+    @fixture(autouse=True)
+    def set_up(self):
+        self.user = UserFactory(username="tester", email="tester@localhost.com")
+        self.user.set_password(self.user.username)
+        self.user.save()
+
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("api_token_auth"), data={"username": self.user.username, "password": self.user.username}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+        token_cache.clear()
+
+    # private methods
+    def _retrieve_data(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("users-detail", kwargs={"pk": self.user.id}))
+        return response, [query["sql"] for query in queries.captured_queries if "authtoken_token" in query["sql"]]
+
+    # tests
+    @mark.success
+    @mark.django_db
+    def test_cached_token_saves_auth_query(self):
+        response, token_queries = self._retrieve_data()
+        assert len(token_queries) == 1
+        assert token_cache.stats == {"hits": 0, "misses": 1}
+
+        response_2, token_queries = self._retrieve_data()
+        assert token_queries == []
+        assert token_cache.stats == {"hits": 1, "misses": 1}
+        assert response_2.json() == response.json()
+        assert response_2.status_code == status.HTTP_200_OK
+
+    @mark.success
+    @mark.django_db
+    def test_cached_user_loads_other_fields(self):
+        User.objects.filter(pk=self.user.pk).update(publications_count=3)
+        key = Token.objects.get(user=self.user).key
+        CachingTokenAuthentication().authenticate_credentials(key)  # caches the token
+
+        with CaptureQueriesContext(connection) as queries:
+            user, token = CachingTokenAuthentication().authenticate_credentials(key)
+        assert (user.pk, user.username, token.key, token.user_id) == (self.user.pk, "tester", key, self.user.pk)
+        assert len(queries) == 0
+
+        assert "password" in user.get_deferred_fields()  # the password hash isn't cached
+        assert user.publications_count == 3  # not in the snapshot, read from the DB
+
+    @mark.unauthorized
+    @mark.django_db
+    def test_cached_token_invalidated_by_user_deactivation(self, django_capture_on_commit_callbacks):
+        self._retrieve_data()
+        with django_capture_on_commit_callbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        response, token_queries = self._retrieve_data()
+        assert len(token_queries) == 1
+        assert response.json()["detail"] == "User inactive or deleted."
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @mark.success
+    @mark.django_db
+    def test_login_keeps_cached_token(self, django_capture_on_commit_callbacks):
+        self._retrieve_data()
+        with django_capture_on_commit_callbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            update_last_login(None, self.user)
+        assert [query["sql"].split()[0] for query in queries.captured_queries] == ["UPDATE"]  # no Token lookup
+
+        with django_capture_on_commit_callbacks(execute=True):
+            self.user.username = "renamed"
+            self.user.save(update_fields=["username"])
+        response, token_queries = self._retrieve_data()
+        assert len(token_queries) == 1  # a field of the snapshot: invalidated
+        assert response.status_code == status.HTTP_200_OK
+
+    @mark.unauthorized
+    @mark.django_db
+    def test_cached_token_invalidated_by_token_deletion(self, django_capture_on_commit_callbacks):
+        self._retrieve_data()
+        with django_capture_on_commit_callbacks(execute=True):
+            Token.objects.filter(user=self.user).delete()
+
+        response, token_queries = self._retrieve_data()
+        assert len(token_queries) == 1
+        assert response.json()["detail"] == "Invalid token."
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @mark.unauthorized
+    @mark.django_db
+    def test_invalid_token_is_not_cached(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token invalid")
+        for _ in range(2):
+            response, token_queries = self._retrieve_data()
+            assert len(token_queries) == 1
+            assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert token_cache.stats == {"hits": 0, "misses": 2}
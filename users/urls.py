@@ -3,6 +3,7 @@ from django.urls import include, path
 from rest_framework.authtoken.views import obtain_auth_token
 from rest_framework.routers import SimpleRouter
 
+from users.async_views import user_detail
 from users.views import UserCustomViewSet
 
 router = SimpleRouter()
@@ -12,4 +13,6 @@ router.register(r"users", UserCustomViewSet, basename="users")
 urlpatterns = [
     path("", include(router.urls)),
     path("api-token-auth/", obtain_auth_token, name="api_token_auth"),
+    # async (ASGI) read endpoints
+    path("async/users/<int:pk>/", user_detail, name="async-users-detail"),
 ]
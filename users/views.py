@@ -1,26 +1,62 @@
-from django.db.utils import IntegrityError
-from django.shortcuts import get_object_or_404
+from django.db.models import F, Prefetch
 
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, BasePermission, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.status import HTTP_200_OK, HTTP_404_NOT_FOUND
 from rest_framework.viewsets import ModelViewSet
 
 from users.filters import UserFilter
-from users.models import User
-from users.serializers import UserDetailSerializer, UserSerializer
+from users.models import Follow, User
+from users.serializers import (
+    USER_VALIDATOR_FIELDS,
+    FollowSerializer,
+    UserDetailSerializer,
+    UserDetailWithFollowsSerializer,
+    UserSerializer,
+    follow_users,
+    unfollow_users,
+)
+from utils.metrics import timed
+from utils.paginations import IdKeysetCursorPagination
+from utils.views import ConditionalGetMixin, LeanListModelMixin, get_etag
 
 __all__ = ("UserCustomViewSet",)
 
 
-class UserCustomViewSet(ModelViewSet):
+class FollowCursorPagination(IdKeysetCursorPagination):
+    # pages of a user's followers (or following) by their id, an index range scan of the follows table
+    ordering = ("user_id",)
+
+
+class IsSelf(BasePermission):
+    """The user of the URL is the authenticated one: users only change whom they follow."""
+
+    def has_object_permission(self, request, view, obj):
+        return obj.pk == request.user.pk
+
+
+class UserCustomViewSet(ConditionalGetMixin, LeanListModelMixin, ModelViewSet):
     http_method_names = ["get", "post"]
     filterset_class = UserFilter
 
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            self._paginator = self.get_pagination_class()()
+        return self._paginator
+
+    def get_pagination_class(self):
+        if self.action in ("followers", "following"):
+            return FollowCursorPagination
+        return self.pagination_class
+
     def get_permissions(self):
         if self.action == "create":
             return (AllowAny(),)
+        if self.action in ("follow", "follow_many", "unfollow"):
+            return (IsAuthenticated(), IsSelf())
         else:
             return super().get_permissions()
 
@@ -28,23 +64,88 @@ class UserCustomViewSet(ModelViewSet):
         if self.action in ("create", "list"):
             return UserSerializer
         if self.action == "retrieve":
-            return UserDetailSerializer
+            return UserDetailWithFollowsSerializer if self._with_follow_ids() else UserDetailSerializer
+        if self.action in ("follow_many", "unfollow"):
+            return FollowSerializer
 
     def get_queryset(self):
         if self.action == "list":
+            return User.objects.order_by("id")
+        if self.action in ("follow", "follow_many", "unfollow"):
+            return User.objects.all()
+        if self.action in ("followers", "following"):
+            return User.objects.only("id")
+        if self.action == "retrieve" and not self._with_follow_ids():
             return User.objects.all()
         if self.action == "retrieve":
-            return User.objects.all().prefetch_related("followers", "following")
+            only_ids = User.objects.only("id")  # UserDetailWithFollowsSerializer only needs their ids
+            return User.objects.prefetch_related(
+                Prefetch("followers", queryset=only_ids), Prefetch("following", queryset=only_ids)
+            )
+
+    def get_validators(self):
+        # the columns shown by the detail that can change, read by their primary key: the serializer only runs when
+        # the ETag doesn't match. The ids of "?follows=ids" can change while the counters don't, that detail has no
+        # validators
+        if self.action == "retrieve" and not self._with_follow_ids():
+            try:
+                row = User.objects.filter(pk=self.kwargs["pk"]).values_list(*USER_VALIDATOR_FIELDS).first()
+            except ValueError:  # not an id, "retrieve" answers the 404
+                row = None
+            if row is not None:
+                return f'W/"{get_etag(row)}"', None
+        return None
+
+    def retrieve(self, request, *args, **kwargs):
+        user = self.get_object()
+        with timed("serializer"):
+            return Response(self.get_serializer(user).data)
+
+    @action(detail=True, methods=["get"])
+    def followers(self, request, pk):
+        return self._get_follows_response(user_field="from_user", to_user_id=self.get_object().pk)
+
+    @action(detail=True, methods=["get"])
+    def following(self, request, pk):
+        return self._get_follows_response(user_field="to_user", from_user_id=self.get_object().pk)
 
     @action(detail=True, methods=["post"], url_path="follow/(?P<followed_pk>[^/.]+)")
     def follow(self, request, pk, followed_pk):
         user = self.get_object()
 
         try:
-            user.following.add(followed_pk)
-        except IntegrityError:
+            follow_users(user, [int(followed_pk)])
+        except (ValueError, ValidationError):
             return Response({"error": f"User with id={followed_pk} does not exist."}, status=HTTP_404_NOT_FOUND)
 
         return Response(
             {"message": f"User with id={user.pk} is now following User with id={followed_pk}."}, status=HTTP_200_OK
         )
+
+    @action(detail=True, methods=["post"], url_path="follow", url_name="follow-many")
+    def follow_many(self, request, pk):
+        user = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        followed_ids = follow_users(user, serializer.validated_data["ids"])
+        return Response({"followed": sorted(followed_ids)}, status=HTTP_200_OK)
+
+    @action(detail=True, methods=["post"])
+    def unfollow(self, request, pk):
+        user = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        unfollowed_ids = unfollow_users(user, serializer.validated_data["ids"])
+        return Response({"unfollowed": sorted(unfollowed_ids)}, status=HTTP_200_OK)
+
+    def _with_follow_ids(self):
+        # "?follows=ids" keeps the previous detail, with the complete lists of followers and following ids
+        return self.request.query_params.get("follows") == "ids"
+
+    def _get_follows_response(self, user_field, **filters):
+        # read from the follows table, its (from_user, to_user) and (to_user, from_user) indexes serve both directions
+        queryset = Follow.objects.filter(**filters).values(
+            user_id=F(f"{user_field}_id"), username=F(f"{user_field}__username")
+        )
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response([{"id": row["user_id"], "username": row["username"]} for row in page])
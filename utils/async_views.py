@@ -0,0 +1,48 @@
+from functools import wraps
+
+from django.http import Http404, HttpResponse
+
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import APIException, AuthenticationFailed, MethodNotAllowed, NotAuthenticated, NotFound
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+__all__ = ("async_api_view",)
+
+
+def async_api_view(view):
+    """
+    Decorator of the async (ASGI) read-only endpoints. DRF views are sync, so these are plain async Django views:
+    the request is wrapped in a DRF Request authenticated by DEFAULT_AUTHENTICATION_CLASSES, the view returns the data
+    to render and both the data and the API exceptions are rendered as the DRF views render them.
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+        try:
+            if request.method != "GET":
+                raise MethodNotAllowed(request.method)
+            user = await sync_to_async(lambda: request.user)()  # the authenticators query the DB
+            if not user.is_authenticated:
+                raise NotAuthenticated()
+            data = await view(request, *args, **kwargs)
+        except Http404 as exc:
+            return _render({"detail": str(exc) or NotFound.default_detail}, status=NotFound.status_code)
+        except APIException as exc:
+            response = _render(
+                exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}, status=exc.status_code
+            )
+            if isinstance(exc, (NotAuthenticated, AuthenticationFailed)) and request.authenticators:
+                response["WWW-Authenticate"] = request.authenticators[0].authenticate_header(request)
+            return response
+
+        return _render(data)
+
+    return wrapper
+
+
+def _render(data, status=200):
+    # same renderer, so same bytes, as the JSON responses of the DRF views
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    return HttpResponse(renderer.render(data), content_type=renderer.media_type, status=status)
@@ -0,0 +1,51 @@
+from hashlib import sha256
+
+from django.contrib.auth import get_user_model
+from django.db import router
+
+from rest_framework.authentication import TokenAuthentication
+
+from utils.caches import ReadThroughCache
+
+__all__ = (
+    "CachingTokenAuthentication",
+    "token_cache",
+)
+
+
+# Snapshot of the token's user by token key (hashed, keys are credentials). Each hit is a query saved, check "stats".
+# Invalidated when the token is deleted or its user saved (check signals 'users.invalidate_token_cache_on_*'), users
+# changed by "QuerySet.update()" keep their snapshot up to the backend timeout.
+token_cache = ReadThroughCache.from_settings("AUTH_TOKEN_CACHE", key_prefix="auth_token:")
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication reading the token's user from "token_cache" instead of joining Token and User on every request.
+    The user is built from the snapshot fields only, any other field is loaded from the DB when it's accessed.
+    """
+
+    snapshot_fields = ("id", "username", "email", "is_active", "is_staff", "is_superuser")
+
+    @staticmethod
+    def get_cache_key(key):
+        return sha256(key.encode()).hexdigest()
+
+    def authenticate_credentials(self, key):
+        snapshot = token_cache.get_or_set(self.get_cache_key(key), lambda: self._get_snapshot(key))
+
+        user_model = get_user_model()
+        # "from_db" expects the values in the order of the model fields
+        field_names = [field.attname for field in user_model._meta.concrete_fields if field.attname in snapshot]
+        user = user_model.from_db(
+            router.db_for_read(user_model), field_names, [snapshot[field_name] for field_name in field_names]
+        )
+        token_model = self.get_model()
+        token = token_model.from_db(router.db_for_read(token_model), ("key", "user_id"), (key, user.pk))
+        token.user = user
+        return (user, token)
+
+    def _get_snapshot(self, key):
+        # raises AuthenticationFailed for unknown tokens and inactive users, which are never cached
+        user, token = super().authenticate_credentials(key)
+        return {field_name: getattr(user, field_name) for field_name in self.snapshot_fields}
@@ -0,0 +1,163 @@
+import json
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from asgiref.sync import sync_to_async
+from rest_framework.utils.encoders import JSONEncoder
+
+__all__ = (
+    "LRUCache",
+    "RedisCache",
+    "ReadThroughCache",
+)
+
+
+class LRUCache:
+    """In-process cache, evicts the least recently used entry once "max_entries" is reached."""
+
+    def __init__(self, max_entries=1_000, timeout=60):
+        self.max_entries = max_entries
+        self.timeout = timeout  # seconds an entry lives, None to never expire
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = monotonic() + self.timeout if self.timeout is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """
+    Cache shared by every process through a Redis server (or anything speaking its protocol).
+    Values are stored JSON-encoded. "client" allows to provide an already built client, e.g. a fake one in tests.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", timeout=60, key_prefix="chaindots:", client=None):
+        if client is None:
+            import redis  # optional dependency, only required when this backend is configured
+
+            client = redis.Redis.from_url(url)
+
+        self.client = client
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    def get(self, key):
+        raw = self.client.get(f"{self.key_prefix}{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        self.client.set(f"{self.key_prefix}{key}", json.dumps(value, cls=JSONEncoder), ex=self.timeout)
+
+    def delete(self, key):
+        self.client.delete(f"{self.key_prefix}{key}")
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f"{self.key_prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+class ReadThroughCache:
+    """
+    Loads missing values through a callable and keeps hit/miss counters of the wrapped backend. Every instance is
+    kept in "instances" to expose their counters (check "utils.metrics"), named after their key prefix.
+    """
+
+    instances = list()
+
+    def __init__(self, backend, key_prefix=""):
+        self.backend = backend
+        self.key_prefix = key_prefix
+        self.name = key_prefix.rstrip(":") or "default"
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self.instances.append(self)
+
+    @classmethod
+    def from_settings(cls, setting_name, key_prefix=""):
+        """Build the backend from a settings dict like {"BACKEND": "<dotted path>", "OPTIONS": {...}}."""
+        config = getattr(settings, setting_name)
+        backend = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+        return cls(backend, key_prefix=key_prefix)
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def get_or_set(self, key, loader, is_fresh=None):
+        """The cached value of "key", loaded (and cached) when missing, or when "is_fresh(value)" is false."""
+        key = f"{self.key_prefix}{key}"
+        value = self.backend.get(key)
+        if value is not None and is_fresh is not None and not is_fresh(value):
+            value = None
+        self._count(hit=value is not None)
+
+        if value is None:
+            value = loader()
+            self.backend.set(key, value)
+        return value
+
+    async def aget_or_set(self, key, loader):
+        """Async version of "get_or_set", "loader" is a coroutine function."""
+        key = f"{self.key_prefix}{key}"
+        value = await sync_to_async(self.backend.get)(key)
+        self._count(hit=value is not None)
+
+        if value is None:
+            value = await loader()
+            await sync_to_async(self.backend.set)(key, value)
+        return value
+
+    def get(self, key):
+        value = self.backend.get(f"{self.key_prefix}{key}")
+        self._count(hit=value is not None)
+        return value
+
+    def set(self, key, value):
+        self.backend.set(f"{self.key_prefix}{key}", value)
+
+    def invalidate(self, key):
+        self.backend.delete(f"{self.key_prefix}{key}")
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
@@ -0,0 +1,203 @@
+import atexit
+import logging
+
+from collections import defaultdict
+from threading import Event, Lock, RLock, Thread
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections, router, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+__all__ = (
+    "LocalCounterBuffer",
+    "RedisCounterBuffer",
+    "WriteBehindCounters",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCounterBuffer:
+    """In-process buffer of counter increments, by row pk and field. Lost if the process dies before a flush."""
+
+    def __init__(self):
+        self._deltas = defaultdict(int)  # (pk, field) -> delta
+        self._lock = Lock()
+
+    def add(self, pk, field, delta):
+        with self._lock:
+            self._deltas[(pk, field)] += delta
+
+    def drain(self):
+        """Pending increments, {(pk, field): delta}, removed from the buffer."""
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(int)
+        return dict(deltas)
+
+
+class RedisCounterBuffer:
+    """
+    Buffer of counter increments shared by every process through a Redis hash ("HINCRBY"), so they survive the
+    process that made them. "client" allows to provide an already built client, e.g. a fake one in tests.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", key="chaindots:counters", client=None):
+        if client is None:
+            import redis  # optional dependency, only required when this backend is configured
+
+            client = redis.Redis.from_url(url)
+
+        self.client = client
+        self.key = key
+
+    def add(self, pk, field, delta):
+        self.client.hincrby(self.key, f"{pk}:{field}", delta)
+
+    def drain(self):
+        """Pending increments, {(pk, field): delta}, removed from the hash in the same transaction they are read."""
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.hgetall(self.key)
+        pipeline.delete(self.key)
+        raw, _ = pipeline.execute()
+
+        deltas = dict()
+        for name, delta in raw.items():
+            pk, _, field = (name.decode() if isinstance(name, bytes) else name).partition(":")
+            deltas[(int(pk), field)] = int(delta)
+        return deltas
+
+
+class WriteBehindCounters:
+    """
+    Increments of integer counter fields of a model ("fields"). Disabled ("buffer" None), each increment is an
+    "UPDATE ... SET x = x + n" of its row, in the caller's transaction. Enabled, increments are added to "buffer" once
+    their transaction commits and a background thread flushes them every "interval" seconds, all of them in one
+    "UPDATE ... FROM (VALUES ...)" statement: a counter lags its rows up to "interval" seconds (plus the flush).
+    "interval" None leaves the flushes to "flush()" calls.
+
+    "reconcile" (a callable) recomputes the counters from their rows; it runs when the thread starts, to recover the
+    increments a previous process lost (e.g. it crashed with a non empty LocalCounterBuffer). The first increment of
+    the process waits for it, before its own increment is buffered: the thread's connection doesn't see the caller's
+    uncommitted rows, and no row of the process commits meanwhile, so none is counted twice.
+    """
+
+    def __init__(self, model, fields, buffer=None, interval=None, reconcile=None):
+        self.model = model
+        self.fields = tuple(fields)
+        self.buffer = buffer
+        self.interval = interval
+        self.reconcile = reconcile
+        self._flush_lock = RLock()  # a flush doesn't run during a reconciliation
+        self._start_lock = Lock()
+        self._thread = None
+        self._stopped = Event()
+        self._started = Event()  # set once the thread reconciled the counters
+
+    @classmethod
+    def from_settings(cls, setting_name, model, fields, reconcile=None):
+        """
+        Build the buffer from a settings dict like {"BACKEND": "<dotted path>", "OPTIONS": {...}, "FLUSH_INTERVAL": n,
+        "RECONCILE": bool}, disabled when the setting is None.
+        """
+        config = getattr(settings, setting_name)
+        if config is None:
+            return cls(model, fields)
+
+        buffer = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+        reconcile = reconcile if config.get("RECONCILE", True) else None
+        return cls(model, fields, buffer=buffer, interval=config.get("FLUSH_INTERVAL"), reconcile=reconcile)
+
+    @property
+    def enabled(self):
+        return self.buffer is not None
+
+    @property
+    def using(self):
+        return router.db_for_write(self.model)
+
+    def increment(self, pk, field, delta=1):
+        if not self.enabled:
+            self.model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+            return
+
+        if self.interval is not None and not self._started.is_set():
+            self._start()
+        # buffered once committed, so a rolled back row doesn't count
+        transaction.on_commit(lambda: self.buffer.add(pk, field, delta), using=self.using)
+
+    def flush(self):
+        """Write the pending increments, return the number of rows updated."""
+        if not self.enabled:
+            return 0
+
+        with self._flush_lock:
+            deltas = self.buffer.drain()
+            if not deltas:
+                return 0
+
+            rows = defaultdict(lambda: dict.fromkeys(self.fields, 0))
+            for (pk, field), delta in deltas.items():
+                rows[pk][field] += delta
+            try:
+                return self._update(rows)
+            except DatabaseError:
+                for (pk, field), delta in deltas.items():  # back to the buffer, for the next flush
+                    self.buffer.add(pk, field, delta)
+                raise
+
+    def stop(self):
+        """Stop the flushing thread, flushing the pending increments."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self._started.clear()
+        self.flush()
+
+    def _update(self, rows):
+        connection = connections[self.using]
+        quote_name = connection.ops.quote_name
+        table, pk_column = quote_name(self.model._meta.db_table), quote_name(self.model._meta.pk.column)
+        columns = [quote_name(self.model._meta.get_field(field).column) for field in self.fields]
+
+        # rows sorted by pk, so concurrent flushes lock them in the same order and can't deadlock
+        values = ", ".join(["(%s" + ", %s::integer" * len(columns) + ")"] * len(rows))
+        params = [value for pk in sorted(rows) for value in (pk, *rows[pk].values())]
+        assignments = ", ".join(f"{column} = {table}.{column} + v.{column}" for column in columns)
+        with transaction.atomic(using=self.using), connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET {assignments} FROM (VALUES {values}) AS v(id, {', '.join(columns)}) "
+                f"WHERE {table}.{pk_column} = v.id;",
+                params,
+            )
+            return cursor.rowcount
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._stopped.clear()
+                self._thread = Thread(target=self._run, name=f"{self.model._meta.label}-counters", daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+        self._started.wait()  # the reconciliation, the concurrent first increments wait for it too
+
+    def _run(self):
+        try:
+            if self.reconcile is not None:
+                with self._flush_lock:
+                    self.flush()  # a shared buffer may have increments of other processes
+                    self.reconcile()
+        except DatabaseError:
+            logger.exception("Reconciling the %s counters failed", self.model._meta.label)
+        finally:
+            self._started.set()
+
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush()
+            except DatabaseError:
+                logger.exception("Flushing the %s counters failed, retried on the next flush", self.model._meta.label)
+            finally:
+                close_old_connections()  # this thread's connection past CONN_MAX_AGE (or broken), as requests do
+        connections.close_all()  # this thread's connections
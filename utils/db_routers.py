@@ -0,0 +1,107 @@
+import logging
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from random import choice
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+__all__ = (
+    "ReplicaHealthCheck",
+    "ReplicaRouter",
+    "health_check",
+    "read_from_replicas",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaHealthCheck:
+    """
+    Whether each replica answers a "SELECT 1", checked again once settings.REPLICA_HEALTH_CHECK_INTERVAL seconds
+    passed since its last check. Kept per process.
+    """
+
+    def __init__(self):
+        self._checks = dict()  # alias -> (checked_at, healthy)
+        self._lock = Lock()
+
+    def is_healthy(self, alias):
+        with self._lock:
+            checked_at, healthy = self._checks.get(alias, (None, False))
+        if checked_at is not None and monotonic() - checked_at < settings.REPLICA_HEALTH_CHECK_INTERVAL:
+            return healthy
+
+        healthy = self._check(alias)
+        with self._lock:
+            self._checks[alias] = (monotonic(), healthy)
+        return healthy
+
+    def clear(self):
+        with self._lock:
+            self._checks.clear()
+
+    def _check(self, alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+        except DatabaseError as exc:
+            connection.close()  # a new connection is tried on the next check
+            logger.warning("Replica %r is unhealthy, reads fall back to %r: %s", alias, DEFAULT_DB_ALIAS, exc)
+            return False
+        return True
+
+
+health_check = ReplicaHealthCheck()
+
+
+class _ReadRouting:
+    def __init__(self):
+        self.alias = None  # replica picked on the first routed read, the same one for the rest of the request
+
+
+_read_routing = ContextVar("read_routing", default=None)
+
+
+@contextmanager
+def read_from_replicas():
+    """Route the reads made inside the block to a replica, check ReplicaRouter."""
+    token = _read_routing.set(_ReadRouting())
+    try:
+        yield
+    finally:
+        _read_routing.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Reads of the models of settings.DATABASE_REPLICA_APPS made inside "read_from_replicas" (check
+    "utils.middleware.ReplicaRoutingMiddleware") go to one of settings.DATABASE_REPLICAS, picked at random among the
+    healthy ones; everything else goes to "default". Reads inside a transaction of "default" stay on it, they may
+    depend on its uncommitted writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = _read_routing.get()
+        if routing is None or model._meta.app_label not in settings.DATABASE_REPLICA_APPS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        if routing.alias is None:
+            replicas = [alias for alias in settings.DATABASE_REPLICAS if health_check.is_healthy(alias)]
+            routing.alias = choice(replicas) if replicas else DEFAULT_DB_ALIAS
+        return routing.alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # the replicas are copies of "default"
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS  # replicated from "default"
@@ -0,0 +1,192 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+
+from django.conf import settings
+
+from utils.caches import ReadThroughCache
+
+__all__ = (
+    "Histogram",
+    "MetricsRegistry",
+    "RequestMetrics",
+    "collect_request_metrics",
+    "get_request_metrics",
+    "record_query",
+    "registry",
+    "timed",
+)
+
+
+class Histogram:
+    """Cumulative histogram as Prometheus exposes it: "buckets" are the upper bounds, "+Inf" is implicit."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # per bucket (not cumulative), the last one is "+Inf"
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        total = 0
+        for upper_bound, count in zip((*(_format_value(bucket) for bucket in self.buckets), "+Inf"), self.counts):
+            total += count
+            yield upper_bound, total
+
+
+class RequestMetrics:
+    """What a request spent on the DB (one (sql, seconds) per query) and in each "timed" block."""
+
+    def __init__(self):
+        self.queries = list()
+        self.timers = dict()
+
+    @property
+    def db_time(self):
+        return sum(duration for sql, duration in self.queries)
+
+    def add_time(self, name, duration):
+        self.timers[name] = self.timers.get(name, 0.0) + duration
+
+
+_request_metrics = ContextVar("request_metrics", default=None)
+
+
+@contextmanager
+def collect_request_metrics():
+    """Make a new RequestMetrics the one of the request being handled inside the block."""
+    metrics = RequestMetrics()
+    token = _request_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _request_metrics.reset(token)
+
+
+def get_request_metrics():
+    """RequestMetrics of the request being handled (inherited by "sync_to_async" threads), None outside requests."""
+    return _request_metrics.get()
+
+
+@contextmanager
+def timed(name):
+    """Add the time spent in the block to the request's timer "name", e.g. timed("serializer")."""
+    metrics = _request_metrics.get()
+    if metrics is None:
+        yield
+        return
+
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_time(name, perf_counter() - start)
+
+
+def record_query(execute, sql, params, many, context):
+    """DB execute wrapper (check "connection.execute_wrappers") timing each query of the request being handled."""
+    metrics = _request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries.append((sql, perf_counter() - start))
+
+
+class MetricsRegistry:
+    """
+    Per route metrics of the requests handled by this process, rendered in the Prometheus text format. Routes are
+    URL names (e.g. "publications-list"), so the number of series is bounded by the URL patterns.
+    """
+
+    def __init__(self, latency_buckets, query_buckets, namespace="chaindots"):
+        self.latency_buckets = latency_buckets
+        self.query_buckets = query_buckets
+        self.namespace = namespace
+        self._lock = Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.requests = dict()  # (route, method, status) -> count
+            self.latencies = dict()  # (route, method) -> Histogram of seconds
+            self.query_counts = dict()  # (route, method) -> Histogram of queries
+            self.db_times = dict()  # (route, method) -> seconds
+            self.timers = dict()  # (route, method, timer) -> seconds
+
+    def observe_request(self, route, method, status, duration, metrics):
+        labels = (route, method)
+        with self._lock:
+            self.requests[(*labels, status)] = self.requests.get((*labels, status), 0) + 1
+            self.latencies.setdefault(labels, Histogram(self.latency_buckets)).observe(duration)
+            self.query_counts.setdefault(labels, Histogram(self.query_buckets)).observe(len(metrics.queries))
+            self.db_times[labels] = self.db_times.get(labels, 0.0) + metrics.db_time
+            for name, timer_duration in metrics.timers.items():
+                self.timers[(*labels, name)] = self.timers.get((*labels, name), 0.0) + timer_duration
+
+    def render(self):
+        lines = list()
+        with self._lock:
+            self._render_counter(
+                lines, "http_requests_total", "Requests handled.", self.requests, ("route", "method", "status")
+            )
+            self._render_histogram(lines, "http_request_duration_seconds", "Request latency.", self.latencies)
+            self._render_histogram(lines, "db_queries_per_request", "DB queries per request.", self.query_counts)
+            self._render_counter(
+                lines, "db_duration_seconds_total", "Time spent in DB queries.", self.db_times, ("route", "method")
+            )
+            self._render_counter(
+                lines,
+                "timer_duration_seconds_total",
+                'Time spent in the "timed" blocks, e.g. "serializer" and "render".',
+                self.timers,
+                ("route", "method", "timer"),
+            )
+
+        caches = {
+            (cache.name, result): getattr(cache, result)
+            for cache in ReadThroughCache.instances
+            for result in ("hits", "misses")
+        }
+        self._render_counter(lines, "cache_requests_total", "Read-through cache lookups.", caches, ("cache", "result"))
+        return "".join(f"{line}\n" for line in lines)
+
+    def _render_counter(self, lines, name, help_text, samples, label_names):
+        name = f"{self.namespace}_{name}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for label_values, value in sorted(samples.items()):
+            lines.append(f"{name}{_format_labels(zip(label_names, label_values))} {_format_value(value)}")
+
+    def _render_histogram(self, lines, name, help_text, histograms):
+        name = f"{self.namespace}_{name}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (route, method), histogram in sorted(histograms.items()):
+            labels = [("route", route), ("method", method)]
+            for upper_bound, count in histogram.cumulative_counts():
+                lines.append(f"{name}_bucket{_format_labels([*labels, ('le', upper_bound)])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+
+def _format_labels(labels):
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = MetricsRegistry(settings.METRICS_LATENCY_BUCKETS, settings.METRICS_QUERY_BUCKETS)
@@ -0,0 +1,237 @@
+import logging
+
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from utils.authentication import CachingTokenAuthentication
+from utils.caches import ReadThroughCache
+from utils.db_routers import read_from_replicas
+from utils.metrics import collect_request_metrics, get_request_metrics, record_query, registry
+
+__all__ = (
+    "CompressionMiddleware",
+    "MetricsMiddleware",
+    "ReplicaRoutingMiddleware",
+    "replica_pin_cache",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware with brotli ("br"). The encoding is negotiated with the client's "Accept-Encoding" (q-values
+    included), ties are broken by the order of settings.COMPRESSION_ENCODINGS. Bodies smaller than
+    settings.COMPRESSION_MIN_SIZE are sent as they are: compressing them costs more than it saves.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.encodings = tuple(settings.COMPRESSION_ENCODINGS)
+        self.min_size = settings.COMPRESSION_MIN_SIZE
+        if "br" in self.encodings:
+            import brotli  # optional dependency, only required when "br" is in COMPRESSION_ENCODINGS
+
+            self.brotli = brotli
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+        if response.has_header("Content-Encoding"):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = self.get_encoding(request)
+        if encoding == "gzip":
+            return super().process_response(request, response)
+        if encoding != "br" or (response.streaming and response.is_async):
+            return response
+
+        if response.streaming:
+            response.streaming_content = self._compress_sequence(response.streaming_content)
+            del response.headers["Content-Length"]
+        else:
+            compressed_content = self.brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers["Content-Length"] = str(len(response.content))
+
+        # a strong ETag would claim the compressed body is byte-identical to the uncompressed one, as GZipMiddleware
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
+
+    def get_encoding(self, request):
+        """Encoding of COMPRESSION_ENCODINGS with the highest q-value in "Accept-Encoding", None if none is accepted."""
+        accepted = dict()
+        for item in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+            coding, *params = (part.strip() for part in item.split(";"))
+            quality = 1.0
+            for param in params:
+                key, _, value = param.partition("=")
+                if key.strip().lower() == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            accepted[coding.lower()] = quality
+
+        candidates = [
+            (accepted[encoding], -index, encoding)
+            for index, encoding in enumerate(self.encodings)
+            if accepted.get(encoding, 0) > 0
+        ]
+        return max(candidates)[2] if candidates else None
+
+    def _compress_sequence(self, sequence):
+        compressor = self.brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        for chunk in sequence:
+            data = compressor.process(chunk) + compressor.flush()  # flushed, so each chunk is sent when it's ready
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+def _install_query_recorder(connection, **kwargs):
+    # kept for the life of the connection, it only records while a request is being handled
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, DB queries and DB time of each request in "utils.metrics.registry" (exposed at
+    "GET /metrics"), by route, as well as the "timed" blocks ("serializer") and the rendering of DRF responses.
+    Requests slower than settings.METRICS_SLOW_REQUEST_THRESHOLD are logged with their queries. Streamed bodies are
+    timed until the response is returned, not until their last chunk is sent.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+        connection_created.connect(_install_query_recorder, dispatch_uid="utils.middleware.install_query_recorder")
+        for connection in connections.all(initialized_only=True):
+            _install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with collect_request_metrics() as metrics:
+            start = perf_counter()
+            response = self.get_response(request)
+        self.record(request, response, perf_counter() - start, metrics)
+        return response
+
+    async def __acall__(self, request):
+        with collect_request_metrics() as metrics:
+            start = perf_counter()
+            response = await self.get_response(request)
+        self.record(request, response, perf_counter() - start, metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns, right after this hook
+        metrics = get_request_metrics()
+        if metrics is not None:
+            start = perf_counter()
+
+            def add_render_time(response):
+                metrics.add_time("render", perf_counter() - start)
+
+            response.add_post_render_callback(add_render_time)
+        return response
+
+    def record(self, request, response, duration, metrics):
+        route = request.resolver_match.view_name if request.resolver_match else "unmatched"
+        registry.observe_request(route, request.method, response.status_code, duration, metrics)
+
+        threshold = settings.METRICS_SLOW_REQUEST_THRESHOLD
+        if threshold is not None and duration >= threshold:
+            logger.warning(
+                "Slow request %s %s (%s): %.3fs, %d queries in %.3fs\n%s",
+                request.method,
+                request.get_full_path(),
+                route,
+                duration,
+                len(metrics.queries),
+                metrics.db_time,
+                "\n".join(f"{query_duration * 1_000:.1f}ms {sql}" for sql, query_duration in metrics.queries),
+            )
+
+
+# Tokens (hashed, they are credentials) of the clients that made an unsafe request in the last
+# settings.REPLICA_PIN_SECONDS, read from "default" meanwhile. Share it between processes with a RedisCache backend.
+replica_pin_cache = ReadThroughCache.from_settings("REPLICA_PIN_CACHE", key_prefix="replica_pin:")
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Safe requests (GET, HEAD, OPTIONS) read from the replicas (check "utils.db_routers.ReplicaRouter"), unless their
+    client made an unsafe request in the last settings.REPLICA_PIN_SECONDS: replicas lag behind "default", so the
+    client is pinned to it to read its own writes. The pin is a cookie, and the token of the "Authorization" header
+    for the clients that don't keep cookies.
+    """
+
+    sync_capable = True
+    async_capable = True
+    safe_methods = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if not self.reads_from_replicas(request):
+            return self.pin(request, self.get_response(request))
+        with read_from_replicas():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not self.reads_from_replicas(request):
+            return self.pin(request, await self.get_response(request))
+        with read_from_replicas():
+            return await self.get_response(request)
+
+    def reads_from_replicas(self, request):
+        if not settings.DATABASE_REPLICAS or request.method not in self.safe_methods:
+            return False
+        if settings.REPLICA_PIN_COOKIE in request.COOKIES:
+            return False
+        authorization = request.META.get("HTTP_AUTHORIZATION")
+        return not (authorization and replica_pin_cache.get(self._get_pin_key(authorization)))
+
+    def pin(self, request, response):
+        if not settings.DATABASE_REPLICAS or request.method in self.safe_methods:
+            return response
+
+        response.set_cookie(
+            settings.REPLICA_PIN_COOKIE, "1", max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite="Lax"
+        )
+        authorization = request.META.get("HTTP_AUTHORIZATION")
+        if authorization:
+            replica_pin_cache.set(self._get_pin_key(authorization), True)
+        return response
+
+    @staticmethod
+    def _get_pin_key(authorization):
+        return CachingTokenAuthentication.get_cache_key(authorization)
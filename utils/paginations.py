@@ -1,22 +1,334 @@
-from rest_framework.pagination import PageNumberPagination
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 
+from utils.caches import ReadThroughCache
+
+count_cache = ReadThroughCache.from_settings("PAGINATION_COUNT_CACHE", key_prefix="count:")
+
+
+def _get_value(row, field):
+    # rows are model instances, or dicts when the queryset was turned into ".values()"
+    return row[field] if isinstance(row, dict) else getattr(row, field)
+
+
+class _UnboundedPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator for an approximate count, or none at all ("count=None"). Page numbers aren't checked against the count:
+    one extra row is read to tell if there is a next page, and a page past the last row raises EmptyPage.
+    """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = count  # replaces the cached_property, COUNT(*) is never executed
+
+    @cached_property
+    def num_pages(self):
+        return None if self.count is None else Paginator.num_pages.func(self)
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_("That page number is not an integer"))
+        if number < 1:
+            raise EmptyPage(_("That page number is less than 1"))
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom : bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(_("That page contains no results"))
+        return _UnboundedPage(rows[: self.per_page], number, self, has_next=len(rows) > self.per_page)
+
+    async def apage(self, number):
+        """Async version of "page", the rows are read with the async ORM."""
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = [row async for row in self.object_list[bottom : bottom + self.per_page + 1]]
+        if not rows and number > 1:
+            raise EmptyPage(_("That page contains no results"))
+        return _UnboundedPage(rows[: self.per_page], number, self, has_next=len(rows) > self.per_page)
+
 
 class CustomPagination(PageNumberPagination):
     page_size = 20  # default items per page
     max_page_size = 100  # max items allowed per page
     page_query_param = "page_number"  # queryparam to change the page number
     page_size_query_param = "page_size"  # queryparam to change the amount of items per page
+    count_query_param = "count"  # queryparam to skip the total count with "count=none"
+    count_strategy = None  # "exact", "estimate" or "cached", settings.PAGINATION_COUNT_STRATEGY when None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.get_paginator(queryset, page_size, request)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+        if paginator.num_pages is not None and paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    async def apaginate_queryset(self, queryset, request):
+        """Async version of "paginate_queryset", the count and the page are read with the async ORM."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = await self.aget_paginator(queryset, page_size, request)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            if isinstance(paginator, ApproximateCountPaginator):
+                self.page = await paginator.apage(page_number)
+            else:
+                self.page = paginator.page(page_number)  # its count is set, it only slices the queryset
+                self.page.object_list = [row async for row in self.page.object_list]
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+        if paginator.num_pages is not None and paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def get_paginator(self, queryset, page_size, request):
+        if request.query_params.get(self.count_query_param) == "none":
+            return ApproximateCountPaginator(queryset, page_size)
+
+        strategy = self.count_strategy or settings.PAGINATION_COUNT_STRATEGY
+        if strategy == "estimate":
+            count = self.get_estimated_count(queryset)
+            if count is not None:
+                return ApproximateCountPaginator(queryset, page_size, count=count)
+        elif strategy == "cached":
+            count = count_cache.get_or_set(self.get_count_cache_key(request), queryset.count)
+            return ApproximateCountPaginator(queryset, page_size, count=count)
+        elif strategy != "exact":
+            raise ValueError(f"Unknown pagination count strategy {strategy!r}")
+
+        return self.django_paginator_class(queryset, page_size)
+
+    async def aget_paginator(self, queryset, page_size, request):
+        """Async version of "get_paginator", the count is read before the paginator is built."""
+        if request.query_params.get(self.count_query_param) == "none":
+            return ApproximateCountPaginator(queryset, page_size)
+
+        strategy = self.count_strategy or settings.PAGINATION_COUNT_STRATEGY
+        if strategy == "estimate":
+            # a catalog read, Django has no async cursor: the only query of the lists run in a thread
+            count = await sync_to_async(self.get_estimated_count)(queryset)
+            if count is not None:
+                return ApproximateCountPaginator(queryset, page_size, count=count)
+        elif strategy == "cached":
+            count = await count_cache.aget_or_set(self.get_count_cache_key(request), queryset.acount)
+            return ApproximateCountPaginator(queryset, page_size, count=count)
+        elif strategy != "exact":
+            raise ValueError(f"Unknown pagination count strategy {strategy!r}")
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()  # "count" is a cached_property, the paginator won't query it
+        return paginator
+
+    def get_estimated_count(self, queryset):
+        """
+        Row estimate of the table kept by Postgres' ANALYZE (pg_class.reltuples), None when it can't stand in for the
+        count: the queryset is filtered, the table was never analyzed or is small enough to be counted.
+        """
+        query = queryset.query
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql" or query.where or query.distinct or query.combinator:
+            return None
+
+        with connection.cursor() as cursor:
+            # the estimates of a partitioned table are the ones of its partitions (check "utils.partitions")
+            cursor.execute(
+                "SELECT COALESCE(SUM(reltuples) FILTER (WHERE reltuples >= 0), -1) FROM pg_class WHERE relkind != 'p' "
+                "AND (oid = %s::regclass OR oid IN (SELECT relid FROM pg_partition_tree(%s::regclass)));",
+                [queryset.model._meta.db_table] * 2,
+            )
+            estimate = int(cursor.fetchone()[0])  # -1 when the table was never analyzed
+
+        return estimate if estimate >= settings.PAGINATION_COUNT_ESTIMATE_MIN_ROWS else None
+
+    def get_count_cache_key(self, request):
+        """Request path and filter params, sorted, without the params that only select the page."""
+        skip = {self.page_query_param, self.page_size_query_param, self.count_query_param, "format"}
+        params = sorted(
+            (key, value) for key, values in request.query_params.lists() if key not in skip for value in values
+        )
+        return f"{request.path}?{urlencode(params)}"
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "page_number": self.page.number,
+            "page_size": self.page.paginator.per_page,
+            "total_pages": self.page.paginator.num_pages,
+            "total_items": self.page.paginator.count,
+            "results": data,
+        }
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Keyset pagination ordered by ("-created", "-id").
+
+    The opaque cursor stores the (created, id) pair of the boundary row, so each page is resolved with
+    "WHERE (created, id) < (cursor) ORDER BY created DESC, id DESC LIMIT page_size + 1".
+    Neither COUNT(*) nor OFFSET is executed, so deep pages cost the same as the first one.
+    """
+
+    page_size = 20  # default items per page
+    max_page_size = 100  # max items allowed per page
+    page_size_query_param = "page_size"  # queryparam to change the amount of items per page
+    ordering = ("-created", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self._read_cursor(request)
+        return self._set_page(self._get_rows(queryset, self.ordering))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering) if self.page else None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
 
     def get_paginated_response(self, data):
         return Response(
             {
                 "next": self.get_next_link(),
                 "previous": self.get_previous_link(),
-                "page_number": self.page.number,
-                "page_size": self.page.paginator.per_page,
-                "total_pages": self.page.paginator.num_pages,
-                "total_items": self.page.paginator.count,
+                "page_size": self.page_size,
                 "results": data,
             }
         )
+
+    def _read_cursor(self, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        self.reverse = bool(self.cursor and self.cursor.reverse)
+        self.position = self.cursor.position if self.cursor else None
+
+    def _get_rows(self, queryset, ordering):
+        if self.position is not None:
+            queryset = queryset.filter(self._get_keyset_filter(self.position, self.reverse, ordering))
+
+        if self.reverse:
+            ordering = tuple(field[1:] if field.startswith("-") else f"-{field}" for field in ordering)
+        return list(queryset.order_by(*ordering)[: self.page_size + 1])  # one extra row tells if there are more
+
+    def _set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        if self.reverse:
+            self.page.reverse()
+
+        self.has_next = self.position is not None if self.reverse else has_more
+        self.has_previous = has_more if self.reverse else self.position is not None
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        created_field, id_field = (field.lstrip("-") for field in ordering)
+        return f"{_get_value(instance, created_field).isoformat()}|{_get_value(instance, id_field)}"
+
+    def _get_keyset_filter(self, position, reverse, ordering):
+        created_field, id_field = (field.lstrip("-") for field in ordering)
+        try:
+            created_str, id_str = position.split("|")
+            created, pk = parse_datetime(created_str), int(id_str)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if created is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        # "created <= x AND (created < x OR id < y)" is the row comparison "(created, id) < (x, y)" written so the
+        # planner can bound the (created, id) index range on its leading column.
+        lookup = "gte" if reverse else "lte"
+        strict = "gt" if reverse else "lt"
+        return Q(**{f"{created_field}__{lookup}": created}) & (
+            Q(**{f"{created_field}__{strict}": created}) | Q(**{f"{id_field}__{strict}": pk})
+        )
+
+
+class MergedKeysetCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination over several querysets of the same model, given as (queryset, ordering) pairs. Every ordering
+    must sort its rows as "ordering" does (e.g. through a denormalized copy of "created"). One keyset page is read
+    from each queryset and the pages are merged, so deep pages still cost the same as the first one.
+    """
+
+    def paginate_queryset(self, querysets, request, view=None):
+        self._read_cursor(request)
+
+        rows = list()
+        for queryset, ordering in querysets:
+            rows += self._get_rows(queryset, ordering)
+
+        created_field, id_field = (field.lstrip("-") for field in self.ordering)
+        rows.sort(key=lambda row: (_get_value(row, created_field), _get_value(row, id_field)), reverse=not self.reverse)
+        return self._set_page(rows[: self.page_size + 1])
+
+
+class IdKeysetCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination ordered by a single unique integer field, "ordering" (ascending unless it starts with "-").
+    The opaque cursor stores the value of the boundary row: "WHERE id > (cursor) ORDER BY id LIMIT page_size + 1".
+    """
+
+    ordering = ("id",)
+
+    def _get_position_from_instance(self, instance, ordering):
+        return str(_get_value(instance, ordering[0].lstrip("-")))
+
+    def _get_keyset_filter(self, position, reverse, ordering):
+        try:
+            value = int(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+        # forward pages of an ascending ordering (or previous pages of a descending one) read the greater values
+        lookup = "lt" if ordering[0].startswith("-") != reverse else "gt"
+        return Q(**{f"{ordering[0].lstrip('-')}__{lookup}": value})
@@ -0,0 +1,26 @@
+from django.conf import settings
+
+import orjson
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from utils.renderers import ORJSONRenderer
+
+__all__ = ("ORJSONParser",)
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser decoding UTF-8 bodies (the default charset) with orjson."""
+
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or dict()).get("encoding", settings.DEFAULT_CHARSET)
+        if encoding.lower() not in ("utf-8", "utf8"):
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
@@ -0,0 +1,189 @@
+import re
+
+from datetime import date, datetime, timezone
+
+from django.db import connections, router, transaction
+
+__all__ = (
+    "MonthlyPartitions",
+    "add_months",
+)
+
+
+def add_months(month, months):
+    """First day of the month "months" after (or before, when negative) the one of "month"."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class MonthlyPartitions:
+    """
+    Range partitions by month on the "created" column of a model's table, named "<table>_p<YYYY>_<MM>", plus a
+    "<table>_default" partition with the rows of the months without one. Bounds are UTC months.
+
+    The primary key of a partitioned table must include the partition key, so it becomes ("id", "created"): foreign
+    keys can't reference the table anymore (those are dropped, Django's "on_delete" still cascades) and "created"
+    can't be NULL. Indexes, check constraints, foreign keys and triggers of the table are kept.
+    """
+
+    def __init__(self, model, column="created"):
+        self.model = model
+        self.table = model._meta.db_table
+        self.column = model._meta.get_field(column).column
+        self.using = router.db_for_write(model)
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def is_partitioned(self):
+        with self.connection.cursor() as cursor:
+            return _is_partitioned(cursor, self.table)
+
+    def get_months(self):
+        """Months with a partition, sorted."""
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = %s::regclass;", [self.table]
+            )
+            names = [name for name, in cursor.fetchall()]
+        pattern = re.compile(rf"{re.escape(self.table)}_p(\d{{4}})_(\d{{2}})")
+        return sorted(date(int(match[1]), int(match[2]), 1) for match in map(pattern.fullmatch, names) if match)
+
+    def get_name(self, month):
+        return f"{self.table}_p{month:%Y_%m}"
+
+    def convert(self, until):
+        """
+        Turn the table into a partitioned one, with the partitions of the months from its oldest row to "until"
+        (included), return their names. The rows are copied, the table is locked meanwhile: a one-off, for a
+        maintenance window.
+        """
+        quote_name = self.connection.ops.quote_name
+        table, column, old_table = quote_name(self.table), quote_name(self.column), quote_name(f"{self.table}_old")
+        pk_column = quote_name(self.model._meta.pk.column)
+
+        with transaction.atomic(using=self.using), self.connection.cursor() as cursor:
+            # tables with deferred foreign key checks pending (e.g. rows written earlier in the transaction) can't be
+            # altered
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE;")
+            cursor.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE;")
+            cursor.execute(f"SELECT COUNT(*) FILTER (WHERE {column} IS NULL), MIN({column}) FROM {table};")
+            null_count, oldest = cursor.fetchone()
+            if null_count:
+                raise ValueError(f"{null_count} rows of {self.table} have no {self.column}, set it first.")
+
+            # what "LIKE" doesn't copy: the definitions read now name the table, which is the new one when they run
+            cursor.execute(
+                "SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = %s::regclass AND NOT indisprimary;",
+                [self.table],
+            )
+            indexes = [definition for definition, in cursor.fetchall()]
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid), confrelid::regclass::text FROM pg_constraint "
+                "WHERE conrelid = %s::regclass AND contype = 'f';",
+                [self.table],
+            )
+            foreign_keys = cursor.fetchall()
+            cursor.execute(
+                "SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = %s::regclass AND NOT tgisinternal;",
+                [self.table],
+            )
+            triggers = [definition for definition, in cursor.fetchall()]
+            cursor.execute(
+                "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+                "WHERE confrelid = %s::regclass AND contype = 'f';",
+                [self.table],
+            )
+            for referencing_table, name in cursor.fetchall():
+                cursor.execute(f"ALTER TABLE {quote_name(referencing_table)} DROP CONSTRAINT {quote_name(name)};")
+            cursor.execute("SELECT pg_get_serial_sequence(%s, %s);", [self.table, self.model._meta.pk.column])
+            sequence = cursor.fetchone()[0]
+
+            cursor.execute(f"ALTER TABLE {table} RENAME TO {old_table};")
+            cursor.execute(
+                f"CREATE TABLE {table} (LIKE {old_table} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS "
+                f"INCLUDING STORAGE INCLUDING COMMENTS) PARTITION BY RANGE ({column});"
+            )
+            cursor.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL;")
+            cursor.execute(f"CREATE TABLE {quote_name(f'{self.table}_default')} PARTITION OF {table} DEFAULT;")
+            month = oldest.astimezone(timezone.utc).date().replace(day=1) if oldest else until
+            created = self.create(month, until)
+
+            cursor.execute(f"INSERT INTO {table} OVERRIDING SYSTEM VALUE SELECT * FROM {old_table};")
+            # the new identity continues the old one, which goes away with its table
+            cursor.execute("SELECT pg_get_serial_sequence(%s, %s);", [self.table, self.model._meta.pk.column])
+            new_sequence = cursor.fetchone()[0]
+            cursor.execute(f"SELECT setval(%s, last_value, is_called) FROM {sequence};", [new_sequence])
+            cursor.execute(f"DROP TABLE {old_table};")
+            cursor.execute(f"ALTER SEQUENCE {new_sequence} RENAME TO {sequence.rpartition('.')[2]};")
+
+            cursor.execute(
+                f"ALTER TABLE {table} ADD CONSTRAINT {quote_name(f'{self.table}_pkey')} "
+                f"PRIMARY KEY ({pk_column}, {column});"
+            )
+            for definition in indexes:
+                cursor.execute(f"{definition};")
+            for name, definition, referenced_table in foreign_keys:
+                if not _is_partitioned(cursor, referenced_table):
+                    cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {quote_name(name)} {definition};")
+            for definition in triggers:
+                cursor.execute(f"{definition};")
+            cursor.execute(f"ANALYZE {table};")
+        return created
+
+    def create(self, since, until):
+        """
+        Create the missing partitions of the months from "since" to "until" (included), return their names. The rows
+        of those months in the default partition are moved to them.
+        """
+        quote_name = self.connection.ops.quote_name
+        table, column, default = quote_name(self.table), quote_name(self.column), quote_name(f"{self.table}_default")
+        existing, created = set(self.get_months()), list()
+
+        month = since.replace(day=1)
+        with transaction.atomic(using=self.using), self.connection.cursor() as cursor:
+            while month <= until:
+                if month not in existing:
+                    # "CREATE TABLE ... PARTITION OF" fails when the default partition has rows of the month
+                    name, bounds = self.get_name(month), self._get_bounds(month)
+                    range_sql = f"{column} >= %s AND {column} < %s"
+                    cursor.execute(
+                        f"CREATE TABLE {quote_name(name)} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);"
+                    )
+                    cursor.execute(f"INSERT INTO {quote_name(name)} SELECT * FROM {default} WHERE {range_sql};", bounds)
+                    cursor.execute(f"DELETE FROM {default} WHERE {range_sql};", bounds)
+                    cursor.execute(
+                        f"ALTER TABLE {table} ATTACH PARTITION {quote_name(name)} FOR VALUES FROM (%s) TO (%s);", bounds
+                    )
+                    created.append(name)
+                month = add_months(month, 1)
+        return created
+
+    def detach(self, before, schema=None):
+        """
+        Detach the partitions of the months before "before", return their names. They are kept as plain tables, in
+        "schema" when given (created when missing).
+        """
+        quote_name = self.connection.ops.quote_name
+        detached = list()
+        with transaction.atomic(using=self.using), self.connection.cursor() as cursor:
+            if schema:
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {quote_name(schema)};")
+            for month in self.get_months():
+                if month >= before:
+                    break
+                name = self.get_name(month)
+                cursor.execute(f"ALTER TABLE {quote_name(self.table)} DETACH PARTITION {quote_name(name)};")
+                if schema:
+                    cursor.execute(f"ALTER TABLE {quote_name(name)} SET SCHEMA {quote_name(schema)};")
+                detached.append(name)
+        return detached
+
+    def _get_bounds(self, month):
+        return [datetime.combine(bound, datetime.min.time(), timezone.utc) for bound in (month, add_months(month, 1))]
+
+
+def _is_partitioned(cursor, table):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass;", [table])
+    return cursor.fetchone()[0] == "p"
@@ -0,0 +1,150 @@
+import re
+
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from uuid import UUID
+
+from django.db.backends.postgresql import base, operations
+
+__all__ = ("DatabaseWrapper",)
+
+
+_PLACEHOLDER_RE = re.compile(r"%%|%s")
+
+# Cast of each parameter type, the type psycopg2 gives its literal: a prepared statement returns what the query does
+# (e.g. "SELECT %s" an integer, not a text). Statements with parameters of other types (e.g. floats, which psycopg2
+# sends as numerics, and lists) aren't prepared.
+_PARAMETER_CASTS = {
+    type(None): "",  # unknown, as NULL
+    str: "",  # unknown, as a quoted literal
+    bool: "::boolean",
+    int: "::bigint",
+    Decimal: "::numeric",
+    date: "::date",
+    time: "::time",
+    timedelta: "::interval",
+    UUID: "::uuid",
+}
+
+
+def _get_cast(param):
+    if isinstance(param, datetime):
+        return "::timestamptz" if param.tzinfo else "::timestamp"
+    if type(param) is int and not -(2**63) <= param < 2**63:
+        return "::numeric"
+    return _PARAMETER_CASTS.get(type(param))
+
+
+class DatabaseOperations(operations.DatabaseOperations):
+    def last_executed_query(self, cursor, sql, params):
+        # the query logged (e.g. by CaptureQueriesContext) is the statement, not the "EXECUTE" of its prepared version
+        query = super().last_executed_query(cursor, sql, params)
+        if query is not None and query.startswith("EXECUTE ") and not sql.startswith("EXECUTE "):
+            return cursor.mogrify(sql, params).decode()
+        return query
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Postgres backend ("ENGINE": "utils.postgresql") preparing server-side the SELECT statements executed
+    "prepare_threshold" times on a connection: Postgres parses them once, and plans them once when their generic plan
+    is as good as the custom ones. Same OPTIONS as psycopg 3: "prepare_threshold" (None to disable, the default) and
+    "prepared_max", the statements kept per connection (the least recently used are deallocated). The parameters are
+    cast to the types of their literals, so the results don't change.
+    Prepared statements belong to the session, so poolers in transaction mode (e.g. PgBouncer's) can't be used.
+    """
+
+    ops_class = DatabaseOperations
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict["OPTIONS"]
+        self.prepare_threshold = options.get("prepare_threshold")
+        self.prepared_max = options.get("prepared_max", 100)
+        self.execute_wrappers.append(self._execute_prepared)  # innermost, other wrappers see the statement
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("prepare_threshold", None)
+        params.pop("prepared_max", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        # prepared statements live as long as the connection
+        # keyed by (sql, casts of the parameters), the same SQL may be executed with parameters of other types
+        self.prepared_statements = OrderedDict()  # key -> name, None when the statement can't be prepared
+        self.executions = dict()  # key -> executions before the statement is prepared
+        self.prepared_count = 0
+        return super().get_new_connection(conn_params)
+
+    def _execute_prepared(self, execute, sql, params, many, context):
+        if (
+            self.prepare_threshold is None
+            or many
+            or not isinstance(params, (list, tuple, type(None)))
+            or not sql.startswith("SELECT")
+            or context["cursor"].cursor.name is not None  # server-side cursors "DECLARE" their statement
+        ):
+            return execute(sql, params, many, context)
+        casts = tuple(_get_cast(param) for param in params or ())
+        if None in casts:
+            return execute(sql, params, many, context)
+
+        key = (sql, casts)
+        name = self.prepared_statements.get(key, False)
+        if name is False:
+            name = self._prepare(context["cursor"].cursor, key, params is not None)
+        else:
+            self.prepared_statements.move_to_end(key)
+        if not name:
+            return execute(sql, params, many, context)
+
+        if params:
+            return execute(f"EXECUTE {name}({', '.join(['%s'] * len(params))})", params, many, context)
+        return execute(f"EXECUTE {name}", params, many, context)
+
+    def _prepare(self, cursor, key, has_params):
+        """Name of the prepared statement, None when it can't be prepared or False until "prepare_threshold"."""
+        executions = self.executions.get(key, 0) + 1
+        if executions < self.prepare_threshold:
+            if len(self.executions) >= self.prepared_max * 10:  # most SQL is seen once (e.g. "IN" of each size)
+                self.executions.clear()
+            self.executions[key] = executions
+            return False
+        self.executions.pop(key, None)
+
+        # "%s" placeholders become "$1::<cast>", ... (and "%%" a "%", psycopg2 only unescapes them with params)
+        sql, casts = key
+        position = 0
+
+        def to_positional(match):
+            nonlocal position
+            if match.group() == "%%":
+                return "%"
+            position += 1
+            return f"${position}{casts[position - 1]}"
+
+        statement = _PLACEHOLDER_RE.sub(to_positional, sql) if has_params else sql
+        self.prepared_count += 1
+        name = f"stmt_{self.prepared_count}"
+        # the raw cursor, so wrappers and debug cursors don't see it. In a transaction a failure would abort it, so
+        # it's made in a savepoint; prepared statements aren't transactional, rolling back doesn't deallocate them
+        in_transaction = not self.get_autocommit()
+        try:
+            if in_transaction:
+                cursor.execute("SAVEPOINT prepare_statement")
+            cursor.execute(f"PREPARE {name} AS {statement}")
+        except self.Database.Error:
+            name = None  # e.g. the type of a parameter can't be inferred
+            if in_transaction:
+                cursor.execute("ROLLBACK TO SAVEPOINT prepare_statement")
+        if in_transaction:
+            cursor.execute("RELEASE SAVEPOINT prepare_statement")
+
+        self.prepared_statements[key] = name
+        if len(self.prepared_statements) > self.prepared_max:
+            evicted_name = self.prepared_statements.popitem(last=False)[1]
+            if evicted_name is not None:
+                cursor.execute(f"DEALLOCATE {evicted_name}")
+        return name
@@ -0,0 +1,54 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from utils.authentication import token_cache
+
+__all__ = (
+    "QUERY_BUDGETS",
+    "assert_query_budget",
+)
+
+
+# Queries issued by each endpoint, token authentication included. They must not depend on the page size.
+# Transaction control statements (savepoints of the atomic blocks) are not counted. "token" is the lookup of the
+# authentication token, which is measured uncached: requests with a cached token run one query less.
+QUERY_BUDGETS = {
+    # users
+    "users-create": 3,  # username unique check, email unique check, INSERT
+    "users-list": 3,  # token, COUNT, page
+    "users-detail": 3,  # token, user columns (the validators), user
+    "users-detail-follow-ids": 4,  # token, user, following ids, followers ids ("?follows=ids")
+    "users-followers": 3,  # token, user, page
+    "users-following": 3,  # token, user, page
+    "users-follow": 7,  # token, user, users locked, existing edges, INSERT edges, counters, followed publications
+    "users-unfollow": 7,  # token, user, users locked, existing edges, DELETE edges, counters, DELETE timeline entries
+    # publications
+    "publications-create": 5,  # token, existence of +10k followers, INSERT, author counter, INSERT timeline entries
+    "publications-list": 3,  # token, COUNT, page
+    "publications-list-cursor": 2,  # token, page
+    "publications-list-uncounted": 2,  # token, page with one extra row ("count=none")
+    "publications-detail": 3,  # token, validators, publication with its author (2 when cached)
+    "publications-comments-list": 4,  # token, last comment (the validators), COUNT, page
+    "publications-comments-create": 5,  # token, publication validation, INSERT, author counter, publication comments
+    "feed-list": 3,  # token, fanned out page, page read on demand
+}
+
+TRANSACTION_CONTROL_PREFIXES = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+@contextmanager
+def assert_query_budget(endpoint, budget=None):
+    """Fail if the queries executed inside the block are not the ones registered in QUERY_BUDGETS for "endpoint"."""
+    budget = QUERY_BUDGETS[endpoint] if budget is None else budget
+    token_cache.clear()
+    with CaptureQueriesContext(connection) as context:
+        yield context
+
+    queries = [
+        query["sql"] for query in context.captured_queries if not query["sql"].startswith(TRANSACTION_CONTROL_PREFIXES)
+    ]
+    assert len(queries) == budget, "\n".join(
+        [f"'{endpoint}' executed {len(queries)} queries, its budget is {budget}:"] + queries
+    )
@@ -0,0 +1,109 @@
+import csv
+
+from io import StringIO
+
+import orjson
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+__all__ = (
+    "CSVRenderer",
+    "NDJSONRenderer",
+    "ORJSONRenderer",
+    "StreamingRenderer",
+)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson, which serializes dicts, lists, strings, numbers and datetimes natively
+    (anything else goes through DRF's JSONEncoder). Same bytes as JSONRenderer; indented bodies (e.g. for the
+    browsable API) and non default UNICODE_JSON/COMPACT_JSON settings are left to JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context or dict()):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data, default=self.encoder_class().default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+        )
+        # as JSONRenderer does: U+2028 and U+2029 are valid in JSON but not in JavaScript strings
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class StreamingRenderer(BaseRenderer):
+    """
+    Renderer able to encode rows as they are read, for "StreamingHttpResponse". "stream" takes the field names and
+    an iterable of rows (tuples in the same order, e.g. from "values_list") and yields chunks of about
+    "buffer_size" bytes, so neither the rows nor the encoded body are kept in memory.
+    """
+
+    charset = "utf-8"
+    buffer_size = 64 * 1024
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # non streamed responses, e.g. errors: a list of dicts or a single dict
+        items = data if isinstance(data, list) else [data]
+        fields = list(items[0]) if items else list()
+        return b"".join(self.stream(fields, ([item.get(field) for field in fields] for item in items)))
+
+    def stream(self, fields, rows):
+        buffer, size = list(), 0
+        for line in self.encode_lines(fields, rows):
+            buffer.append(line)
+            size += len(line)
+            if size >= self.buffer_size:
+                yield "".join(buffer).encode(self.charset)
+                buffer, size = list(), 0
+        if buffer:
+            yield "".join(buffer).encode(self.charset)
+
+    def encode_lines(self, fields, rows):
+        raise NotImplementedError
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """One JSON object per line, encoded as the JSON responses are (e.g. datetimes as ISO 8601 with "Z")."""
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def encode_lines(self, fields, rows):
+        encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        for row in rows:
+            yield f"{encoder.encode(dict(zip(fields, row)))}\n"
+
+
+class CSVRenderer(StreamingRenderer):
+    """Header line with the field names followed by one line per row, values as in the JSON responses."""
+
+    media_type = "text/csv"
+    format = "csv"
+
+    def encode_lines(self, fields, rows):
+        encoder = JSONEncoder()
+        output = StringIO()
+        writer = csv.writer(output)
+
+        def line(values):
+            output.seek(0)
+            output.truncate()
+            writer.writerow(values)
+            return output.getvalue()
+
+        yield line(fields)
+        for row in rows:
+            yield line([self._to_text(value, encoder) for value in row])
+
+    def _to_text(self, value, encoder):
+        if value is None:
+            return ""
+        if isinstance(value, (str, int, float)):
+            return value
+        return encoder.default(value)  # e.g. datetimes, as the JSON responses encode them
@@ -0,0 +1,161 @@
+from functools import cache
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models, transaction
+from django.utils import timezone
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import (
+    ISO_8601,
+    BooleanField,
+    CharField,
+    ChoiceField,
+    DateField,
+    DateTimeField,
+    DecimalField,
+    FloatField,
+    IntegerField,
+    JSONField,
+    TimeField,
+    UUIDField,
+)
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.serializers import ListSerializer
+from rest_framework.settings import api_settings
+
+__all__ = (
+    "BulkCreateListSerializer",
+    "LeanSerializer",
+)
+
+
+class _InvalidItem:
+    def __init__(self, index, errors):
+        self.index = index
+        self.errors = errors
+
+
+class BulkCreateListSerializer(ListSerializer):
+    """
+    "many=True" serializer for bulk ingestion. Invalid items don't abort the whole list: their errors are kept in
+    "item_errors" and the valid items are inserted with "bulk_create" in batches of settings.BULK_CREATE_BATCH_SIZE,
+    all in one transaction. Subclasses can override "batch_created" to apply side effects once per batch instead of
+    once per row.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("max_length", settings.BULK_CREATE_MAX_ITEMS)
+        super().__init__(*args, **kwargs)
+        self.item_errors = list()
+        self._item_index = 0
+
+    def run_child_validation(self, data):
+        index, self._item_index = self._item_index, self._item_index + 1
+        try:
+            return super().run_child_validation(data)
+        except ValidationError as exc:
+            return _InvalidItem(index, exc.detail)
+
+    def to_internal_value(self, data):
+        self._item_index = 0
+        items = super().to_internal_value(data)
+
+        self.item_errors = [
+            {"index": item.index, "errors": item.errors} for item in items if isinstance(item, _InvalidItem)
+        ]
+        return [item for item in items if not isinstance(item, _InvalidItem)]
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        batch_size = settings.BULK_CREATE_BATCH_SIZE
+
+        instances = list()
+        with transaction.atomic():  # all the batches or none: a failed batch rolls back the ones before it
+            for start in range(0, len(validated_data), batch_size):
+                batch = [model(**attrs) for attrs in validated_data[start : start + batch_size]]
+                model.objects.bulk_create(batch)
+                self.batch_created(batch)
+                instances += batch
+        return instances
+
+    def batch_created(self, instances):
+        pass
+
+
+def _to_iso_8601(value):
+    # DateTimeField.to_representation with the default format and timezone, without its per value lookups
+    value = value.astimezone(timezone.get_current_timezone()).isoformat()
+    return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+
+class LeanSerializer:
+    """
+    Read-only fast path of a ModelSerializer for lists. Rows are read with ".values()" (no model instances) and
+    mapped to the serializer's representation with converters compiled once per serializer class, so the output is
+    the same as "serializer_class(instances, many=True).data".
+
+    Only fields read from a column of the model are supported. Use "for_serializer", which returns None for
+    serializers with anything else (e.g. SerializerMethodField, nested serializers, properties or dotted sources).
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.fields = [
+            (field.field_name, field.source, self._get_converter(field))
+            for field in serializer_class()._readable_fields
+        ]
+
+    @classmethod
+    @cache
+    def for_serializer(cls, serializer_class):
+        try:
+            return cls(serializer_class)
+        except TypeError:
+            return None
+
+    def values(self, queryset):
+        return queryset.values(*(source for _, source, _ in self.fields))
+
+    def to_representation(self, rows):
+        return [self._to_representation(row) for row in rows]
+
+    def _to_representation(self, row):
+        ret = dict()
+        for name, source, convert in self.fields:
+            value = row[source]
+            ret[name] = value if convert is None or value is None else convert(value)
+        return ret
+
+    def _get_converter(self, field):
+        """None when the column value is already its representation, otherwise the function giving it."""
+        opts = self.serializer_class.Meta.model._meta
+        try:
+            model_field = opts.get_field(field.source)
+        except FieldDoesNotExist:
+            model_field = None
+        if model_field is None or not model_field.concrete:
+            raise TypeError(f"Field {field.field_name!r} is not read from a column")
+
+        if isinstance(field, PrimaryKeyRelatedField):
+            if field.pk_field is not None:
+                raise TypeError(f"Field {field.field_name!r} has a 'pk_field'")
+            return None  # ".values()" gives the related id
+        if isinstance(field, JSONField):
+            return field.to_representation if field.binary else None
+        # the DB driver already returns the str, int and bool the field would give
+        for field_class, model_field_classes in (
+            (CharField, (models.CharField, models.TextField)),
+            (IntegerField, (models.IntegerField,)),
+            (BooleanField, (models.BooleanField,)),
+        ):
+            if isinstance(field, field_class):
+                return None if isinstance(model_field, model_field_classes) else field.to_representation
+        if isinstance(field, DateTimeField):
+            output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+            if output_format == ISO_8601 and not hasattr(field, "timezone") and settings.USE_TZ:
+                return _to_iso_8601
+            return field.to_representation
+        if isinstance(field, (ChoiceField, DateField, DecimalField, FloatField, TimeField, UUIDField)):
+            return field.to_representation  # they don't read anything but the value
+        raise TypeError(f"Field {field.field_name!r} ({type(field).__name__}) is not supported")
@@ -0,0 +1,123 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from utils.metrics import registry, timed
+from utils.serializers import LeanSerializer
+
+__all__ = (
+    "ConditionalGetMixin",
+    "LeanListModelMixin",
+    "MetricsView",
+    "get_etag",
+)
+
+
+def get_etag(*values):
+    """
+    ETag (unquoted) of "values", which must have a stable repr (e.g. ints, strings, datetimes and the serialized data
+    of a response). Derive it from what the response shows, so it changes when (and only when) the response does.
+    """
+    return md5(repr(values).encode(), usedforsecurity=False).hexdigest()
+
+
+class _ConditionalResponse(Exception):
+    """Raised with the "304 Not Modified" (or "412 Precondition Failed") answering a conditional request."""
+
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    Answers the GET requests with "If-None-Match" (or "If-Modified-Since") matching the validators of the action,
+    from "get_validators", with a "304 Not Modified" before the action runs its queries and serializers. Checked after
+    the authentication and the permissions. The responses of those actions carry the validators, and the
+    Cache-Control directives of their URL name in settings.CACHE_CONTROL.
+    """
+
+    def get_validators(self):
+        """
+        (ETag, last modified datetime) of the resource of the action, None for any or both when it has none. The ETag
+        is quoted when given weak ('W/"..."').
+        """
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag, self.last_modified = (None, None)
+        if request.method == "GET":
+            self.etag, self.last_modified = self.get_validators() or (None, None)
+        if self.etag is None and self.last_modified is None:
+            return
+
+        response = get_conditional_response(
+            request,
+            etag=quote_etag(self.etag) if self.etag is not None else None,
+            last_modified=int(self.last_modified.timestamp()) if self.last_modified is not None else None,
+        )
+        if response is not None:
+            raise _ConditionalResponse(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _ConditionalResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "etag", None) is None and getattr(self, "last_modified", None) is None:
+            return response
+        if response.status_code not in (200, 304):
+            return response
+
+        if self.etag is not None:
+            response.headers["ETag"] = quote_etag(self.etag)
+        if self.last_modified is not None:
+            response.headers["Last-Modified"] = http_date(self.last_modified.timestamp())
+        cache_control = settings.CACHE_CONTROL.get(request.resolver_match.url_name)
+        if cache_control:
+            patch_cache_control(response, **cache_control)
+        return response
+
+
+class LeanListModelMixin:
+    """
+    "list" of ListModelMixin through the LeanSerializer of the serializer class, when settings.LEAN_SERIALIZATION is
+    on and the serializer class allows it (otherwise through the serializer, as usual). Actions listing another
+    queryset can call "get_list_response" too.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.get_list_response(self.filter_queryset(self.get_queryset()), self.get_serializer_class())
+
+    def get_list_response(self, queryset, serializer_class):
+        lean_serializer = LeanSerializer.for_serializer(serializer_class) if settings.LEAN_SERIALIZATION else None
+        if lean_serializer is not None:
+            queryset = lean_serializer.values(queryset)
+
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset if page is None else page)  # evaluated here, so the queries aren't timed as serializer
+        with timed("serializer"):
+            if lean_serializer is not None:
+                data = lean_serializer.to_representation(rows)
+            else:
+                data = serializer_class(rows, many=True, context=self.get_serializer_context()).data
+
+        return Response(data) if page is None else self.get_paginated_response(data)
+
+
+class MetricsView(APIView):
+    """Metrics of the requests handled by this process ("utils.metrics.registry"), in the Prometheus text format."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")